@@ -0,0 +1,110 @@
+"""
+Async API views, and the bounded executors they hand CPU-bound work to.
+
+Under ASGI (see DEPLOYMENT_GUIDE.md) a sync view holds a worker thread for
+its whole run, so a Florence-2 call in the autotag preview ties up the
+thread for seconds. AsyncAPIView runs DRF's request handling (parsing,
+authentication, permissions, exception handling) around an `async def`
+handler. The handler does its own ORM access with the async query API
+(afirst, acreate, async for, ...) and awaits CPU-bound work on a
+BoundedExecutor. One event loop can then hold many requests in flight while
+inference runs on the executor's threads.
+
+Each kind of work gets its own executor per process, sized by settings:
+
+- autotag: API_AUTOTAG_WORKERS threads, since torch releases the GIL while
+  the model runs,
+- recommendations: API_RECOMMENDATION_WORKERS threads for the pure scoring in
+  recommendation_core, which keeps it off the event loop.
+
+At most workers + *_QUEUE jobs are accepted at a time. Beyond that, requests
+fail fast with 503 (ExecutorBusy) instead of queueing without bound and
+holding their uploads in memory.
+
+Under WSGI the same views still work: Django runs each one in its own event
+loop.
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import APIView
+
+
+class ExecutorBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The server is busy; try again shortly."
+    default_code = 'executor_busy'
+
+
+class BoundedExecutor:
+    """A thread pool that accepts at most workers + queue jobs at once."""
+
+    def __init__(self, name, workers, queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.slots = threading.BoundedSemaphore(workers + queue)
+
+    async def run(self, fn, *args, **kwargs):
+        if not self.slots.acquire(blocking=False):
+            raise ExecutorBusy()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self.slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Start fn without waiting for it; False if the pool is full."""
+        if not self.slots.acquire(blocking=False):
+            return False
+        future = self.executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda _: self.slots.release())
+        return True
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def executor(name):
+    """The process's executor for 'autotag' or 'recommendation' work, created on first use."""
+    with _executors_lock:
+        if name not in _executors:
+            workers = getattr(settings, f'API_{name.upper()}_WORKERS')
+            queue = getattr(settings, f'API_{name.upper()}_QUEUE')
+            _executors[name] = BoundedExecutor(name, workers, queue)
+        return _executors[name]
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines. Authentication and permission
+    checks may query the database, so they run through sync_to_async.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = self.http_method_not_allowed
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,135 @@
+"""
+JWT authentication without a user query per request.
+
+JWTAuthentication loads the User row for every authenticated request.
+CachedJWTAuthentication instead keeps recently seen users in a small
+in-process LRU for settings.API_AUTH_USER_CACHE_TTL seconds, and checks
+each token's signed claims against the cached user:
+
+- `user_id` and `username` identify the user,
+- `is_active` rejects tokens issued to inactive accounts without a lookup,
+- `auth_hash` is a fingerprint of the password hash (the same HMAC Django
+  sessions use), so changing the password revokes every earlier token.
+
+Tokens must come from UserRefreshToken (the login, register and token views
+use it) to carry these claims; older tokens fall back to JWTAuthentication.
+
+Each request gets its own shallow copy of the cached user, so attributes a
+view sets on request.user never reach other requests or threads.
+
+Revocation: saving a user evicts them from this process's LRU at once. Other
+workers may accept a revoked token until their entry expires, at most
+API_AUTH_USER_CACHE_TTL seconds. A claim that does not match the cached user
+always triggers a fresh lookup before the request is rejected.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+AUTH_HASH_CLAIM = 'auth_hash'
+
+
+def user_auth_hash(user):
+    return user.get_session_auth_hash()[:32]
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token carrying the claims CachedJWTAuthentication checks; access tokens copy them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_active'] = user.is_active
+        token[AUTH_HASH_CLAIM] = user_auth_hash(user)
+        return token
+
+
+class UserCache:
+    """Thread-safe LRU of user objects by id, with a time-to-live per entry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self.lock:
+            self.entries[user_id] = (user, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def evict(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(settings.API_AUTH_USER_CACHE_SIZE, settings.API_AUTH_USER_CACHE_TTL)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if AUTH_HASH_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken("Token contained no recognizable user identification")
+        if not validated_token.get('is_active', True):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        user = user_cache.get(user_id)
+        if user is None or not self.matches(user, validated_token):
+            # Missing, expired, or possibly stale: the database decides
+            user = self.load_user(user_id)
+            user_cache.set(user_id, user)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if user_auth_hash(user) != validated_token[AUTH_HASH_CLAIM]:
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return copy.copy(user)
+
+    @staticmethod
+    def matches(user, validated_token):
+        return user.is_active and user_auth_hash(user) == validated_token[AUTH_HASH_CLAIM]
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def evict_cached_user(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
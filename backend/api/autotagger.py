@@ -3,23 +3,29 @@ Florence-2-based auto-tagger for FitFinder.
 
 Public API:
 
-    tags, caption = run_autotagger(image_path_or_pil)
+    tags, caption = run_autotagger(pil_image_bytes_or_file)
     category = infer_category_from_type_tags(tags, caption)
 
-The model is lazy loaded on first use
+The model is lazy loaded on first use, and so are torch and transformers:
+importing this module (for the tag vocabulary, or from views.py) costs no
+more than the regex tables below, so web workers and management commands
+start without PyTorch until something is actually tagged.
 """
 
 from __future__ import annotations
 
+import io
 import os
 import re
 import warnings
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Union
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Tuple, Optional, Union
 
-import torch
 from PIL import Image
-from transformers import AutoProcessor, AutoModelForCausalLM
+
+if TYPE_CHECKING:
+    import torch
+    from transformers import AutoProcessor, AutoModelForCausalLM
 
 # ---------------------------------------------------------------------------
 # Section 1 – Configuration
@@ -52,6 +58,8 @@ _MODEL_DTYPE: Optional[torch.dtype] = None
 # ---------------------------------------------------------------------------
 
 def _pick_device(force_cpu: bool = False) -> torch.device:
+    import torch
+
     if force_cpu:
         return torch.device("cpu")
     if torch.cuda.is_available():
@@ -62,6 +70,8 @@ def _pick_device(force_cpu: bool = False) -> torch.device:
 
 
 def _pick_dtype(pref: str, device: torch.device) -> torch.dtype:
+    import torch
+
     pref = pref.lower()
     if device.type == "cuda":
         if pref in {"float16", "fp16"}:
@@ -81,6 +91,8 @@ def _get_model_and_processor() -> Tuple[AutoModelForCausalLM, AutoProcessor, tor
     if _MODEL is not None and _PROCESSOR is not None and _DEVICE is not None:
         return _MODEL, _PROCESSOR, _DEVICE
 
+    from transformers import AutoProcessor, AutoModelForCausalLM
+
     device = _pick_device(FORCE_CPU)
     dtype = _pick_dtype(PREFERRED_DTYPE, device)
 
@@ -112,9 +124,20 @@ def _get_model_and_processor() -> Tuple[AutoModelForCausalLM, AutoProcessor, tor
 # Section 3 – Image utilities
 # ---------------------------------------------------------------------------
 
-def load_image(img: Union[str, Path, Image.Image]) -> Image.Image:
+ImageInput = Union[str, Path, Image.Image, bytes, bytearray, memoryview, BinaryIO]
+
+
+def load_image(img: ImageInput) -> Image.Image:
+    """
+    Accepts a decoded PIL image, raw image bytes (bytes / memoryview, e.g. an
+    upload still in memory), an open binary file object, or a local path.
+    """
     if isinstance(img, Image.Image):
         pil_img = img
+    elif isinstance(img, (bytes, bytearray, memoryview)):
+        pil_img = Image.open(io.BytesIO(img))
+    elif hasattr(img, "read"):
+        pil_img = Image.open(img)
     else:
         pil_img = Image.open(str(img))
     if pil_img.mode != "RGB":
@@ -387,14 +410,21 @@ def select_primary_type(
 # Section 5 – Florence-2 caption generation
 # ---------------------------------------------------------------------------
 
-@torch.inference_mode()
 def florence_generate_caption(
     img: Image.Image,
     task_token: str = TASK_MORE_DETAILED_CAPTION,
     max_new_tokens: int = MAX_NEW_TOKENS,
     num_beams: int = NUM_BEAMS,
 ) -> str:
+    import torch
+
     model, processor, device = _get_model_and_processor()
+    with torch.inference_mode():
+        return _generate_caption(model, processor, device, img, task_token, max_new_tokens, num_beams)
+
+
+def _generate_caption(model, processor, device, img, task_token, max_new_tokens, num_beams) -> str:
+    import torch
 
     prompt = task_token
     img_resized = resize_long_side(img, RESIZE_LONG_SIDE)
@@ -442,7 +472,7 @@ def image_to_tags_and_caption(img: Image.Image) -> Tuple[Dict[str, List[str]], s
 # Section 6 – Public entrypoints for Django
 # ---------------------------------------------------------------------------
 
-def run_autotagger(img: Union[str, Path, Image.Image]) -> Tuple[Dict[str, List[str]], str]:
+def run_autotagger(img: ImageInput) -> Tuple[Dict[str, List[str]], str]:
     pil_img = load_image(img)
     return image_to_tags_and_caption(pil_img)
 
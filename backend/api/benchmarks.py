@@ -0,0 +1,271 @@
+"""
+Microbenchmarks for the recommendation engine, list serialisation and outfit
+preview rendering.
+
+Used by `manage.py bench_recommendations`. Wardrobes are synthetic but shaped
+like real autotagged ones (names built from tagger vocabulary, categories from
+CATEGORY_MAP, skewed season distribution) and fully determined by a seed, so
+runs are comparable across commits.
+"""
+
+import io
+import json
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image, ImageDraw
+
+from . import fast_read
+from . import previews
+from .autotagger import CATEGORY_MAP, COLOR_WORDS, PATTERN_WORDS
+from .models import Outfit, OutfitItem, User, WardrobeItem
+from .recommendation_engine import RecommendationEngine
+from .serializers import OutfitSerializer, WardrobeItemSerializer
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+DEFAULT_LIST_SIZES = (100, 1000, 10000)
+DEFAULT_PREVIEW_SIZES = (5, 20)
+ITEMS_PER_OUTFIT = 5
+OUTFIT_ITEM_POOL = 500
+
+# Rough shape of real wardrobes
+SEASON_WEIGHTS = {'': 30, 'None': 15, 'Spring': 15, 'Summer': 15, 'Fall': 13, 'Winter': 12}
+TAGGED_RATIO = 0.8
+PATTERN_RATIO = 0.2
+BRANDS = ['', '', '', 'Uniqlo', 'Levi\'s', 'Nike', 'Zara', 'H&M', 'Patagonia']
+MATERIALS = ['', '', 'cotton', 'denim', 'wool', 'polyester', 'leather', 'linen']
+
+# Contexts every benchmark is timed against
+CONTEXTS = [
+    {'weather': 'sunny', 'occasion': 'casual', 'temperature': 27},
+    {'weather': 'cold', 'occasion': 'professional', 'temperature': 3},
+    {'weather': 'rainy', 'occasion': 'formal', 'temperature': None},
+]
+
+
+def synthetic_items(user: User, size: int, seed: int = 0) -> List[WardrobeItem]:
+    """Build (unsaved) wardrobe items for a user, deterministic for a seed."""
+    rng = random.Random(seed)
+    types = sorted(CATEGORY_MAP)
+    colors = sorted(COLOR_WORDS)
+    patterns = sorted(PATTERN_WORDS)
+    seasons = list(SEASON_WEIGHTS)
+    season_weights = list(SEASON_WEIGHTS.values())
+
+    items = []
+    for _ in range(size):
+        item_type = rng.choice(types)
+        item_colors = sorted(rng.sample(colors, rng.choice((1, 1, 1, 2))))
+        item_patterns = [rng.choice(patterns)] if rng.random() < PATTERN_RATIO else []
+        name = " ".join(item_patterns + item_colors[:1] + [item_type]).title()[:30]
+        tags = {}
+        if rng.random() < TAGGED_RATIO:
+            tags = {'type': [item_type], 'color': item_colors, 'pattern': item_patterns}
+        items.append(WardrobeItem(
+            user=user,
+            name=name,
+            category=CATEGORY_MAP[item_type],
+            season=rng.choices(seasons, season_weights)[0],
+            brand=rng.choice(BRANDS),
+            material=rng.choice(MATERIALS),
+            tags=tags,
+        ))
+    return items
+
+
+def create_wardrobe(size: int, seed: int = 0, username: Optional[str] = None) -> User:
+    """Create a user with a synthetic wardrobe of the given size."""
+    username = username or f"bench_{size}_{seed}"
+    user = User.objects.create_user(username, f"{username}@bench.local", "Bench", "User", "bench-password")
+    WardrobeItem.objects.bulk_create(synthetic_items(user, size, seed), batch_size=2000)
+    return user
+
+
+def create_outfits(user: User, count: int, seed: int = 0) -> None:
+    """
+    Create outfits of ITEMS_PER_OUTFIT random items from the user's wardrobe.
+    Items come from the first OUTFIT_ITEM_POOL of the wardrobe: real outfits
+    reuse a core of everyday pieces, and the serializer path's prefetch hits
+    SQLite's expression depth limit past ~1000 distinct items.
+    """
+    rng = random.Random(seed)
+    item_ids = list(WardrobeItem.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:OUTFIT_ITEM_POOL])
+    outfits = Outfit.objects.bulk_create(
+        [Outfit(user=user, name=f"Outfit {index}", is_favorite=rng.random() < 0.3) for index in range(count)],
+        batch_size=2000,
+    )
+    layers = [choice[0] for choice in OutfitItem.LAYER_CHOICES]
+    OutfitItem.objects.bulk_create(
+        [
+            OutfitItem(outfit=outfit, clothing_item_id=item_id, layer=rng.choice(layers),
+                       position_x=rng.uniform(0, 400), position_y=rng.uniform(0, 600), z_index=z_index)
+            for outfit in outfits
+            for z_index, item_id in enumerate(rng.sample(item_ids, min(ITEMS_PER_OUTFIT, len(item_ids))))
+        ],
+        batch_size=2000,
+    )
+
+
+def measure(fn: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    """
+    Time fn() and record its query count and peak traced memory.
+    Timings exclude the tracemalloc run, which is done separately.
+    """
+    fn()  # warm up caches and lazy imports
+
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'queries': len(queries.captured_queries) // repeat,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run_recommendation_suite(sizes: Sequence[int] = DEFAULT_SIZES, repeat: int = 5, seed: int = 0) -> Dict:
+    """Benchmark the engine entrypoints for every wardrobe size."""
+    results = {}
+    for size in sizes:
+        user = create_wardrobe(size, seed)
+        for context in CONTEXTS:
+            label = f"{context['weather']}/{context['occasion']}"
+            results[f"generate_recommendation[{size}][{label}]"] = measure(
+                lambda: RecommendationEngine.generate_recommendation(user=user, **context), repeat
+            )
+            results[f"generate_multiple_recommendations[{size}][{label}]"] = measure(
+                lambda: RecommendationEngine.generate_multiple_recommendations(user=user, **context), repeat
+            )
+    return results
+
+
+def run_list_suite(sizes: Sequence[int] = DEFAULT_LIST_SIZES, repeat: int = 5, seed: int = 0) -> Dict:
+    """
+    Rows per second for the wardrobe item and outfit list payloads, through
+    the serializers and through the values() fast read path.
+    """
+    request = RequestFactory().get('/', HTTP_HOST='localhost')
+    context = {'request': request}
+    results = {}
+    for size in sizes:
+        user = create_wardrobe(size, seed, f"list_{size}_{seed}")
+        outfit_count = max(1, size // ITEMS_PER_OUTFIT)
+        create_outfits(user, outfit_count, seed)
+
+        # Fresh querysets per run so nothing is served from a result cache
+        items = lambda: WardrobeItem.objects.filter(user=user)
+        outfits = lambda: Outfit.objects.filter(user=user)
+        cases = {
+            f"wardrobe_items.serializer[{size}]": (size, lambda: WardrobeItemSerializer(
+                items(), many=True, context=context).data),
+            f"wardrobe_items.fast_read[{size}]": (size, lambda: fast_read.wardrobe_item_dicts(
+                items().values(*fast_read.WARDROBE_ITEM_COLUMNS), request)),
+            f"outfits.serializer[{outfit_count}]": (outfit_count, lambda: OutfitSerializer(
+                outfits().prefetch_related('items__clothing_item'), many=True, context=context).data),
+            f"outfits.fast_read[{outfit_count}]": (outfit_count, lambda: fast_read.outfit_dicts(
+                outfits().values(*fast_read.OUTFIT_COLUMNS), request)),
+        }
+        for name, (rows, fn) in cases.items():
+            result = measure(fn, repeat)
+            result['rows_per_sec'] = round(rows / (result['median_ms'] / 1000)) if result['median_ms'] else None
+            results[name] = result
+    return results
+
+
+def synthetic_photo(rng: random.Random, size=(1200, 1600)) -> ContentFile:
+    """A JPEG the size of a phone photo: a coloured garment shape on white."""
+    image = Image.new('RGB', size, (255, 255, 255))
+    colour = tuple(rng.randrange(256) for _ in range(3))
+    width, height = size
+    ImageDraw.Draw(image).rounded_rectangle((width // 6, height // 8, width * 5 // 6, height * 7 // 8), 80, colour)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return ContentFile(buffer.getvalue(), name="photo.jpg")
+
+
+def run_preview_suite(sizes: Sequence[int] = DEFAULT_PREVIEW_SIZES, repeat: int = 5, seed: int = 0) -> Dict:
+    """
+    Milliseconds per server-side outfit preview (api/previews.py) for outfits
+    of each item count, and the cost of the layout hash check that skips
+    re-rendering unchanged outfits. Photos are written to a throwaway MEDIA_ROOT.
+    """
+    rng = random.Random(seed)
+    results = {}
+    media_root = tempfile.mkdtemp()
+    try:
+        with override_settings(MEDIA_ROOT=media_root, API_OUTFIT_PREVIEW_RENDERING='off'):
+            for size in sizes:
+                user = User.objects.create_user(f"preview_{size}_{seed}", f"preview_{size}_{seed}@bench.local",
+                                                "Bench", "User", "bench-password")
+                outfit = Outfit.objects.create(user=user, name=f"Outfit of {size}")
+                width, height = settings.API_OUTFIT_PREVIEW_CANVAS
+                OutfitItem.objects.bulk_create(
+                    OutfitItem(outfit=outfit, layer='tops', z_index=z_index,
+                               clothing_item=WardrobeItem.objects.create(user=user, name=f"Item {z_index}",
+                                                                         item_image=synthetic_photo(rng)),
+                               position_x=rng.uniform(0, width - 150), position_y=rng.uniform(0, height - 150),
+                               size_width=rng.uniform(100, 200), size_height=rng.uniform(100, 200),
+                               rotation=rng.choice((0, 0, 15, 345)))
+                    for z_index in range(size)
+                )
+                rows = previews.item_layouts([outfit.pk])[outfit.pk]
+                results[f"outfit_preview.render[{size}]"] = measure(lambda: previews.render(rows), repeat)
+                previews.refresh(Outfit.objects.filter(pk=outfit.pk))
+                results[f"outfit_preview.unchanged[{size}]"] = measure(
+                    lambda: previews.refresh(Outfit.objects.filter(pk=outfit.pk)), repeat
+                )
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = 0.2, metrics=('median_ms', 'queries', 'peak_kb')) -> List[str]:
+    """
+    Compare results against a baseline. Returns one message per metric that
+    grew by more than threshold (a fraction, e.g. 0.2 for +20%). Query counts
+    must not grow at all.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in metrics:
+            if metric not in current or metric not in previous:
+                continue
+            allowed = previous[metric] if metric == 'queries' else previous[metric] * (1 + threshold)
+            if current[metric] > allowed:
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+
+def load(path: str) -> Dict:
+    with open(path) as handle:
+        return json.load(handle).get('results', {})
+
+
+def save(path: str, results: Dict, **meta) -> None:
+    with open(path, 'w') as handle:
+        json.dump({'meta': meta, 'results': results}, handle, indent=2, sort_keys=True)
@@ -0,0 +1,169 @@
+"""
+HSV color model for the recommendation engine.
+
+Every color the autotagger can produce (COLOR_WORDS / COLOR_ALIASES) is mapped to
+an HSV triple once at import. Harmony between two colors comes from their hue
+relationship (neutral, monochrome, analogous, complementary, ...) and is
+materialised as a square matrix, so scoring a pair of items is just
+HARMONY[color_a][color_b] on their color indexes.
+"""
+
+import colorsys
+import re
+from array import array
+from typing import Dict, Optional, Sequence, Tuple
+
+from .autotagger import COLOR_ALIASES, COLOR_WORDS
+
+# Representative sRGB value for every color in the tagger vocabulary
+COLOR_RGB: Dict[str, Tuple[int, int, int]] = {
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+    "gray": (128, 128, 128),
+    "charcoal": (54, 69, 79),
+    "silver": (192, 192, 192),
+    "ivory": (255, 255, 240),
+    "cream": (255, 253, 208),
+    "beige": (245, 245, 220),
+    "tan": (210, 180, 140),
+    "khaki": (195, 176, 145),
+    "brown": (139, 69, 19),
+    "navy": (0, 0, 128),
+    "red": (220, 20, 60),
+    "maroon": (128, 0, 0),
+    "burgundy": (128, 0, 32),
+    "coral": (255, 127, 80),
+    "salmon": (250, 128, 114),
+    "orange": (255, 140, 0),
+    "mustard": (225, 173, 1),
+    "gold": (212, 175, 55),
+    "yellow": (255, 221, 0),
+    "lime": (50, 205, 50),
+    "olive": (128, 128, 0),
+    "green": (0, 128, 0),
+    "mint": (152, 255, 152),
+    "teal": (0, 128, 128),
+    "turquoise": (64, 224, 208),
+    "aqua": (0, 255, 255),
+    "cyan": (0, 183, 235),
+    "blue": (30, 80, 200),
+    "lavender": (181, 126, 220),
+    "purple": (128, 0, 128),
+    "magenta": (255, 0, 255),
+    "fuchsia": (255, 0, 144),
+    "pink": (255, 182, 193),
+}
+
+# Shades that behave as neutrals in an outfit even though they have a clear hue
+FASHION_NEUTRALS = {"navy", "khaki", "tan", "beige", "cream", "ivory", "brown"}
+
+DEFAULT_COLOR = "gray"
+
+# Harmony scores (0-1) by relationship
+NEUTRAL_SCORE = 0.9
+COMPLEMENTARY_SCORE = 0.85
+ANALOGOUS_SCORE = 0.8
+MONOCHROME_SCORE = 0.7
+TRIADIC_SCORE = 0.6
+CLASH_SCORE = 0.4
+
+# Canonical color names, in matrix order
+COLORS: Tuple[str, ...] = tuple(sorted(set(COLOR_WORDS) | set(COLOR_ALIASES.values()) | {DEFAULT_COLOR}))
+COLOR_INDEX: Dict[str, int] = {name: index for index, name in enumerate(COLORS)}
+
+# Alias -> index, e.g. 'grey' -> index of 'gray'
+_LOOKUP: Dict[str, int] = dict(COLOR_INDEX)
+for _alias, _canonical in COLOR_ALIASES.items():
+    _LOOKUP[_alias] = COLOR_INDEX[_canonical]
+
+DEFAULT_INDEX = COLOR_INDEX[DEFAULT_COLOR]
+
+
+def _to_hsv(rgb: Tuple[int, int, int]) -> Tuple[float, float, float]:
+    r, g, b = (channel / 255.0 for channel in rgb)
+    return colorsys.rgb_to_hsv(r, g, b)
+
+
+HSV: Tuple[Tuple[float, float, float], ...] = tuple(_to_hsv(COLOR_RGB[name]) for name in COLORS)
+
+
+def is_neutral(index: int) -> bool:
+    """Low saturation or low value colors (and fashion neutrals) go with anything."""
+    _, saturation, value = HSV[index]
+    return COLORS[index] in FASHION_NEUTRALS or saturation < 0.2 or value < 0.25
+
+
+def hue_distance(index_a: int, index_b: int) -> float:
+    """Distance between two hues on the color wheel, in degrees (0-180)."""
+    distance = abs(HSV[index_a][0] - HSV[index_b][0]) * 360.0
+    return min(distance, 360.0 - distance)
+
+
+def pair_harmony(index_a: int, index_b: int) -> float:
+    """Score how well two colors go together (0-1), from their hue relationship."""
+    if index_a == index_b:
+        return MONOCHROME_SCORE
+    if is_neutral(index_a) or is_neutral(index_b):
+        return NEUTRAL_SCORE
+
+    distance = hue_distance(index_a, index_b)
+    if distance <= 30:
+        return ANALOGOUS_SCORE
+    if distance >= 150:
+        return COMPLEMENTARY_SCORE
+    if 100 <= distance <= 140:
+        return TRIADIC_SCORE
+    return CLASH_SCORE
+
+
+# HARMONY[a][b] for every pair of color indexes
+HARMONY: Tuple[array, ...] = tuple(
+    array('d', (pair_harmony(a, b) for b in range(len(COLORS)))) for a in range(len(COLORS))
+)
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def color_index(name: Optional[str]) -> Optional[int]:
+    """Index of a color name or alias, or None if it is not a known color."""
+    if not name:
+        return None
+    return _LOOKUP.get(name.strip().lower())
+
+
+def index_from_tags(color_tag) -> Optional[int]:
+    """Index of the first known color in a color tag (list or legacy string)."""
+    if isinstance(color_tag, str):
+        color_tag = [color_tag]
+    if isinstance(color_tag, list):
+        for value in color_tag:
+            if isinstance(value, str):
+                index = color_index(value)
+                if index is not None:
+                    return index
+    return None
+
+
+def index_from_name(name: str) -> Optional[int]:
+    """Index of the first whole-word color in a lowercased item name."""
+    for word in _WORD_RE.findall(name):
+        index = _LOOKUP.get(word)
+        if index is not None:
+            return index
+    return None
+
+
+def extract_color_index(name: str, color_tag=None) -> int:
+    """Dominant color index from the color tag, then the item name, else gray."""
+    index = index_from_tags(color_tag)
+    if index is None:
+        index = index_from_name(name)
+    return DEFAULT_INDEX if index is None else index
+
+
+def mean_harmony(index: int, others: Sequence[int]) -> float:
+    """Average harmony of one color against several others."""
+    if not others:
+        return 1.0
+    row = HARMONY[index]
+    return sum(row[other] for other in others) / len(others)
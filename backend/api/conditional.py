@@ -0,0 +1,101 @@
+"""
+HTTP conditional GETs for per-user data.
+
+ConditionalGetMixin gives DRF views ETag / Last-Modified headers derived from
+the user's UserDataVersion counters, and answers a matching If-None-Match
+with 304 Not Modified before the view queries or serializes anything. The
+check costs one primary-key lookup on UserDataVersion, made after
+authentication.
+
+The ETag also covers the request path, query string and Accept header, so
+different pages, shapes and formats of the same data never share one.
+
+Last-Modified is informational only: it has one-second resolution, so two
+changes within a second would make If-Modified-Since answer 304 wrongly.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import UserDataVersion
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    # UserDataVersion counters the response body depends on
+    etag_versions = ('wardrobe',)
+    # Viewset actions to cover; None covers every GET/HEAD of the view
+    conditional_actions = None
+
+    def get_data_versions(self, request):
+        """
+        (counters, changed_at timestamps) of the user's `etag_versions`, read
+        once per request; timestamps are None until the user's first change.
+        """
+        if getattr(self, '_data_versions', None) is None:
+            changed_at = [f'{name}_changed_at' for name in self.etag_versions]
+            row = UserDataVersion.objects.filter(user_id=request.user.pk).values_list(
+                *self.etag_versions, *changed_at
+            ).first()
+            count = len(self.etag_versions)
+            self._data_versions = (row[:count], row[count:]) if row else ((0,) * count, (None,) * count)
+        return self._data_versions
+
+    def get_validators(self, request):
+        """(etag, last_modified timestamp or None) for the current request."""
+        versions, changed_at = self.get_data_versions(request)
+        timestamps = [value for value in changed_at if value]
+
+        key = "|".join([
+            str(request.user.pk),
+            ",".join(str(version) for version in versions),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ])
+        etag = f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        return etag, last_modified
+
+    def is_conditional(self, request):
+        if request.method not in SAFE_METHODS or not request.user.is_authenticated:
+            return False
+        return self.conditional_actions is None or getattr(self, 'action', None) in self.conditional_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._data_versions = None
+        self.validators = None
+        if not self.is_conditional(request):
+            return
+        self.validators = self.get_validators(request)
+        etag, _ = self.validators
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            raise NotModified(not_modified)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, 'validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Per-user content: shared caches must not serve it across tokens, and
+            # browsers must revalidate rather than guess freshness from Last-Modified
+            patch_vary_headers(response, ['Authorization'])
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
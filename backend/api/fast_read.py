@@ -0,0 +1,169 @@
+"""
+values()-based read path for high-volume list endpoints.
+
+WardrobeItemSerializer / OutfitSerializer build a model instance and walk a
+field tree for every row. For plain list reads this module builds the same
+response dicts straight from .values() rows instead, with image URLs made by
+joining a prefix computed once per request.
+
+The output must stay byte-identical to the serializers (api/tests.py checks
+this), so it only kicks in when:
+
+- settings.API_FAST_READS is on,
+- images are on FileSystemStorage, directly or under content-addressed
+  storage (other storages build URLs their own way),
+- the client asked for the default shape: no ?fields= / ?expand= / ?sideload=,
+  with API_LEGACY_FULL_NESTING on.
+
+Field order and scalar conversions (decimals, datetimes) reuse the
+serializers' own field objects.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework.response import Response
+
+from . import images
+from .models import Outfit, OutfitItem, WardrobeItem
+from .serializers import OutfitItemSerializer, OutfitSerializer, WardrobeItemSerializer
+from .storage import backend_of
+
+SHAPING_PARAMS = ('fields', 'expand', 'sideload')
+
+WARDROBE_ITEM_COLUMNS = ('id', 'item_image', 'image_variants', 'category', 'season', 'brand', 'material',
+                         'price', 'name', 'tags', 'user_id')
+OUTFIT_COLUMNS = ('id', 'name', 'occasion', 'season', 'preview_image', 'preview_variants', 'is_favorite',
+                  'scheduled_date', 'created_at', 'updated_at', 'likes', 'tags')
+OUTFIT_ITEM_COLUMNS = ('id', 'outfit_id', 'clothing_item_id', 'layer', 'position_x', 'position_y',
+                       'size_width', 'size_height', 'rotation', 'z_index')
+
+
+@lru_cache(maxsize=None)
+def serializer_fields(serializer_class):
+    """The serializer's field objects, built once, for their to_representation()."""
+    return serializer_class().fields
+
+
+def uses_filesystem_storage():
+    return all(
+        isinstance(backend_of(model._meta.get_field(name).storage), FileSystemStorage)
+        for model, name in ((WardrobeItem, 'item_image'), (Outfit, 'preview_image'))
+    )
+
+
+def is_enabled(request):
+    if not settings.API_FAST_READS or not settings.API_LEGACY_FULL_NESTING:
+        return False
+    if any(param in request.query_params for param in SHAPING_PARAMS):
+        return False
+    return uses_filesystem_storage()
+
+
+class ImageUrls:
+    """Builds FileField URLs for one request the way FileSystemStorage + ImageField do."""
+
+    def __init__(self, storage, request=None):
+        base_url = backend_of(storage).base_url
+        self.prefix = request.build_absolute_uri(base_url) if request is not None else base_url
+
+    def __call__(self, name):
+        if not name:
+            return None
+        return self.prefix + filepath_to_uri(name).lstrip("/")
+
+
+def wardrobe_item_dicts(rows, request):
+    """Rows of WARDROBE_ITEM_COLUMNS -> WardrobeItemSerializer output."""
+    fields = serializer_fields(WardrobeItemSerializer)
+    price = fields['price'].to_representation
+    image_url = ImageUrls(WardrobeItem._meta.get_field('item_image').storage, request)
+    return [
+        {
+            'id': row['id'],
+            'item_image': image_url(row['item_image']),
+            'item_image_srcset': images.srcset(row['image_variants'], image_url),
+            'category': row['category'],
+            'season': row['season'],
+            'brand': row['brand'],
+            'material': row['material'],
+            'price': price(row['price']) if row['price'] is not None else None,
+            'name': row['name'],
+            'tags': row['tags'],
+            'user': row['user_id'],
+        }
+        for row in rows
+    ]
+
+
+def outfit_dicts(rows, request):
+    """Rows of OUTFIT_COLUMNS -> OutfitSerializer output, items included (2 queries)."""
+    fields = serializer_fields(OutfitSerializer)
+    item_fields = serializer_fields(OutfitItemSerializer)
+    datetime = fields['scheduled_date'].to_representation
+    as_float = item_fields['position_x'].to_representation
+    preview_url = ImageUrls(Outfit._meta.get_field('preview_image').storage, request)
+
+    outfit_ids = [row['id'] for row in rows]
+    items_by_outfit = {outfit_id: [] for outfit_id in outfit_ids}
+    item_rows = list(OutfitItem.objects.filter(outfit_id__in=outfit_ids).values(*OUTFIT_ITEM_COLUMNS))
+    clothing_ids = {row['clothing_item_id'] for row in item_rows}
+    clothing = {
+        item['id']: item
+        for item in wardrobe_item_dicts(
+            WardrobeItem.objects.filter(id__in=clothing_ids).values(*WARDROBE_ITEM_COLUMNS), request
+        )
+    } if clothing_ids else {}
+
+    for row in item_rows:
+        items_by_outfit[row['outfit_id']].append({
+            'id': row['id'],
+            'clothing_item': clothing[row['clothing_item_id']],
+            'layer': row['layer'],
+            'position_x': as_float(row['position_x']),
+            'position_y': as_float(row['position_y']),
+            'size_width': as_float(row['size_width']),
+            'size_height': as_float(row['size_height']),
+            'rotation': as_float(row['rotation']),
+            'z_index': row['z_index'],
+        })
+
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'occasion': row['occasion'],
+            'season': row['season'],
+            # OutfitSerializer only returns preview URLs when it has the request
+            'preview_image_url': preview_url(row['preview_image']) if request is not None else None,
+            'preview_image_srcset': images.srcset(row['preview_variants'], preview_url),
+            'is_favorite': row['is_favorite'],
+            'scheduled_date': datetime(row['scheduled_date']) if row['scheduled_date'] is not None else None,
+            'created_at': datetime(row['created_at']),
+            'updated_at': datetime(row['updated_at']),
+            'likes': row['likes'],
+            'tags': row['tags'],
+            'items': items_by_outfit[row['id']],
+        }
+        for row in rows
+    ]
+
+
+def list_response(view, queryset, columns, build):
+    """Paginate queryset.values(*columns) with the view's paginator and build the response."""
+    request = view.request
+    queryset = queryset.prefetch_related(None).values(*columns)
+    page = view.paginate_queryset(queryset)
+    if page is not None:
+        return view.get_paginated_response(build(page, request))
+    return Response(build(list(queryset), request))
+
+
+def wardrobe_items_response(view, queryset):
+    return list_response(view, queryset, WARDROBE_ITEM_COLUMNS, wardrobe_item_dicts)
+
+
+def outfits_response(view, queryset):
+    return list_response(view, queryset, OUTFIT_COLUMNS, outfit_dicts)
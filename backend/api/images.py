@@ -0,0 +1,280 @@
+"""
+Responsive derivatives of uploaded images.
+
+Wardrobe item photos and outfit previews are stored at whatever size was
+uploaded. build_variants() decodes an image once and writes smaller copies
+(settings.API_IMAGE_DERIVATIVE_WIDTHS) in modern formats
+(settings.API_IMAGE_DERIVATIVE_FORMATS, minus any this Pillow build cannot
+encode) next to the original, through the field's own storage, so it works
+the same on MEDIA_ROOT and on Cloudinary. Each width is resized from the next
+larger one rather than from the full image. Fresh uploads are decoded from
+the upload's own buffer (see ImageSource), and that decode is shared with
+tagging; other images are streamed from storage, and JPEGs among them are
+decoded at a reduced scale when the largest width allows it.
+
+The names written are recorded on the model (WardrobeItem.image_variants,
+Outfit.preview_variants) as
+
+    {"source": "<original name>", "formats": {"webp": {"160": "<name>", ...}, ...}}
+
+and serializers expose them as srcset strings per format:
+
+    {"webp": "https://.../shirt_160w.webp 160w, https://.../shirt_320w.webp 320w"}
+
+Variants are rebuilt when a save changes the image (see refresh_variants,
+called from post_save) and for existing media by
+`manage.py generate_image_derivatives`.
+"""
+
+import hashlib
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from django.utils.functional import cached_property
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger('api.images')
+
+# model label -> (image field, variants field, UserDataVersion counter)
+IMAGE_FIELDS = {
+    'api.WardrobeItem': ('item_image', 'image_variants', 'wardrobe'),
+    'api.Outfit': ('preview_image', 'preview_variants', 'outfits'),
+}
+
+# Pillow format name, file extension and encoder options per output format
+FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def enabled_formats():
+    return [fmt for fmt in settings.API_IMAGE_DERIVATIVE_FORMATS if fmt in FORMATS and features.check(fmt)]
+
+
+def derivative_name(name, width, fmt):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}_{width}w.{FORMATS[fmt][1]}"
+
+
+def decode(source, max_width=None):
+    """
+    Open and fully decode an image, upright and in a mode every output format
+    accepts. With max_width, JPEGs may be decoded at a reduced scale.
+    """
+    image = Image.open(source)
+    if image.format == 'JPEG' and max_width:
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers max_width
+        image.draft('RGB', (max_width, max_width * image.height // max(image.width, 1)))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def resized(image, widths):
+    """(width, image) for each width below the image's own, largest first; the image itself if none."""
+    widths = sorted({width for width in widths if width < image.width}, reverse=True)
+    if not widths:
+        yield image.width, image
+        return
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+        yield width, image
+
+
+class ImageSource:
+    """
+    The bytes and decoded pixels of one stored image, each produced at most
+    once and shared by derivative generation, hashing and tagging.
+
+    When the image was uploaded in this request, the bytes come from the
+    upload's own buffer (in memory, or the temporary file Django spooled a
+    large upload to) and storage is never read back. Images saved earlier are
+    streamed from storage, so nothing needs a local `.path` and Cloudinary
+    works the same as MEDIA_ROOT.
+    """
+
+    def __init__(self, storage, name, upload=None):
+        self.storage = storage
+        self.name = name
+        self.upload = upload
+
+    @cached_property
+    def buffer(self):
+        """The image bytes as a memoryview."""
+        if self.upload is not None:
+            inner = getattr(self.upload, 'file', None)
+            if isinstance(inner, io.BytesIO):
+                # Not getbuffer(): an exported buffer would make closing the upload fail
+                return memoryview(inner.getvalue())
+            self.upload.seek(0)
+            return memoryview(self.upload.read())
+        with self.storage.open(self.name, 'rb') as stored:
+            return memoryview(stored.read())
+
+    @cached_property
+    def sha256(self):
+        # Content-addressed storage has already hashed the upload while saving it
+        digest = getattr(self.upload, 'sha256', None)
+        return digest or hashlib.sha256(self.buffer).hexdigest()
+
+    @cached_property
+    def image(self):
+        """The full image decoded once, upright, RGB or RGBA."""
+        if self.upload is None and 'buffer' not in self.__dict__:
+            with self.storage.open(self.name, 'rb') as stored:
+                return decode(stored)
+        return decode(io.BytesIO(self.buffer))
+
+
+def remember_upload(instance):
+    """
+    Called from pre_save: keep the upload about to be written, because once
+    saved the FieldFile only holds the stored name, and the name it replaces,
+    for release_replaced().
+    """
+    image_field = IMAGE_FIELDS[instance._meta.label][0]
+    field_file = getattr(instance, image_field)
+    uploads = instance.__dict__.setdefault('_image_uploads', {})
+    replaced = instance.__dict__.setdefault('_replaced_images', {})
+    upload = getattr(field_file, '_file', None) if field_file and not field_file._committed else None
+    if isinstance(upload, (UploadedFile, ContentFile)):
+        uploads[image_field] = upload
+    else:
+        uploads.pop(image_field, None)
+    replaced.pop(image_field, None)
+    if upload is not None and instance.pk is not None and getattr(field_file.storage, 'reference_counted', False):
+        old = type(instance).objects.filter(pk=instance.pk).values_list(image_field, flat=True).first()
+        if old:
+            replaced[image_field] = old
+
+
+def release(storage, name):
+    """
+    Give up one reference to a stored original. Only reference-counted storage
+    (api/storage.py) deletes anything; elsewhere originals are kept as before.
+    """
+    if name and getattr(storage, 'reference_counted', False):
+        try:
+            storage.delete(name)
+        except Exception as exc:
+            logger.warning("Could not release %s: %s", name, exc)
+
+
+def release_replaced(instance):
+    """Called from post_save: release the original an upload replaced."""
+    image_field = IMAGE_FIELDS[instance._meta.label][0]
+    old = instance.__dict__.get('_replaced_images', {}).pop(image_field, None)
+    if old:
+        release(getattr(instance, image_field).storage, old)
+
+
+def image_source(field_file):
+    """The ImageSource of a model's image, shared by everyone handling that instance."""
+    instance, field_name = field_file.instance, field_file.field.name
+    sources = instance.__dict__.setdefault('_image_sources', {})
+    source = sources.get(field_name)
+    if source is None or source.name != field_file.name:
+        upload = instance.__dict__.get('_image_uploads', {}).get(field_name)
+        source = sources[field_name] = ImageSource(field_file.storage, field_file.name, upload)
+    return source
+
+
+def build_variants(storage, name, source=None):
+    """
+    Write derivatives of the stored image `name` and return its variants dict.
+
+    `source` is the image's ImageSource when one is already at hand (fresh
+    uploads); without it the image is streamed from storage and JPEGs are
+    decoded at the scale the largest derivative needs.
+    """
+    formats = enabled_formats()
+    widths = settings.API_IMAGE_DERIVATIVE_WIDTHS
+    variants = {'source': name, 'formats': {fmt: {} for fmt in formats}}
+    if not formats or not widths:
+        return variants
+
+    if source is None:
+        with storage.open(name, 'rb') as stored:
+            image = decode(stored, max(widths))
+    else:
+        image = source.image
+
+    for width, derivative in resized(image, widths):
+        for fmt in formats:
+            pil_format, _, options = FORMATS[fmt]
+            buffer = io.BytesIO()
+            derivative.save(buffer, pil_format, **options)
+            variants['formats'][fmt][str(width)] = storage.save(
+                derivative_name(name, width, fmt), ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def delete_variants(storage, variants):
+    for names in (variants or {}).get('formats', {}).values():
+        for name in names.values():
+            try:
+                storage.delete(name)
+            except Exception as exc:
+                logger.warning("Could not delete derivative %s: %s", name, exc)
+
+
+def srcset(variants, url):
+    """{format: "url 160w, url 320w"} from a variants dict; `url` maps a stored name to its URL."""
+    result = {}
+    for fmt, names in (variants or {}).get('formats', {}).items():
+        if names:
+            result[fmt] = ", ".join(
+                f"{url(name)} {width}w" for width, name in sorted(names.items(), key=lambda entry: int(entry[0]))
+            )
+    return result
+
+
+def is_current(name, variants):
+    return (variants or {}).get('source', '') == (name or '')
+
+
+def build_variants_safely(storage, name, source=None):
+    try:
+        return build_variants(storage, name, source)
+    except Exception as exc:
+        # A broken image must not fail the upload; record it so saves do not retry it
+        logger.warning("Could not build derivatives of %s: %s", name, exc)
+        return {'source': name, 'formats': {}}
+
+
+def save_variants(model, pk, user_id, variants):
+    """Store a variants dict without re-running save() signals, and invalidate the user's caches."""
+    from .models import UserDataVersion
+
+    _, variants_field, counter = IMAGE_FIELDS[model._meta.label]
+    model.objects.filter(pk=pk).update(**{variants_field: variants, 'updated_at': timezone.now()})
+    UserDataVersion.bump(user_id, counter)
+
+
+def refresh_variants(instance):
+    """Rebuild the derivatives of `instance` if its image changed since they were made."""
+    image_field, variants_field, _ = IMAGE_FIELDS[instance._meta.label]
+    image = getattr(instance, image_field)
+    old = getattr(instance, variants_field)
+    if is_current(image.name, old):
+        return
+    delete_variants(image.storage, old)
+    variants = build_variants_safely(image.storage, image.name, image_source(image)) if image.name else {}
+    setattr(instance, variants_field, variants)
+    save_variants(type(instance), instance.pk, instance.user_id, variants)
+
+
+def build_variants_task(model_label, pk, name):
+    """Process pool entry point for the backfill command; builds files only, no database writes."""
+    image_field, _, _ = IMAGE_FIELDS[model_label]
+    storage = apps.get_model(model_label)._meta.get_field(image_field).storage
+    return model_label, pk, build_variants_safely(storage, name)
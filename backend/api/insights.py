@@ -0,0 +1,278 @@
+"""
+Style insights, maintained incrementally.
+
+GET /api/insights/ reports:
+
+- counts of the user's wardrobe items by category, season, colour and
+  pattern,
+- the most worn items (placed in the most outfits),
+- favourite colours (the colours of the items in the user's outfits, once
+  per placement).
+
+Scanning the wardrobe and outfit tables for that on every request would cost
+O(wardrobe). Instead, two aggregate tables hold the answer:
+
+- WardrobeInsights is one row per user with the counters.
+- ItemWear holds per-item outfit counts. Its (user, -outfits) index returns
+  the most worn items without touching the rest.
+
+A read is therefore two single-index lookups at any wardrobe size.
+
+Writes apply deltas to both tables:
+
+- wardrobe item saves and deletes, via signals in api/models.py. pre_save
+  reads what the stored row contributes (one query, which also tells whether
+  the owner has insights), so post_save only applies an actual change,
+- outfit creation and deletion, and single OutfitItem saves, also via
+  signals,
+- the bulk outfit item writes of OutfitCreateUpdateSerializer, which call
+  outfit_items_changed() themselves.
+
+Only a user's own items placed in their own outfits count as worn; outfits
+may reference other users' items, which are left out everywhere.
+
+A user's first read builds their row from scratch. Until then writes only
+check that the row is missing and skip the rest. Writes that go around all
+of this (bulk imports, raw updates) drop the row with invalidate(), so the
+next read rebuilds it. `manage.py reconcile_insights` rebuilds rows
+periodically and reports any that had drifted.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import ItemWear, OutfitItem, Outfit, WardrobeInsights, WardrobeItem
+from .search import ranked
+
+FIELD_FACETS = ('category', 'season')
+TAG_FACETS = ('color', 'pattern')
+# The item columns the facets are read from
+SOURCE_FIELDS = (*FIELD_FACETS, 'tags')
+TOP = 5
+
+
+def tag_values(tags, key):
+    """Values of one tag, which is normally a list but may be a single string."""
+    values = tags.get(key) if isinstance(tags, dict) else None
+    if isinstance(values, str):
+        values = [values]
+    return tuple(str(value) for value in values or () if value not in (None, ""))
+
+
+def contribution(category, season, tags):
+    """What a wardrobe item with these SOURCE_FIELDS contributes to the facets."""
+    return (category, season, *(tag_values(tags, key) for key in TAG_FACETS))
+
+
+def touches_facets(update_fields):
+    return update_fields is None or not set(update_fields).isdisjoint(SOURCE_FIELDS)
+
+
+def facet_counts(snap):
+    counts = Counter()
+    for facet, value in zip(FIELD_FACETS, snap):
+        if value:
+            counts[(facet, value)] += 1
+    for facet, values in zip(TAG_FACETS, snap[len(FIELD_FACETS):]):
+        counts.update((facet, value) for value in values)
+    return counts
+
+
+def merge(counters, deltas):
+    """Add `deltas` to a {value: count} dict in place, dropping values that reach zero."""
+    for key, delta in deltas.items():
+        total = counters.get(key, 0) + delta
+        if total > 0:
+            counters[key] = total
+        else:
+            counters.pop(key, None)
+
+
+def locked_row(user_id):
+    """The user's insights row, locked for update, or None while they have none."""
+    return WardrobeInsights.objects.select_for_update().filter(user_id=user_id).first()
+
+
+def stored(item_pk):
+    """A tracked user's item as stored, or None when its owner has no insights."""
+    return WardrobeItem.objects.filter(pk=item_pk, user__insights__isnull=False)
+
+
+def apply(row, facets=(), worn=(), items=0, outfits=0):
+    facets = dict(facets)
+    for facet in {facet for facet, _ in facets}:
+        merge(row.facets.setdefault(facet, {}),
+              {value: delta for (name, value), delta in facets.items() if name == facet})
+    merge(row.worn_colors, dict(worn))
+    row.items = max(0, row.items + items)
+    row.outfits = max(0, row.outfits + outfits)
+    row.save()
+
+
+def item_saving(instance, update_fields=None):
+    """pre_save of a WardrobeItem: remember what the stored row contributes."""
+    instance._insights_before = None
+    if instance._state.adding or not touches_facets(update_fields):
+        return
+    instance._insights_before = stored(instance.pk).values_list(*SOURCE_FIELDS).first()
+
+
+def item_saved(instance, created, update_fields=None):
+    """post_save of a WardrobeItem: apply the change in what it contributes."""
+    if not touches_facets(update_fields):
+        return
+    before = instance.__dict__.pop('_insights_before', None)
+    if before is None and not created:
+        return
+    # Deferred fields were not saved, so they keep their stored values
+    after = [instance.__dict__[field] if field in instance.__dict__ else value
+             for field, value in zip(SOURCE_FIELDS, before or (None,) * len(SOURCE_FIELDS))]
+    old = None if before is None else contribution(*before)
+    new = contribution(*after)
+    if old == new:
+        return
+    with transaction.atomic():
+        row = locked_row(instance.user_id)
+        if row is None:
+            return
+        facets = facet_counts(new)
+        worn = Counter()
+        if old is not None:
+            facets.subtract(facet_counts(old))
+            old_colors, new_colors = old[len(FIELD_FACETS)], new[len(FIELD_FACETS)]
+            if old_colors != new_colors:
+                uses = ItemWear.objects.filter(item=instance).values_list('outfits', flat=True).first() or 0
+                worn.update({color: uses for color in new_colors})
+                worn.subtract({color: uses for color in old_colors})
+        apply(row, facets, worn, items=1 if created else 0)
+
+
+def item_deleting(instance):
+    """pre_delete of a WardrobeItem: what it contributes, and its placements, which go with it."""
+    instance._insights_before = stored(instance.pk).annotate(
+        uses=Count('outfititem', filter=Q(outfititem__outfit__user=F('user'))),
+    ).values_list(*SOURCE_FIELDS, 'uses').first()
+
+
+def item_deleted(instance):
+    before = instance.__dict__.pop('_insights_before', None)
+    if before is None:
+        return
+    *values, uses = before
+    old = contribution(*values)
+    with transaction.atomic():
+        row = locked_row(instance.user_id)
+        if row is None:
+            return
+        facets = Counter()
+        facets.subtract(facet_counts(old))
+        apply(row, facets, {color: -uses for color in old[len(FIELD_FACETS)]}, items=-1)
+
+
+def outfit_items_changed(user_id, added=(), removed=(), outfits=0):
+    """
+    Items were placed in (`added`) or taken out of (`removed`) the user's
+    outfits, by wardrobe item id and once per placement; `outfits` outfits
+    were created (1) or deleted (-1) along the way.
+    """
+    wear = Counter(added)
+    wear.subtract(removed)
+    wear = {item_id: delta for item_id, delta in wear.items() if delta}
+    if not wear and not outfits:
+        return
+    with transaction.atomic():
+        row = locked_row(user_id)
+        if row is None:
+            return
+        worn = Counter()
+        if wear:
+            # Only the user's own items count. ItemWear rows are written under
+            # the insights row lock, so the counts read here stay current.
+            owned = WardrobeItem.objects.filter(pk__in=wear, user_id=user_id).values_list('id', 'tags', 'wear__outfits')
+            counts = []
+            for item_id, tags, uses in owned:
+                for color in tag_values(tags, 'color'):
+                    worn[color] += wear[item_id]
+                counts.append(ItemWear(item_id=item_id, user_id=user_id, outfits=max(0, (uses or 0) + wear[item_id])))
+            ItemWear.objects.bulk_create(counts, update_conflicts=True, unique_fields=['item'], update_fields=['outfits'])
+        apply(row, worn=worn, outfits=outfits)
+
+
+def outfit_deleting(instance):
+    """pre_delete of an Outfit: remember what it placed, since its items are deleted with it."""
+    # Left join: no rows when the owner has no insights, [None] for an empty outfit
+    placed = list(Outfit.objects.filter(pk=instance.pk, user__insights__isnull=False)
+                  .values_list('items__clothing_item_id', flat=True))
+    instance._insights_items = [item_id for item_id in placed if item_id is not None] if placed else None
+
+
+def outfit_deleted(instance):
+    items = instance.__dict__.pop('_insights_items', None)
+    if items is not None:
+        outfit_items_changed(instance.user_id, removed=items, outfits=-1)
+
+
+def invalidate(user_id):
+    """Forget the user's totals; the next read rebuilds them."""
+    WardrobeInsights.objects.filter(user_id=user_id).delete()
+
+
+def state(items, outfits, facets, worn_colors):
+    """Comparable totals, ignoring order and empty facets."""
+    return items, outfits, {facet: counts for facet, counts in facets.items() if counts}, worn_colors
+
+
+@transaction.atomic
+def rebuild(user):
+    """Recompute the user's insights from their wardrobe and outfits; returns (row, whether it had drifted)."""
+    items, facets = 0, Counter()
+    rows = WardrobeItem.objects.filter(user=user).order_by().values_list(*FIELD_FACETS, 'tags')
+    for *fields, tags in rows.iterator(chunk_size=2000):
+        items += 1
+        facets.update(facet_counts((*fields, *(tag_values(tags, key) for key in TAG_FACETS))))
+
+    wear, worn = Counter(), Counter()
+    placements = (OutfitItem.objects.filter(outfit__user=user, clothing_item__user=user).order_by()
+                  .values_list('clothing_item_id', 'clothing_item__tags'))
+    for item_id, tags in placements.iterator(chunk_size=2000):
+        wear[item_id] += 1
+        worn.update(tag_values(tags, 'color'))
+    ItemWear.objects.filter(user=user).delete()
+    ItemWear.objects.bulk_create([ItemWear(item_id=item_id, user=user, outfits=count) for item_id, count in wear.items()],
+                                 batch_size=2000)
+
+    values = {
+        'items': items,
+        'outfits': Outfit.objects.filter(user=user).count(),
+        'facets': {facet: dict(ranked((value, count) for (name, value), count in facets.items() if name == facet))
+                   for facet in (*FIELD_FACETS, *TAG_FACETS)},
+        'worn_colors': dict(ranked(worn.items())),
+    }
+    previous = WardrobeInsights.objects.select_for_update().filter(user=user).first()
+    drifted = previous is not None and state(previous.items, previous.outfits, previous.facets,
+                                             previous.worn_colors) != state(**values)
+    row, _ = WardrobeInsights.objects.update_or_create(user=user, defaults=values)
+    return row, drifted
+
+
+def summary(user):
+    """The insights response for `user`, built on their first read."""
+    row = WardrobeInsights.objects.filter(user=user).first()
+    if row is None:
+        row, _ = rebuild(user)
+    most_worn = (ItemWear.objects.filter(user=user, outfits__gt=0).order_by('-outfits', 'item_id')
+                 .values('item_id', 'item__name', 'item__category', 'outfits')[:TOP])
+    return {
+        'items': row.items,
+        'outfits': row.outfits,
+        **{f'{facet}_counts': ranked(row.facets.get(facet, {}).items()) for facet in (*FIELD_FACETS, *TAG_FACETS)},
+        'favorite_colors': list(ranked(row.worn_colors.items()))[:TOP],
+        'most_worn': [
+            {'id': wear['item_id'], 'name': wear['item__name'], 'category': wear['item__category'],
+             'outfits': wear['outfits']}
+            for wear in most_worn
+        ],
+        'updated_at': row.updated_at,
+    }
@@ -0,0 +1,148 @@
+"""
+SQL query instrumentation.
+
+QueryRecorder counts and times every query run on a database connection and
+groups them by shape (the SQL template, with IN-lists collapsed), so repeated
+identical shapes - the signature of an N+1 - stand out.
+
+QueryCountMiddleware wraps each request in a recorder when
+settings.QUERY_INSTRUMENTATION is on. It adds X-Query-Count / X-Query-Time-Ms
+headers and logs a warning when a view exceeds its declared `query_budget` or
+repeats a query shape. The test suite enforces the same budgets.
+
+Views declare budgets (including the authentication lookup) as
+`query_budget = {'list': 4, 'retrieve': 4}` keyed by viewset action, or by
+lowercase HTTP method for plain API views.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('api.queries')
+
+# A shape run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_IN_LIST_RE = re.compile(r'\((?:%s, )+%s\)')
+# Transaction control depends on the backend and on how deeply a request is
+# nested in atomic blocks (test cases add one), not on what the view does, so
+# it is not counted
+_TRANSACTION_CONTROL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def query_shape(sql: str) -> str:
+    """Normalise SQL so queries that differ only in IN-list length compare equal."""
+    return _IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+class QueryRecorder:
+    """
+    Context manager recording the queries run on one connection.
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.total_ms, recorder.repeated_shapes()
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith(_TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total_ms += (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+
+    def repeated_shapes(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Query shapes executed at least `threshold` times."""
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+def get_query_budget(view_func, method: str) -> Optional[int]:
+    """Look up the declared budget for the view/action a request resolved to."""
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budgets = getattr(view_class, 'query_budget', None)
+    if not budgets:
+        return None
+    method = method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return budgets.get(actions.get(method, method))
+
+
+class QueryCountMiddleware:
+    """
+    Sync and async capable, so under ASGI async views keep running on the
+    event loop instead of being adapted onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_INSTRUMENTATION:
+            return await self.get_response(request)
+
+        # Connections are per thread: record on the one the request's
+        # sync_to_async calls (and the async ORM) share
+        recorder = await sync_to_async(lambda: QueryRecorder().__enter__())()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    @staticmethod
+    def report(request, response, recorder):
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = f"{recorder.total_ms:.1f}"
+
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(match.func, request.method) if match else None
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                "%s %s ran %d queries (budget %d)",
+                request.method, request.path, recorder.count, budget,
+            )
+        for shape, count in recorder.repeated_shapes().items():
+            logger.warning("Possible N+1 in %s %s: %dx %s", request.method, request.path, count, shape)
+
+        return response
@@ -0,0 +1,87 @@
+"""
+Benchmark the recommendation engine against synthetic wardrobes.
+
+    python manage.py bench_recommendations --sizes 10,1000,100000 --output bench.json
+    python manage.py bench_recommendations --baseline bench_baseline.json --threshold 0.25
+
+`--suite lists` instead compares rows per second of the wardrobe/outfit list
+payloads through the serializers and through api/fast_read.py, and
+`--suite previews` times server-side outfit previews (api/previews.py) with
+--sizes giving items per outfit (default 5,20).
+
+Runs offline against a throwaway SQLite test database, so it never touches
+real data. Exits with an error if any metric regressed past the threshold.
+"""
+
+import platform
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Time generate_recommendation and generate_multiple_recommendations on synthetic wardrobes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=['recommendations', 'lists', 'previews'], default='recommendations',
+                            help="What to benchmark (default: recommendations).")
+        parser.add_argument('--sizes', help="Comma separated wardrobe sizes (default depends on the suite).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per measurement.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic wardrobes.")
+        parser.add_argument('--output', help="Write results as JSON to this path.")
+        parser.add_argument('--baseline', help="Compare against results previously saved with --output.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed slowdown / memory growth as a fraction (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Benchmarks run against SQLite; unset DATABASE_URL and try again.")
+
+        if options['suite'] == 'lists':
+            run_suite, default_sizes = benchmarks.run_list_suite, benchmarks.DEFAULT_LIST_SIZES
+        elif options['suite'] == 'previews':
+            run_suite, default_sizes = benchmarks.run_preview_suite, benchmarks.DEFAULT_PREVIEW_SIZES
+        else:
+            run_suite, default_sizes = benchmarks.run_recommendation_suite, benchmarks.DEFAULT_SIZES
+        if options['sizes']:
+            sizes = [int(size) for size in options['sizes'].split(",") if size.strip()]
+        else:
+            sizes = list(default_sizes)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = run_suite(sizes, options['repeat'], options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        width = max(len(name) for name in results)
+        self.stdout.write(f"{'benchmark'.ljust(width)}  median_ms  queries  peak_kb  rows_per_sec")
+        for name, metrics in results.items():
+            self.stdout.write(
+                f"{name.ljust(width)}  {metrics['median_ms']:>9}  {metrics['queries']:>7}  {metrics['peak_kb']:>7}"
+                f"  {metrics.get('rows_per_sec') or '':>12}"
+            )
+
+        if options['output']:
+            benchmarks.save(
+                options['output'], results,
+                created_at=timezone.now().isoformat(),
+                python=sys.version.split()[0],
+                machine=platform.machine(),
+                suite=options['suite'],
+                sizes=sizes,
+                seed=options['seed'],
+            )
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            regressions = benchmarks.compare(results, benchmarks.load(options['baseline']), options['threshold'])
+            if regressions:
+                for message in regressions:
+                    self.stderr.write(f"REGRESSION {message}")
+                raise CommandError(f"{len(regressions)} benchmark regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,101 @@
+"""
+Move existing media into content-addressed storage (api/storage.py).
+
+    python manage.py dedupe_media
+    python manage.py dedupe_media --stats
+
+Wardrobe item photos and outfit previews saved before content-addressed
+storage was enabled are hashed and moved into blobs: identical files collapse
+into one blob with a reference per row, and the old files are deleted. Their
+derivatives are dropped with them; run `manage.py generate_image_derivatives`
+afterwards to rebuild them from the blobs. --stats only reports the blob
+table: blobs, references, bytes stored and bytes saved by sharing.
+"""
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import images, storage
+from api.models import StoredBlob, UserDataVersion
+
+
+class Command(BaseCommand):
+    help = "Deduplicate existing uploads into content-addressed storage and report the bytes saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true', help="Only report deduplication statistics.")
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            self._migrate(options['verbosity'])
+        stats = storage.dedup_stats()
+        self.stdout.write(
+            f"blobs={stats['blobs']} references={stats['references']} "
+            f"stored_bytes={stats['stored_bytes']} saved_bytes={stats['saved_bytes']}"
+        )
+
+    def _migrate(self, verbosity):
+        pending = self._pending()
+        if not pending:
+            self.stdout.write("All media is content-addressed.")
+            return
+
+        stored_before = storage.dedup_stats()['stored_bytes']
+        moved = missing = legacy_bytes = 0
+        for (media, name), rows in pending.items():
+            if not media.backend.exists(name):
+                missing += 1
+                self.stderr.write(f"  missing: {name}")
+                continue
+            size = media.backend.size(name)
+            with transaction.atomic():
+                with media.backend.open(name, 'rb') as legacy:
+                    blob = media.save(name, File(legacy, name))
+                if len(rows) > 1:
+                    StoredBlob.objects.filter(name=blob).update(refs=F('refs') + len(rows) - 1)
+                self._repoint(rows, blob)
+                transaction.on_commit(lambda name=name: media.backend.delete(name))
+            moved += 1
+            legacy_bytes += size
+            if verbosity >= 2:
+                self.stdout.write(f"  {name} -> {blob} ({len(rows)} refs)")
+
+        freed = legacy_bytes - (storage.dedup_stats()['stored_bytes'] - stored_before)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} files into blobs, freeing {freed} bytes ({missing} missing)."
+        ))
+        if moved:
+            self.stdout.write("Run `manage.py generate_image_derivatives` to rebuild their derivatives.")
+
+    @staticmethod
+    def _pending():
+        """{(storage, legacy name): [(model label, pk, variants, user id), ...]} for media outside blobs."""
+        pending = defaultdict(list)
+        for model_label, (image_field, variants_field, _) in images.IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            media = model._meta.get_field(image_field).storage
+            if not getattr(media, 'reference_counted', False):
+                raise CommandError("Media storage is not content-addressed; enable API_CONTENT_ADDRESSED_MEDIA.")
+            rows = (model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+                    .exclude(**{f'{image_field}__startswith': storage.BLOB_PREFIX + '/'}))
+            for pk, name, variants, user_id in rows.values_list('pk', image_field, variants_field, 'user_id'):
+                pending[media, name].append((model_label, pk, variants, user_id))
+        return pending
+
+    @staticmethod
+    def _repoint(rows, blob):
+        """Point rows at their blob, dropping derivatives made from the old file."""
+        for model_label, pk, variants, user_id in rows:
+            model = apps.get_model(model_label)
+            image_field, variants_field, counter = images.IMAGE_FIELDS[model_label]
+            images.delete_variants(model._meta.get_field(image_field).storage, variants)
+            model.objects.filter(pk=pk).update(
+                **{image_field: blob, variants_field: {}, 'updated_at': timezone.now()}
+            )
+            UserDataVersion.bump(user_id, counter)
@@ -0,0 +1,96 @@
+"""
+Backfill responsive derivatives (api/images.py) for existing images.
+
+    python manage.py generate_image_derivatives --workers 4
+    python manage.py generate_image_derivatives --force
+
+Images whose derivatives are missing or were made from a different file are
+decoded and resized in a process pool; workers only read and write storage,
+and the parent records the results. --force rebuilds every image, replacing
+the old derivative files (e.g. after changing the widths or formats).
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api import images
+
+
+def _init_worker():
+    # Forget connections inherited from the parent without closing them (closing
+    # would tear down the parent's socket); workers do not query the database
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/AVIF copies of wardrobe item photos and outfit previews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes. Use 1 to run in-process.")
+        parser.add_argument('--force', action='store_true',
+                            help="Rebuild derivatives even where they are up to date.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.verbosity = options['verbosity']
+        tasks, old_variants, self.owners = self._pending(options['force'])
+        if not tasks:
+            self.stdout.write("All derivatives are up to date.")
+            return
+
+        for (model_label, pk, _), variants in zip(tasks, old_variants):
+            image_field, _, _ = images.IMAGE_FIELDS[model_label]
+            images.delete_variants(apps.get_model(model_label)._meta.get_field(image_field).storage, variants)
+
+        if workers == 1:
+            results = (images.build_variants_task(*task) for task in tasks)
+            built, failed = self._record(results)
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+            ) as pool:
+                futures = [pool.submit(images.build_variants_task, *task) for task in tasks]
+                built, failed = self._record(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built derivatives for {built} images ({failed} could not be decoded)."
+        ))
+
+    @staticmethod
+    def _pending(force):
+        """
+        (model label, pk, image name) tasks for images needing derivatives,
+        their old variants, and {(model label, pk): user id}.
+        """
+        tasks, old_variants, owners = [], [], {}
+        for model_label, (image_field, variants_field, _) in images.IMAGE_FIELDS.items():
+            model = apps.get_model(model_label)
+            rows = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            for pk, name, variants, user_id in rows.values_list('pk', image_field, variants_field, 'user_id'):
+                if force or not images.is_current(name, variants):
+                    tasks.append((model_label, pk, name))
+                    old_variants.append(variants)
+                    owners[model_label, pk] = user_id
+        return tasks, old_variants, owners
+
+    def _record(self, results):
+        built = failed = 0
+        for model_label, pk, variants in results:
+            images.save_variants(apps.get_model(model_label), pk, self.owners[model_label, pk], variants)
+            if any(variants['formats'].values()):
+                built += 1
+            else:
+                failed += 1
+            if self.verbosity >= 2:
+                self.stdout.write(f"  {model_label} {pk}: {variants}")
+        return built, failed
@@ -0,0 +1,93 @@
+"""
+Fire concurrent requests at a running server and report throughput and latency.
+
+    python manage.py load_test --url http://localhost:8000 --token <access token> \\
+        --endpoint autotag --concurrency 32 --requests 200
+
+Used to compare the gunicorn sync profile with the uvicorn (ASGI) profile in
+DEPLOYMENT_GUIDE.md: start the server one way, run this, restart it the other
+way, run it again. `--endpoint autotag` posts a synthetic phone-sized photo to
+/api/wardrobe/autotag-preview/, `--endpoint generate` asks
+/api/recommendations/generate/ for a recommendation.
+
+503 responses are counted separately: they are the bounded executors
+(api/async_views.py) shedding load, not failures.
+"""
+
+import json
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import benchmarks
+
+ENDPOINTS = {
+    'autotag': '/api/wardrobe/autotag-preview/',
+    'generate': '/api/recommendations/generate/',
+}
+
+
+def multipart(field, upload):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{upload.name}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + upload.read() + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Command(BaseCommand):
+    help = "Load test the autotag preview or recommendation generation endpoint of a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help="Server base URL.")
+        parser.add_argument('--token', required=True, help="JWT access token for a user with a wardrobe.")
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='generate')
+        parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=100, help="Total requests to send.")
+        parser.add_argument('--timeout', type=float, default=120, help="Per request timeout in seconds.")
+
+    def handle(self, *args, **options):
+        if options['endpoint'] == 'autotag':
+            body, content_type = multipart('image', benchmarks.synthetic_photo(random.Random(0)))
+        else:
+            body = json.dumps({'weather': 'sunny', 'occasion': 'casual'}).encode()
+            content_type = 'application/json'
+        url = options['url'].rstrip('/') + ENDPOINTS[options['endpoint']]
+        headers = {'Authorization': f"Bearer {options['token']}", 'Content-Type': content_type}
+
+        def send(_):
+            request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except (urllib.error.URLError, TimeoutError) as exc:
+                status = f"error: {getattr(exc, 'reason', exc)}"
+            return status, (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(send, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        ok = sorted(ms for status, ms in results if status in (200, 201))
+        if not ok:
+            raise CommandError(f"No request succeeded: {sorted({str(status) for status, _ in results})}")
+        quantiles = statistics.quantiles(ok, n=20) if len(ok) > 1 else [ok[0]] * 19
+        shed = sum(1 for status, _ in results if status == 503)
+        failed = len(results) - len(ok) - shed
+        self.stdout.write(
+            f"{options['endpoint']} x{options['requests']} at concurrency {options['concurrency']}: "
+            f"{len(ok) / elapsed:.1f} req/s, p50 {statistics.median(ok):.0f} ms, p95 {quantiles[18]:.0f} ms, "
+            f"{shed} shed (503), {failed} failed"
+        )
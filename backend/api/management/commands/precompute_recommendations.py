@@ -0,0 +1,94 @@
+"""
+Nightly job that precomputes each user's recommendations for the coming days.
+
+    python manage.py precompute_recommendations --days 7 --chunk-size 500 --workers 4
+
+Users are streamed in chunks of ids and the chunks are spread over a process
+pool. Users whose wardrobe version and upcoming contexts are unchanged since the
+last run are skipped.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from api.models import Recommendation, User
+from api.precompute import precompute_chunk
+
+
+def _init_worker():
+    # Forget connections inherited from the parent without closing them (closing
+    # would tear down the parent's socket); each worker reconnects on first query
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+class Command(BaseCommand):
+    help = "Precompute daily outfit recommendations for all active users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.RECOMMENDATION_PRECOMPUTE_DAYS,
+                            help="Number of days ahead to precompute, starting today.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Number of users handled per task.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes. Use 1 to run in-process (recommended on SQLite).")
+
+    def handle(self, *args, **options):
+        days = options['days']
+        chunk_size = options['chunk_size']
+        workers = max(1, options['workers'])
+        self.verbosity = options['verbosity']
+        start = timezone.localdate()
+
+        # Precomputed rows for past days can never be served
+        purged, _ = Recommendation.objects.filter(is_precomputed=True, date__lt=start).delete()
+
+        chunks = self._chunks(chunk_size)
+
+        totals = {'users': 0, 'skipped': 0, 'computed': 0, 'recommendations': 0}
+
+        if workers == 1:
+            results = (precompute_chunk(chunk, start, days) for chunk in chunks)
+            self._report(results, totals)
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+            ) as pool:
+                futures = [pool.submit(precompute_chunk, chunk, start, days) for chunk in chunks]
+                self._report((future.result() for future in futures), totals)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed {totals['recommendations']} recommendations for {totals['computed']} users "
+            f"({totals['skipped']} of {totals['users']} unchanged, {purged} expired rows removed)."
+        ))
+
+    @staticmethod
+    def _chunks(size):
+        """Yield active user ids in chunks, one short keyset query per chunk."""
+        last_pk = 0
+        while True:
+            chunk = list(
+                User.objects.filter(is_active=True, pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:size]
+            )
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1]
+
+    def _report(self, results, totals):
+        for counts in results:
+            for key in totals:
+                totals[key] += counts[key]
+            if self.verbosity >= 2:
+                self.stdout.write(f"  chunk: {counts}")
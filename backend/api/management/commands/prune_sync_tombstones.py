@@ -0,0 +1,21 @@
+"""
+Delete sync tombstones (DeletedRecord) older than API_SYNC_TOMBSTONE_DAYS.
+
+    python manage.py prune_sync_tombstones
+
+Run it nightly. Clients whose sync token is older than the window get a full
+resync (api/sync.py), so nothing they need is lost.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.models import DeletedRecord
+from api.sync import tombstone_cutoff
+
+
+class Command(BaseCommand):
+    help = "Remove delta sync tombstones past the retention window."
+
+    def handle(self, *args, **options):
+        pruned, _ = DeletedRecord.objects.filter(deleted_at__lt=tombstone_cutoff()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Removed {pruned} sync tombstones."))
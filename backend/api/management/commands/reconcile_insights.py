@@ -0,0 +1,41 @@
+"""
+Rebuild style insights (api/insights.py) from the wardrobe and outfit tables.
+
+    python manage.py reconcile_insights
+    python manage.py reconcile_insights --user 42
+    python manage.py reconcile_insights --all
+
+Insights are running totals, and a write that goes around the signals and
+serializers (a raw UPDATE, a failed request halfway through) leaves them off.
+Run this periodically, e.g. next to the nightly precompute_recommendations job.
+It rebuilds every user who has insights and reports how many had drifted.
+--all also builds them for users who have never asked for them.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api import insights
+from api.models import User, WardrobeInsights
+
+
+class Command(BaseCommand):
+    help = "Recompute per-user style insights and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user.")
+        parser.add_argument('--all', action='store_true', help="Include users without insights yet.")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        elif not options['all']:
+            users = users.filter(pk__in=WardrobeInsights.objects.values('user_id'))
+        rebuilt = drifted = 0
+        for user in users.iterator():
+            _, changed = insights.rebuild(user)
+            rebuilt += 1
+            drifted += changed
+            if changed:
+                self.stdout.write(f"Insights of user {user.pk} had drifted.")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt insights for {rebuilt} users; {drifted} had drifted."))
@@ -0,0 +1,35 @@
+"""
+Render outfit previews server-side (api/previews.py).
+
+    python manage.py render_outfit_previews
+    python manage.py render_outfit_previews --user 42 --force
+
+Outfits whose layout or item photos changed since their preview was rendered
+(or that have never had one rendered) are drawn again; --force redraws every
+one, e.g. after changing API_OUTFIT_PREVIEW_CANVAS.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api import previews
+from api.models import Outfit
+
+
+class Command(BaseCommand):
+    help = "Render stale outfit previews from their saved layouts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's outfits.")
+        parser.add_argument('--force', action='store_true', help="Render even previews that are up to date.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Outfits checked per query.")
+
+    def handle(self, *args, **options):
+        outfits = Outfit.objects.order_by('pk')
+        if options['user']:
+            outfits = outfits.filter(user_id=options['user'])
+        pks = list(outfits.values_list('pk', flat=True))
+        rendered = 0
+        for start in range(0, len(pks), options['batch_size']):
+            batch = pks[start:start + options['batch_size']]
+            rendered += previews.refresh(Outfit.objects.filter(pk__in=batch), force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} of {len(pks)} outfit previews."))
@@ -0,0 +1,31 @@
+"""
+Report the server-side response cache's hit ratio and recompute time.
+
+    python manage.py response_cache_stats
+    python manage.py response_cache_stats --reset
+
+With a shared cache (REDIS_URL) the numbers cover every worker; with the
+default in-memory cache they only cover this process, so run it from a shell
+in the worker you are interested in.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api import response_cache
+
+
+class Command(BaseCommand):
+    help = "Show hit ratio and recompute time of the per-user response cache (api/response_cache.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after reporting.")
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_ratio={stats['hit_ratio']:.1%} "
+            f"recomputes={stats['recomputes']} avg_recompute_ms={stats['avg_recompute_ms']:.2f}"
+        )
+        if options['reset']:
+            response_cache.reset_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_alter_wardrobeitem_category"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recommendation",
+            name="date",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
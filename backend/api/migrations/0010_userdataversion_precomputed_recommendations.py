@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_versions_for_existing_wardrobes(apps, schema_editor):
+    WardrobeItem = apps.get_model("api", "WardrobeItem")
+    UserDataVersion = apps.get_model("api", "UserDataVersion")
+    user_ids = (
+        WardrobeItem.objects.filter(user__isnull=False)
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    UserDataVersion.objects.bulk_create(
+        [UserDataVersion(user_id=user_id, wardrobe=1) for user_id in user_ids]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_recommendation_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDataVersion",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="data_version",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("wardrobe", models.PositiveIntegerField(default=0)),
+                (
+                    "wardrobe_changed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="recommendation",
+            name="is_precomputed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="recommendation",
+            name="wardrobe_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="recommendation",
+            index=models.Index(
+                fields=["user", "is_precomputed", "date"],
+                name="api_rec_user_precomp_date_idx",
+            ),
+        ),
+        migrations.RunPython(
+            create_versions_for_existing_wardrobes, migrations.RunPython.noop
+        ),
+    ]
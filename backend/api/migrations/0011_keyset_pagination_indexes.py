@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_userdataversion_precomputed_recommendations"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="outfit",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="api_outfit_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outfit",
+            index=models.Index(
+                fields=["user", "is_favorite", "-updated_at", "-id"],
+                name="api_outfit_user_fav_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outfit",
+            index=models.Index(
+                fields=["user", "scheduled_date", "id"],
+                name="api_outfit_user_sched_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recommendation",
+            index=models.Index(
+                fields=["user", "is_precomputed", "-created_at", "-id"],
+                name="api_rec_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wardrobeitem",
+            index=models.Index(fields=["user", "id"], name="api_wardrobe_user_id_idx"),
+        ),
+    ]
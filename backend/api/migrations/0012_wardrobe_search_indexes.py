@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+# jsonb_path_ops only supports @> containment, which is all api/search.py uses,
+# and is smaller and faster than the default jsonb_ops. Other backends have no
+# JSON index; search falls back to json_each() there.
+def create_tags_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS api_wardrobe_tags_gin_idx "
+        "ON api_wardrobeitem USING gin (tags jsonb_path_ops)"
+    )
+
+
+def drop_tags_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS api_wardrobe_tags_gin_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wardrobeitem",
+            index=models.Index(
+                fields=["user", "category", "id"], name="api_wardrobe_user_cat_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wardrobeitem",
+            index=models.Index(
+                fields=["user", "season", "id"], name="api_wardrobe_user_season_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wardrobeitem",
+            index=models.Index(
+                fields=["user", "price"], name="api_wardrobe_user_price_idx"
+            ),
+        ),
+        migrations.RunPython(create_tags_gin_index, drop_tags_gin_index),
+    ]
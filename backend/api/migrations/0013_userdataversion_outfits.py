@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_wardrobe_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userdataversion",
+            name="outfits",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="userdataversion",
+            name="outfits_changed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0013_userdataversion_outfits"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("wardrobe_item", "Wardrobe item"),
+                            ("outfit", "Outfit"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("deleted_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="wardrobeitem",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="wardrobeitem",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="outfit",
+            index=models.Index(
+                fields=["user", "updated_at"], name="api_outfit_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wardrobeitem",
+            index=models.Index(
+                fields=["user", "updated_at"], name="api_wardrobe_user_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="deletedrecord",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deleted_records",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="deletedrecord",
+            index=models.Index(
+                fields=["user", "deleted_at"], name="api_deleted_user_at_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_sync_timestamps_and_tombstones"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outfit",
+            name="preview_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="wardrobeitem",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_stored_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outfit",
+            name="preview_layout_hash",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0017_outfit_preview_layout_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WardrobeInsights",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="insights",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("items", models.PositiveIntegerField(default=0)),
+                ("outfits", models.PositiveIntegerField(default=0)),
+                ("facets", models.JSONField(blank=True, default=dict)),
+                ("worn_colors", models.JSONField(blank=True, default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ItemWear",
+            fields=[
+                (
+                    "item",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="wear",
+                        serialize=False,
+                        to="api.wardrobeitem",
+                    ),
+                ),
+                ("outfits", models.PositiveIntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="item_wear",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-outfits", "item"],
+                        name="api_itemwear_user_outfits_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 from django.utils import timezone
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 
 class CustomUserManager(UserManager):
@@ -88,6 +89,21 @@ class WardrobeItem(models.Model):
     name = models.CharField(blank=False, max_length=30)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     tags = models.JSONField(default=dict, blank=True)
+    # Resized copies of item_image, see api/images.py
+    image_variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='api_wardrobe_user_id_idx'),
+            # Delta sync (api/sync.py)
+            models.Index(fields=['user', 'updated_at'], name='api_wardrobe_user_updated_idx'),
+            # Search filters/facets (api/search.py); tags get a GIN index on PostgreSQL, see migration 0012
+            models.Index(fields=['user', 'category', 'id'], name='api_wardrobe_user_cat_idx'),
+            models.Index(fields=['user', 'season', 'id'], name='api_wardrobe_user_season_idx'),
+            models.Index(fields=['user', 'price'], name='api_wardrobe_user_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -125,6 +141,10 @@ class Outfit(models.Model):
     
     # Optional preview image 
     preview_image = models.ImageField(upload_to='outfits/previews/', blank=True, null=True)
+    # Resized copies of preview_image, see api/images.py
+    preview_variants = models.JSONField(default=dict, blank=True)
+    # Layout the preview was rendered from, see api/previews.py
+    preview_layout_hash = models.CharField(max_length=64, blank=True)
     
     # Favorites and scheduling
     is_favorite = models.BooleanField(default=False)
@@ -138,6 +158,14 @@ class Outfit(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination: list, favorites and scheduled orderings
+            models.Index(fields=['user', '-created_at', '-id'], name='api_outfit_user_created_idx'),
+            models.Index(fields=['user', 'is_favorite', '-updated_at', '-id'], name='api_outfit_user_fav_idx'),
+            models.Index(fields=['user', 'scheduled_date', 'id'], name='api_outfit_user_sched_idx'),
+            # Delta sync (api/sync.py)
+            models.Index(fields=['user', 'updated_at'], name='api_outfit_user_updated_idx'),
+        ]
         
     def __str__(self):
         return f"{self.name} - {self.user.username}"
@@ -172,6 +200,10 @@ class OutfitItem(models.Model):
     
     # Rotation
     rotation = models.FloatField(default=0)  # Degrees (0-360)
+
+    # Canvas placement, written by the outfit editor
+    LAYOUT_FIELDS = ['position_x', 'position_y', 'size_width', 'size_height', 'rotation', 'z_index']
+    EDITABLE_FIELDS = ['layer'] + LAYOUT_FIELDS
     
     class Meta:
         ordering = ['z_index']
@@ -210,6 +242,7 @@ class Recommendation(models.Model):
     weather = models.CharField(max_length=20, choices=WEATHER_CHOICES)
     occasion = models.CharField(max_length=20, choices=OCCASION_CHOICES)
     temperature = models.IntegerField(null=True, blank=True)  # Celsius
+    date = models.DateField(null=True, blank=True)  # Day the recommendation is planned for
     
     # Recommended items (could be multiple outfits)
     recommended_items = models.ManyToManyField(WardrobeItem, related_name='recommendations')
@@ -218,13 +251,316 @@ class Recommendation(models.Model):
     compatibility_score = models.FloatField(default=0.0)  # 0-100
     explanation = models.TextField()
     
+    # Precomputed by the nightly job, waiting to be served by generate
+    is_precomputed = models.BooleanField(default=False)
+    wardrobe_version = models.PositiveIntegerField(default=0)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_precomputed', 'date'], name='api_rec_user_precomp_date_idx'),
+            models.Index(fields=['user', 'is_precomputed', '-created_at', '-id'], name='api_rec_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Recommendation for {self.user.username} - {self.occasion} ({self.weather})"
 
 
+class UserDataVersion(models.Model):
+    """
+    Per-user change counters, bumped whenever the user's wardrobe or outfits change
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='data_version')
+    wardrobe = models.PositiveIntegerField(default=0)
+    wardrobe_changed_at = models.DateTimeField(default=timezone.now)
+    outfits = models.PositiveIntegerField(default=0)
+    outfits_changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Data version for {self.user_id}: wardrobe={self.wardrobe} outfits={self.outfits}"
+
+    @classmethod
+    def bump(cls, user_id, field='wardrobe'):
+        """Increment one counter with a single UPDATE, creating the row on first change."""
+        if user_id is None:
+            return
+        now = timezone.now()
+        updated = cls.objects.filter(user_id=user_id).update(
+            **{field: F(field) + 1, f'{field}_changed_at': now}
+        )
+        if not updated:
+            cls.objects.get_or_create(user_id=user_id, defaults={field: 1, f'{field}_changed_at': now})
+
+
+class DeletedRecord(models.Model):
+    """
+    Tombstone left when a wardrobe item or outfit is deleted, so delta sync
+    (api/sync.py) can tell clients to drop their copy
+    """
+    WARDROBE_ITEM = 'wardrobe_item'
+    OUTFIT = 'outfit'
+    KIND_CHOICES = [
+        (WARDROBE_ITEM, 'Wardrobe item'),
+        (OUTFIT, 'Outfit'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='deleted_records')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='api_deleted_user_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id} of {self.user_id}"
+
+
+class StoredBlob(models.Model):
+    """
+    One content-addressed media file and the number of saved references to it
+    (see api/storage.py)
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+
+class WardrobeInsights(models.Model):
+    """
+    Running totals behind GET /api/insights/, kept up to date by deltas on
+    every wardrobe and outfit write (see api/insights.py)
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='insights')
+    items = models.PositiveIntegerField(default=0)
+    outfits = models.PositiveIntegerField(default=0)
+    # {"category": {"Tops": 12, ...}, "season": {...}, "color": {...}, "pattern": {...}}
+    facets = models.JSONField(default=dict, blank=True)
+    # Colours of the items placed in the user's outfits, once per placement
+    worn_colors = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Insights for {self.user_id}: {self.items} items, {self.outfits} outfits"
+
+
+class ItemWear(models.Model):
+    """How many of its owner's outfits place a wardrobe item (see api/insights.py)"""
+    item = models.OneToOneField(WardrobeItem, on_delete=models.CASCADE, primary_key=True, related_name='wear')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='item_wear')
+    outfits = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-outfits', 'item'], name='api_itemwear_user_outfits_idx'),
+        ]
+
+    def __str__(self):
+        return f"Item {self.item_id} in {self.outfits} outfits"
+
+
+def deleting_user(origin):
+    """True when a delete cascades from the user's own deletion; nothing should be recorded then."""
+    return isinstance(origin, User)
+
+
+@receiver(post_save, sender=WardrobeItem)
+@receiver(post_delete, sender=WardrobeItem)
+def bump_wardrobe_version(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    UserDataVersion.bump(instance.user_id, 'wardrobe')
+
+
+# Deleting a wardrobe item cascades to the outfit items placing it, which changes
+# those outfits without saving them; touch them so delta sync sends them again
+@receiver(pre_delete, sender=WardrobeItem)
+def touch_outfits_of_deleted_item(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    Outfit.objects.filter(items__clothing_item=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=WardrobeItem)
+def record_deleted_wardrobe_item(sender, instance, origin=None, **kwargs):
+    if instance.user_id is None or deleting_user(origin):
+        return
+    DeletedRecord.objects.create(user_id=instance.user_id, kind=DeletedRecord.WARDROBE_ITEM, object_id=instance.pk)
+
+
+# Item edits (including the bulk writes in OutfitCreateUpdateSerializer and the
+# layout endpoint) always go through Outfit.save(), so outfits are covered here
+@receiver(post_save, sender=Outfit)
+@receiver(post_delete, sender=Outfit)
+def bump_outfits_version(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    UserDataVersion.bump(instance.user_id, 'outfits')
+
+
+# Direct saves of a single outfit item; the API's bulk item writes end in
+# Outfit.save(). There is deliberately no post_delete receiver: it would stop
+# Django fast-deleting outfit items, and every delete path (outfit update,
+# outfit or wardrobe item deletion) already bumps a counter
+@receiver(post_save, sender=OutfitItem)
+def bump_outfits_version_for_item(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    UserDataVersion.bump(instance.outfit.user_id, 'outfits')
+
+
+@receiver(post_delete, sender=Outfit)
+def record_deleted_outfit(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    DeletedRecord.objects.create(user_id=instance.user_id, kind=DeletedRecord.OUTFIT, object_id=instance.pk)
+
+
+# Responsive derivatives of item photos and outfit previews (api/images.py),
+# rebuilt whenever a save changes the image, from the upload itself when there is one
+@receiver(pre_save, sender=WardrobeItem)
+@receiver(pre_save, sender=Outfit)
+def remember_image_upload(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .images import remember_upload
+    remember_upload(instance)
+
+
+@receiver(post_save, sender=WardrobeItem)
+@receiver(post_save, sender=Outfit)
+def refresh_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not settings.API_IMAGE_DERIVATIVES_ON_SAVE:
+        return
+    from .images import refresh_variants
+    refresh_variants(instance)
+
+
+@receiver(post_delete, sender=WardrobeItem)
+@receiver(post_delete, sender=Outfit)
+def delete_image_variants(sender, instance, **kwargs):
+    from .images import IMAGE_FIELDS, delete_variants, release
+    image_field, variants_field, _ = IMAGE_FIELDS[sender._meta.label]
+    image = getattr(instance, image_field)
+    delete_variants(image.storage, getattr(instance, variants_field))
+    release(image.storage, image.name)
+
+
+# With content-addressed media (api/storage.py) an original is shared by
+# reference, so the one an upload replaces is released once the save is done
+@receiver(post_save, sender=WardrobeItem)
+@receiver(post_save, sender=Outfit)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .images import release_replaced
+    release_replaced(instance)
+
+
+# Server-rendered outfit previews (api/previews.py), refreshed after commit when
+# an outfit is saved or a photo it shows is replaced or deleted. The render's
+# own save records the new layout hash and is not refreshed again.
+@receiver(post_save, sender=Outfit)
+def refresh_outfit_preview(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and 'preview_layout_hash' in update_fields):
+        return
+    from .previews import schedule
+    schedule(pk=instance.pk)
+
+
+@receiver(post_save, sender=WardrobeItem)
+def refresh_previews_showing_item(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or 'item_image' not in instance.__dict__.get('_image_uploads', {}):
+        return
+    from .previews import schedule
+    schedule(items__clothing_item_id=instance.pk)
+
+
+@receiver(post_delete, sender=WardrobeItem)
+def refresh_previews_of_deleted_item(sender, instance, origin=None, **kwargs):
+    if instance.user_id is None or deleting_user(origin):
+        return
+    from .previews import schedule
+    schedule(user_id=instance.user_id)
+
+
+# Style insights (api/insights.py) are kept as running totals; every wardrobe
+# and outfit write applies its delta. Writes of users who never read their
+# insights stop after checking that.
+@receiver(pre_save, sender=WardrobeItem)
+def remember_item_insights(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    from .insights import item_saving
+    item_saving(instance, update_fields)
+
+
+@receiver(post_save, sender=WardrobeItem)
+def update_insights_for_item(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    from .insights import item_saved
+    item_saved(instance, created, update_fields)
+
+
+@receiver(pre_delete, sender=WardrobeItem)
+def count_placements_of_deleted_item(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    from .insights import item_deleting
+    item_deleting(instance)
+
+
+@receiver(post_delete, sender=WardrobeItem)
+def update_insights_for_deleted_item(sender, instance, origin=None, **kwargs):
+    if instance.user_id is None or deleting_user(origin):
+        return
+    from .insights import item_deleted
+    item_deleted(instance)
+
+
+@receiver(post_save, sender=Outfit)
+def update_insights_for_new_outfit(sender, instance, created=False, raw=False, **kwargs):
+    # The serializer counts the outfit along with its items
+    if raw or not created or instance.__dict__.get('_insights_counted'):
+        return
+    from .insights import outfit_items_changed
+    outfit_items_changed(instance.user_id, outfits=1)
+
+
+@receiver(pre_delete, sender=Outfit)
+def remember_items_of_deleted_outfit(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    from .insights import outfit_deleting
+    outfit_deleting(instance)
+
+
+@receiver(post_delete, sender=Outfit)
+def update_insights_for_deleted_outfit(sender, instance, origin=None, **kwargs):
+    if deleting_user(origin):
+        return
+    from .insights import outfit_deleted
+    outfit_deleted(instance)
+
+
+# Direct saves of a single outfit item; the serializer's bulk writes report
+# their own changes (OutfitCreateUpdateSerializer)
+@receiver(post_save, sender=OutfitItem)
+def update_insights_for_outfit_item(sender, instance, created=False, raw=False, **kwargs):
+    if raw or not created:
+        return
+    from .insights import outfit_items_changed
+    outfit_items_changed(instance.outfit.user_id, added=[instance.clothing_item_id])
+
+
 # @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 # def create_auth_token(sender, instance=None, created=False, **kwargs):
 #     if created:
@@ -0,0 +1,137 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are addressed by the (ordering key, id) pair of the last row returned, so
+fetching page N costs the same indexed range scan as fetching page 1, and rows
+inserted while a client is paging never shift or duplicate results.
+
+The ordering comes from the queryset itself (explicit order_by, else the model's
+Meta.ordering, else id), with id as the tiebreaker in the same direction.
+
+While settings.API_LEGACY_UNPAGINATED_LISTS is on, requests that pass neither
+`cursor` nor `page_size` still get the full, unpaginated list the current
+frontend expects.
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    # False for endpoints that always page, whatever API_LEGACY_UNPAGINATED_LISTS says
+    legacy_unpaginated = True
+
+    def __init__(self):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+        self.next_url = None
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    @staticmethod
+    def get_ordering(queryset):
+        """Return (key field name, descending) for the queryset's ordering."""
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering) or ['pk']
+        first = ordering[0]
+        descending = first.startswith('-')
+        name = first.lstrip('-')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name
+        return name, descending
+
+    def encode_cursor(self, value, pk):
+        raw = json.dumps([_dump(value), pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, field, cursor):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return (field.to_python(value) if value is not None else None), int(pk)
+        except (TypeError, ValueError, ValidationError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.legacy_unpaginated and settings.API_LEGACY_UNPAGINATED_LISTS and not self.is_requested(request):
+            return None
+
+        page_size = self.get_page_size(request)
+        name, descending = self.get_ordering(queryset)
+        pk_name = queryset.model._meta.pk.name
+        field = queryset.model._meta.get_field(name)
+        prefix = '-' if descending else ''
+
+        if name == pk_name:
+            queryset = queryset.order_by(f'{prefix}{pk_name}')
+        else:
+            queryset = queryset.order_by(f'{prefix}{name}', f'{prefix}{pk_name}')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(field, cursor)
+            after = 'lt' if descending else 'gt'
+            if name == pk_name:
+                queryset = queryset.filter(**{f'{pk_name}__{after}': pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{name}__{after}': value}) | Q(**{name: value, f'{pk_name}__{after}': pk})
+                )
+
+        rows = list(queryset[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        self.next_url = None
+        if has_next:
+            last = rows[-1]
+            value = last[name] if isinstance(last, dict) else getattr(last, name)
+            pk = last[pk_name] if isinstance(last, dict) else last.pk
+            url = request.build_absolute_uri()
+            url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, pk))
+            self.next_url = replace_query_param(url, self.page_size_query_param, page_size)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next_url),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def _dump(value):
+    """JSON-safe form of an ordering key value that the field's to_python can read back."""
+    if value is None or isinstance(value, (int, float, str, bool)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
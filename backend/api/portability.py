@@ -0,0 +1,266 @@
+"""
+Streaming NDJSON export and import of a user's wardrobe, outfits and recommendations.
+
+GET /api/export/ streams one JSON object per line:
+
+    {"type": "export", "format": "fitfinder", "version": 1, "exported_at": "..."}
+    {"type": "wardrobe_item", "id": 12, "name": "...", "item_image": "blobs/ab/ab12....jpg", ...}
+    {"type": "outfit", "id": 4, "name": "...", "items": [{"clothing_item": 12, "layer": "tops", ...}]}
+    {"type": "recommendation", "weather": "sunny", ..., "recommended_items": [12, 15]}
+
+Rows are read with .iterator(chunk_size=settings.API_EXPORT_CHUNK_SIZE), with
+outfit items and recommended item ids prefetched per chunk. Memory therefore
+stays flat however large the wardrobe is. Precomputed recommendations are
+caches and are left out.
+
+POST /api/import/ takes that stream as the request body and adds its records
+to the current user's account:
+
+- Lines are parsed as they arrive.
+- Records are validated with the model fields' own validation.
+- Rows are written with bulk_create every settings.API_IMPORT_BATCH_SIZE
+  records, inside one transaction. A bad line rolls the whole import back
+  and reports its line number.
+- Ids in the file only link records to each other. Every row gets a new id,
+  and created_at / updated_at are set to the time of the import.
+
+Images are carried over by stored name, and only under content-addressed
+storage (api/storage.py). Blob names appear in every export, so a name alone
+proves nothing: a photo is kept only when one of the importing user's own
+wardrobe items already shows that blob (restoring an export into the same
+account), and the import adds a reference to it. Everywhere else, imported
+items come without photos. Derivatives are left for `manage.py
+generate_image_derivatives`, outfit previews are rendered again
+(api/previews.py) and style insights rebuilt (api/insights.py).
+"""
+
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from . import insights
+from . import previews
+from .models import Outfit, OutfitItem, Recommendation, StoredBlob, UserDataVersion, WardrobeItem
+
+FORMAT = 'fitfinder'
+VERSION = 1
+
+WARDROBE_ITEM_FIELDS = ('name', 'category', 'season', 'brand', 'material', 'price', 'tags', 'item_image')
+OUTFIT_FIELDS = ('name', 'occasion', 'season', 'is_favorite', 'scheduled_date', 'likes', 'tags')
+OUTFIT_ITEM_FIELDS = ('layer', *OutfitItem.LAYOUT_FIELDS)
+RECOMMENDATION_FIELDS = ('weather', 'occasion', 'temperature', 'date', 'compatibility_score', 'explanation')
+TIMESTAMPS = ('created_at', 'updated_at')
+
+
+def line(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')).encode() + b'\n'
+
+
+def export_lines(user, chunk_size=None):
+    """The user's data as NDJSON lines (bytes), read chunk by chunk."""
+    chunk_size = chunk_size or settings.API_EXPORT_CHUNK_SIZE
+    yield line({'type': 'export', 'format': FORMAT, 'version': VERSION, 'exported_at': timezone.now()})
+
+    items = (WardrobeItem.objects.filter(user=user).order_by('id')
+             .values('id', *WARDROBE_ITEM_FIELDS, *TIMESTAMPS))
+    for row in items.iterator(chunk_size=chunk_size):
+        yield line({'type': 'wardrobe_item', **row})
+
+    outfits = (Outfit.objects.filter(user=user).order_by('id').only('id', *OUTFIT_FIELDS, *TIMESTAMPS)
+               .prefetch_related(Prefetch('items', OutfitItem.objects.order_by('z_index', 'id')
+                                          .only('outfit_id', 'clothing_item_id', *OUTFIT_ITEM_FIELDS))))
+    for outfit in outfits.iterator(chunk_size=chunk_size):
+        yield line({
+            'type': 'outfit',
+            'id': outfit.pk,
+            **{field: getattr(outfit, field) for field in (*OUTFIT_FIELDS, *TIMESTAMPS)},
+            'items': [
+                {'clothing_item': item.clothing_item_id, **{field: getattr(item, field) for field in OUTFIT_ITEM_FIELDS}}
+                for item in outfit.items.all()
+            ],
+        })
+
+    recommendations = (Recommendation.objects.filter(user=user, is_precomputed=False).order_by('id')
+                       .only('id', 'created_at', *RECOMMENDATION_FIELDS)
+                       .prefetch_related(Prefetch('recommended_items', WardrobeItem.objects.only('id'))))
+    for recommendation in recommendations.iterator(chunk_size=chunk_size):
+        yield line({
+            'type': 'recommendation',
+            **{field: getattr(recommendation, field) for field in (*RECOMMENDATION_FIELDS, 'created_at')},
+            'recommended_items': sorted(item.pk for item in recommendation.recommended_items.all()),
+        })
+
+
+class InvalidImport(ValueError):
+    """A line of an import that cannot be used; the whole import is rolled back."""
+
+    def __init__(self, number, message):
+        super().__init__(f"Line {number}: {message}")
+        self.number = number
+
+
+def build(model, record, fields, number, **extra):
+    """An unsaved `model` from the `fields` of one record, validated and converted by the model's fields."""
+    instance = model(**{field: record[field] for field in fields if field in record}, **extra)
+    try:
+        instance.clean_fields(exclude=[field.name for field in model._meta.fields if field.name not in fields])
+    except ValidationError as exc:
+        raise InvalidImport(number, "; ".join(f"{field}: {' '.join(errors)}" for field, errors in exc.message_dict.items()))
+    return instance
+
+
+class Importer:
+    """Adds the records of an export to `user`, writing every `batch_size` records."""
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.API_IMPORT_BATCH_SIZE
+        self.item_ids = {}
+        self.seen_item_ids = set()
+        self.items = []
+        self.outfits = []
+        self.recommendations = []
+        self.counts = Counter()
+        self.storage = WardrobeItem._meta.get_field('item_image').storage
+
+    def run(self, lines):
+        """Import an iterable of NDJSON lines; returns how many of each kind were created."""
+        with transaction.atomic():
+            for number, raw in enumerate(lines, 1):
+                if raw.strip():
+                    self.add(number, raw)
+            self.flush_items()
+            self.flush_outfits()
+            self.flush_recommendations()
+            if self.counts['wardrobe_items']:
+                UserDataVersion.bump(self.user.pk, 'wardrobe')
+            if self.counts['outfits']:
+                UserDataVersion.bump(self.user.pk, 'outfits')
+                previews.schedule(user_id=self.user.pk)
+            if self.counts:
+                # bulk_create skips the insights deltas; the next read rebuilds them
+                insights.invalidate(self.user.pk)
+        return dict(self.counts)
+
+    def add(self, number, raw):
+        try:
+            record = json.loads(raw)
+        except ValueError as exc:
+            raise InvalidImport(number, f"not JSON ({exc})")
+        kind = record.get('type') if isinstance(record, dict) else None
+        try:
+            if kind == 'export':
+                if record.get('format') != FORMAT or record.get('version') != VERSION:
+                    raise InvalidImport(number, f"unsupported export {record.get('format')} v{record.get('version')}")
+            elif kind == 'wardrobe_item':
+                self.add_item(number, record)
+            elif kind == 'outfit':
+                self.add_outfit(number, record)
+            elif kind == 'recommendation':
+                self.add_recommendation(number, record)
+            else:
+                raise InvalidImport(number, f"unknown record type {kind!r}")
+        except (TypeError, AttributeError) as exc:
+            # Lists where objects belong, objects used as ids, ...
+            raise InvalidImport(number, f"malformed {kind} ({exc})")
+
+    def add_item(self, number, record):
+        if record.get('id') is None or record['id'] in self.seen_item_ids:
+            raise InvalidImport(number, "wardrobe items need a unique id")
+        self.seen_item_ids.add(record['id'])
+        self.items.append((record['id'], build(WardrobeItem, record, WARDROBE_ITEM_FIELDS, number, user=self.user)))
+        if len(self.items) >= self.batch_size:
+            self.flush_items()
+
+    def item_id(self, number, old_id):
+        if old_id not in self.item_ids:
+            # Items may come after whatever refers to them only within one batch
+            self.flush_items()
+        if old_id not in self.item_ids:
+            raise InvalidImport(number, f"wardrobe item {old_id} is not in the import")
+        return self.item_ids[old_id]
+
+    def add_outfit(self, number, record):
+        outfit = build(Outfit, record, OUTFIT_FIELDS, number, user=self.user)
+        items = [
+            build(OutfitItem, entry, OUTFIT_ITEM_FIELDS, number, clothing_item_id=self.item_id(number, entry.get('clothing_item')))
+            for entry in record.get('items') or []
+        ]
+        self.outfits.append((outfit, items))
+        if len(self.outfits) >= self.batch_size:
+            self.flush_outfits()
+
+    def add_recommendation(self, number, record):
+        recommendation = build(Recommendation, record, RECOMMENDATION_FIELDS, number, user=self.user)
+        item_ids = [self.item_id(number, old_id) for old_id in record.get('recommended_items') or []]
+        self.recommendations.append((recommendation, item_ids))
+        if len(self.recommendations) >= self.batch_size:
+            self.flush_recommendations()
+
+    def flush_items(self):
+        if not self.items:
+            return
+        self.keep_known_images([item for _, item in self.items])
+        created = WardrobeItem.objects.bulk_create([item for _, item in self.items])
+        self.item_ids.update((old_id, item.pk) for (old_id, _), item in zip(self.items, created))
+        self.counts['wardrobe_items'] += len(created)
+        self.items = []
+
+    def keep_known_images(self, items):
+        """
+        Keep photos naming a blob the user's own items already show, adding a
+        reference to it; drop the rest.
+        """
+        named = [item for item in items if item.item_image.name]
+        if not named:
+            return
+        known = set()
+        if getattr(self.storage, 'reference_counted', False):
+            names = {item.item_image.name for item in named}
+            shown = WardrobeItem.objects.filter(user=self.user, item_image__in=names).values('item_image')
+            known = set(StoredBlob.objects.filter(name__in=shown).values_list('name', flat=True))
+        uses = Counter()
+        for item in named:
+            if item.item_image.name in known:
+                uses[item.item_image.name] += 1
+            else:
+                item.item_image = ''
+        by_count = {}
+        for name, count in uses.items():
+            by_count.setdefault(count, []).append(name)
+        for count, names in by_count.items():
+            StoredBlob.objects.filter(name__in=names).update(refs=F('refs') + count)
+
+    def flush_outfits(self):
+        if not self.outfits:
+            return
+        created = Outfit.objects.bulk_create([outfit for outfit, _ in self.outfits])
+        outfit_items = []
+        for outfit, (_, items) in zip(created, self.outfits):
+            for item in items:
+                item.outfit = outfit
+                outfit_items.append(item)
+        OutfitItem.objects.bulk_create(outfit_items, batch_size=self.batch_size)
+        self.counts['outfits'] += len(created)
+        self.counts['outfit_items'] += len(outfit_items)
+        self.outfits = []
+
+    def flush_recommendations(self):
+        if not self.recommendations:
+            return
+        created = Recommendation.objects.bulk_create([recommendation for recommendation, _ in self.recommendations])
+        through = Recommendation.recommended_items.through
+        links = [
+            through(recommendation_id=recommendation.pk, wardrobeitem_id=item_id)
+            for recommendation, (_, item_ids) in zip(created, self.recommendations)
+            for item_id in dict.fromkeys(item_ids)
+        ]
+        through.objects.bulk_create(links, batch_size=self.batch_size)
+        self.counts['recommendations'] += len(created)
+        self.recommendations = []
@@ -0,0 +1,175 @@
+"""
+Offline precomputation of daily recommendations.
+
+Used by `manage.py precompute_recommendations`. Each user gets one recommendation
+per upcoming day for the default context, plus one for every scheduled outfit in
+that window. Results are stored as precomputed Recommendation rows tagged with
+the wardrobe version they were built from, so the generate endpoint can serve
+them with a single lookup as long as the wardrobe has not changed since.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Outfit, Recommendation, UserDataVersion
+from . import recommendation_core as core
+from .recommendation_engine import RecommendationEngine
+
+# Outfit occasions that are named differently for recommendations
+OUTFIT_TO_RECOMMENDATION_OCCASION = {
+    'work': 'professional',
+}
+
+ContextKey = Tuple[date, str, str, Optional[int]]
+
+
+def default_context(day: date) -> Dict:
+    return {
+        'date': day,
+        'weather': settings.RECOMMENDATION_DEFAULT_WEATHER,
+        'occasion': settings.RECOMMENDATION_DEFAULT_OCCASION,
+        'temperature': None,
+    }
+
+
+def context_key(context: Dict) -> ContextKey:
+    return (context['date'], context['weather'], context['occasion'], context.get('temperature'))
+
+
+def build_user_contexts(
+    start: date,
+    days: int,
+    scheduled: Iterable[Tuple[date, Optional[str]]] = (),
+) -> List[Dict]:
+    """
+    Likely contexts for one user: the default context for every day in
+    [start, start + days), plus the occasion of each scheduled outfit.
+    """
+    contexts = [default_context(start + timedelta(days=offset)) for offset in range(days)]
+    for day, occasion in scheduled:
+        if not occasion:
+            continue
+        context = default_context(day)
+        context['occasion'] = OUTFIT_TO_RECOMMENDATION_OCCASION.get(occasion, occasion)
+        contexts.append(context)
+
+    # Drop duplicates (e.g. a casual outfit scheduled on a casual day)
+    unique = {}
+    for context in contexts:
+        unique.setdefault(context_key(context), context)
+    return sorted(unique.values(), key=lambda context: context['date'])
+
+
+def precompute_chunk(user_ids: List[int], start: date, days: int) -> Dict[str, int]:
+    """
+    Precompute recommendations for a chunk of users.
+
+    Runs a fixed number of queries per chunk to decide what to do, then only
+    scores users whose wardrobe version or upcoming contexts changed since the
+    last run. Returns counters for reporting.
+    """
+    start_dt = timezone.make_aware(datetime.combine(start, time.min))
+    end_dt = start_dt + timedelta(days=days)
+
+    versions = dict(
+        UserDataVersion.objects.filter(user_id__in=user_ids).values_list('user_id', 'wardrobe')
+    )
+
+    existing = {}
+    for user_id, day, weather, occasion, temperature, version in Recommendation.objects.filter(
+        user_id__in=user_ids, is_precomputed=True, date__gte=start,
+    ).values_list('user_id', 'date', 'weather', 'occasion', 'temperature', 'wardrobe_version'):
+        existing.setdefault(user_id, set()).add((day, weather, occasion, temperature, version))
+
+    scheduled = {}
+    for user_id, scheduled_date, occasion in Outfit.objects.filter(
+        user_id__in=user_ids, scheduled_date__gte=start_dt, scheduled_date__lt=end_dt,
+    ).values_list('user_id', 'scheduled_date', 'occasion'):
+        scheduled.setdefault(user_id, []).append((timezone.localdate(scheduled_date), occasion))
+
+    counts = {'users': len(user_ids), 'skipped': 0, 'computed': 0, 'recommendations': 0}
+    stale_user_ids = []
+    pending = []  # (user_id, version, context, (item_ids, score, explanation))
+
+    for user_id in user_ids:
+        version = versions.get(user_id, 0)
+        if version == 0:
+            # Wardrobe never changed, so it is empty
+            counts['skipped'] += 1
+            continue
+
+        have = existing.get(user_id, set())
+        contexts = build_user_contexts(start, days, scheduled.get(user_id, ()))
+        missing = [context for context in contexts if context_key(context) + (version,) not in have]
+        if not missing:
+            counts['skipped'] += 1
+            continue
+
+        if any(row[-1] != version for row in have):
+            stale_user_ids.append(user_id)
+
+        records = RecommendationEngine.load_records(user_id)
+        for context, (indexes, compatibility_score, explanation) in zip(
+            missing, core.recommend_batch(records, missing)
+        ):
+            if indexes:
+                item_ids = [records[index].id for index in indexes]
+                pending.append((user_id, version, context, (item_ids, compatibility_score, explanation)))
+        counts['computed'] += 1
+
+    with transaction.atomic():
+        # Recommendations built from an older wardrobe can never be served again
+        for user_id in stale_user_ids:
+            Recommendation.objects.filter(user_id=user_id, is_precomputed=True).exclude(
+                wardrobe_version=versions.get(user_id, 0)
+            ).delete()
+
+        recommendations = Recommendation.objects.bulk_create([
+            Recommendation(
+                user_id=user_id,
+                weather=context['weather'],
+                occasion=context['occasion'],
+                temperature=context['temperature'],
+                date=context['date'],
+                compatibility_score=compatibility_score,
+                explanation=explanation,
+                is_precomputed=True,
+                wardrobe_version=version,
+            )
+            for user_id, version, context, (_, compatibility_score, explanation) in pending
+        ])
+
+        RecommendedItem = Recommendation.recommended_items.through
+        RecommendedItem.objects.bulk_create([
+            RecommendedItem(recommendation_id=recommendation.pk, wardrobeitem_id=item_id)
+            for recommendation, (_, _, _, (item_ids, _, _)) in zip(recommendations, pending)
+            for item_id in item_ids
+        ])
+
+    counts['recommendations'] = len(recommendations)
+    return counts
+
+
+def precomputed_recommendations(user, weather: str, occasion: str, temperature: Optional[int]):
+    """
+    Today's precomputed recommendation for this context, if it was built from
+    the user's current wardrobe version, as a queryset (the async generate
+    view awaits .afirst() on it).
+    """
+    return Recommendation.objects.filter(
+        user=user,
+        is_precomputed=True,
+        date=timezone.localdate(),
+        weather=weather,
+        occasion=occasion,
+        temperature=temperature,
+        wardrobe_version=Coalesce(
+            Subquery(UserDataVersion.objects.filter(user=user).values('wardrobe')[:1]), 0
+        ),
+    )
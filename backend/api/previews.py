@@ -0,0 +1,197 @@
+"""
+Server-rendered outfit previews.
+
+An outfit's preview is drawn from its OutfitItem rows: each wardrobe item's
+photo is fitted into its box (size_width x size_height at position_x,
+position_y on a settings.API_OUTFIT_PREVIEW_CANVAS canvas), rotated about the
+box centre and pasted in z_index order.
+
+Every outfit records the layout hash its preview was rendered from
+(Outfit.preview_layout_hash): a SHA-256 of the canvas, the layout fields of
+every item and the stored name of every item's photo. With content-addressed
+media (api/storage.py), the name changes whenever the photo does. A preview is
+re-rendered only when that hash changes, so saves that do not affect the
+picture (favouriting, renaming) cost one query in the background and no
+drawing.
+
+Renders are scheduled after the saving transaction commits and run on one
+background thread per process (settings.API_OUTFIT_PREVIEW_RENDERING =
+'background'), in the committing thread ('inline', used by tests), or not at
+all ('off'). `manage.py render_outfit_previews` brings every stale preview up
+to date. Previews a client uploads stand until the layout changes. An outfit
+with no items has nothing to draw: its preview is cleared, not rendered blank.
+The saves made here record the layout hash and schedule no further refresh.
+
+Item photos are read from their smallest derivative (api/images.py) that
+covers the box, and otherwise decoded from the original at reduced scale, so a
+20 item outfit never decodes 20 full-size photos.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from . import images
+from .models import Outfit, OutfitItem, WardrobeItem
+
+logger = logging.getLogger('api.previews')
+
+# Bump when the drawing changes, so every preview is rendered again
+RENDER_VERSION = 1
+BACKGROUND = (255, 255, 255)
+
+LAYOUT_COLUMNS = ('outfit_id', 'clothing_item_id', *OutfitItem.LAYOUT_FIELDS,
+                  'clothing_item__item_image', 'clothing_item__image_variants')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def canvas_size():
+    return tuple(settings.API_OUTFIT_PREVIEW_CANVAS)
+
+
+def item_layouts(outfit_ids):
+    """{outfit id: [layout row, ...]} in drawing order, for LAYOUT_COLUMNS, in one query."""
+    layouts = defaultdict(list)
+    rows = (OutfitItem.objects.filter(outfit_id__in=outfit_ids)
+            .order_by('outfit_id', 'z_index', 'id').values(*LAYOUT_COLUMNS))
+    for row in rows:
+        layouts[row['outfit_id']].append(row)
+    return layouts
+
+
+def layout_hash(rows):
+    layout = [
+        [row['clothing_item_id'], *(row[field] for field in OutfitItem.LAYOUT_FIELDS), row['clothing_item__item_image']]
+        for row in rows
+    ]
+    payload = json.dumps([RENDER_VERSION, canvas_size(), layout], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def item_thumbnail(storage, name, variants, width):
+    """An item photo at least `width` wide, from the smallest derivative that covers it when there is one."""
+    candidates = [
+        (int(size), derivative)
+        for fmt_names in (variants or {}).get('formats', {}).values()
+        for size, derivative in fmt_names.items()
+        if int(size) >= width
+    ] if images.is_current(name, variants) else []
+    if candidates:
+        _, derivative = min(candidates)
+        with storage.open(derivative, 'rb') as stored:
+            return images.decode(stored)
+    with storage.open(name, 'rb') as stored:
+        return images.decode(stored, width)
+
+
+def render(rows, storage=None):
+    """Draw one outfit's layout rows (see item_layouts) and return the canvas."""
+    storage = storage or WardrobeItem._meta.get_field('item_image').storage
+    canvas = Image.new('RGB', canvas_size(), BACKGROUND)
+    for row in rows:
+        name = row['clothing_item__item_image']
+        box = (max(1, round(row['size_width'])), max(1, round(row['size_height'])))
+        if not name:
+            continue
+        try:
+            photo = item_thumbnail(storage, name, row['clothing_item__image_variants'], box[0])
+        except Exception as exc:
+            logger.warning("Skipping %s in outfit %s preview: %s", name, row['outfit_id'], exc)
+            continue
+        photo = ImageOps.contain(photo, box, Image.Resampling.LANCZOS).convert('RGBA')
+        if row['rotation'] % 360:
+            # Clients rotate clockwise, PIL counter-clockwise
+            photo = photo.rotate(-row['rotation'], Image.Resampling.BICUBIC, expand=True)
+        centre_x = row['position_x'] + row['size_width'] / 2
+        centre_y = row['position_y'] + row['size_height'] / 2
+        canvas.paste(photo, (round(centre_x - photo.width / 2), round(centre_y - photo.height / 2)), photo)
+    return canvas
+
+
+def encode(canvas):
+    """(bytes, extension): WebP when this Pillow build has it, PNG otherwise."""
+    buffer = io.BytesIO()
+    if features.check('webp'):
+        canvas.save(buffer, 'WEBP', quality=80, method=4)
+        return buffer.getvalue(), 'webp'
+    canvas.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue(), 'png'
+
+
+def store(outfit, canvas, digest):
+    """Save a rendered preview; the save replaces (and releases) the previous preview and builds its derivatives."""
+    data, extension = encode(canvas)
+    outfit.preview_image = ContentFile(data, name=f"outfit_{outfit.pk}.{extension}")
+    outfit.preview_layout_hash = digest
+    outfit.save(update_fields=['preview_image', 'preview_layout_hash', 'updated_at'])
+
+
+def clear(outfit, digest):
+    """Drop the preview of an outfit with nothing to draw, releasing the stored one."""
+    storage, old = outfit.preview_image.storage, outfit.preview_image.name
+    outfit.preview_image = None
+    outfit.preview_layout_hash = digest
+    outfit.save(update_fields=['preview_image', 'preview_layout_hash', 'updated_at'])
+    images.release(storage, old)
+
+
+def refresh(outfits, force=False):
+    """Render the previews of `outfits` (a queryset) whose layout changed; returns how many were rendered."""
+    outfits = outfits.only('id', 'user_id', 'preview_image', 'preview_variants', 'preview_layout_hash')
+    outfits = {outfit.pk: outfit for outfit in outfits}
+    layouts = item_layouts(list(outfits))
+    rendered = 0
+    for pk, outfit in outfits.items():
+        rows = layouts.get(pk, [])
+        digest = layout_hash(rows)
+        if not force and digest == outfit.preview_layout_hash:
+            continue
+        if not rows:
+            if outfit.preview_image:
+                clear(outfit, digest)
+            continue
+        store(outfit, render(rows), digest)
+        rendered += 1
+    return rendered
+
+
+def current_hash(outfit):
+    """The layout hash of an outfit as it is now; recorded with client uploaded previews."""
+    return layout_hash(item_layouts([outfit.pk]).get(outfit.pk, []))
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outfit-previews')
+        return _executor
+
+
+def refresh_in_background(**filters):
+    try:
+        refresh(Outfit.objects.filter(**filters))
+    except Exception:
+        logger.exception("Rendering outfit previews (%s) failed", filters)
+    finally:
+        connections.close_all()
+
+
+def schedule(**filters):
+    """Refresh the previews of the outfits matching `filters` once the current transaction commits."""
+    mode = settings.API_OUTFIT_PREVIEW_RENDERING
+    if mode == 'inline':
+        transaction.on_commit(lambda: refresh(Outfit.objects.filter(**filters)))
+    elif mode == 'background':
+        transaction.on_commit(lambda: executor().submit(refresh_in_background, **filters))
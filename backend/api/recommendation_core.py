@@ -0,0 +1,333 @@
+"""
+ORM-independent scoring core for outfit recommendations.
+
+Works on compact ItemRecord objects instead of WardrobeItem instances, so it can
+be used from request handlers, batch jobs and microbenchmarks alike without a
+database. RecommendationEngine is the thin Django adapter around it.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import color_model
+
+FORMAL_KEYWORDS = ['blazer', 'dress', 'tie', 'tuxedo', 'heels', 'oxford', 'formal']
+CASUAL_KEYWORDS = ['hoodie', 't-shirt', 'sneaker', 'jeans', 'casual', 'sport']
+HEAVY_KEYWORDS = ['coat', 'blazer', 'sweater', 'cardigan', 'hoodie', 'parka', 'leather jacket', 'denim jacket']
+
+# Occasion categories mapped to formality
+OCCASION_TO_FORMALITY = {
+    'casual': 'casual',
+    'professional': 'professional',
+    'formal': 'formal',
+    'party': 'formal',
+    'date': 'professional',
+    'gym': 'casual',
+    'outdoor': 'casual',
+    'beach': 'casual',
+}
+
+# Number of items in a recommended outfit
+OUTFIT_SIZE = 5
+
+# How much color harmony with already chosen items can lift a candidate,
+# and how many top-scoring candidates are considered for the outfit
+HARMONY_WEIGHT = 0.1
+SHORTLIST_SIZE = 40
+
+# Fields ItemRecord needs, in the order of ItemRecord.from_row
+RECORD_FIELDS = ('id', 'name', 'category', 'season', 'tags__color', 'tags__formality')
+
+
+class ItemRecord:
+    """Just the features of a wardrobe item that scoring needs."""
+
+    __slots__ = ('id', 'has_category', 'season', 'color', 'formality', 'is_heavy')
+
+    def __init__(self, id: int, has_category: bool, season: str, color: int, formality: Tuple[str, ...], is_heavy: bool):
+        self.id = id
+        self.has_category = has_category
+        self.season = season
+        self.color = color
+        self.formality = formality
+        self.is_heavy = is_heavy
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> 'ItemRecord':
+        """Build a record from a (id, name, category, season, color_tag, formality_tag) row."""
+        item_id, name, category, season, color_tag, formality_tag = row
+        name = name.lower() if name else ""
+        return cls(
+            id=item_id,
+            has_category=bool(category),
+            season=season or '',
+            color=color_model.extract_color_index(name, color_tag),
+            formality=tuple(extract_formality_hints(name, formality_tag)),
+            is_heavy=any(keyword in name for keyword in HEAVY_KEYWORDS),
+        )
+
+
+def extract_color(name: str, color_tag=None) -> str:
+    """Extract dominant color from the color tag or the lowercased item name."""
+    return color_model.COLORS[color_model.extract_color_index(name, color_tag)]
+
+
+def extract_formality_hints(name: str, formality_tag=None) -> List[str]:
+    """Extract formality indicators from the lowercased item name and formality tag."""
+    hints = []
+    for keyword in FORMAL_KEYWORDS:
+        if keyword in name:
+            hints.append('formal')
+    for keyword in CASUAL_KEYWORDS:
+        if keyword in name:
+            hints.append('casual')
+    # The tag may be a single value or, from the autotagger, a list of them
+    if isinstance(formality_tag, (list, tuple)):
+        hints.extend(str(value) for value in formality_tag if value)
+    elif formality_tag:
+        hints.append(str(formality_tag))
+    return hints
+
+
+def color_compatibility_score(color1: str, color2: str) -> float:
+    """Score how well two colors complement each other (0-1)."""
+    index1 = color_model.color_index(color1)
+    index2 = color_model.color_index(color2)
+    if index1 is None or index2 is None:
+        return 0.5
+    return color_model.HARMONY[index1][index2]
+
+
+def formality_match_score(item_formality: Sequence[str], occasion_formality: str) -> float:
+    """Score how well item matches occasion formality (0-1)."""
+    if not item_formality:
+        return 0.5  # Neutral if no formality hints
+
+    if occasion_formality in item_formality:
+        return 1.0
+    elif 'formal' in item_formality and occasion_formality in ['professional', 'formal']:
+        return 0.8
+    elif 'casual' in item_formality and occasion_formality == 'casual':
+        return 1.0
+    elif 'professional' in item_formality and occasion_formality in ['professional', 'formal']:
+        return 0.9
+    else:
+        return 0.3
+
+
+def weather_score(weather: str, is_heavy: bool, season: str) -> float:
+    """Score weather appropriateness of an item."""
+    if weather in ['sunny', 'hot'] and is_heavy:
+        return -0.2  # Penalize heavy items for sunny/hot weather
+    elif weather in ['sunny', 'hot'] and season in ['Summer', 'Spring']:
+        return 0.3
+    elif weather in ['snowy', 'cold'] and (is_heavy or season in ['Winter', 'Fall']):
+        return 0.3
+    elif season == 'None' or season == '':
+        return 0.15  # Neutral season items get small bonus
+    return 0.0
+
+
+def score_records(records: Sequence[ItemRecord], weather: str, occasion_formality: str) -> List[float]:
+    """Score every record for one context."""
+    # Formality and weather scores only depend on a few distinct inputs
+    formality_cache: Dict[Tuple[str, ...], float] = {}
+    weather_cache: Dict[Tuple[bool, str], float] = {}
+    scores = []
+    for record in records:
+        formality = formality_cache.get(record.formality)
+        if formality is None:
+            formality = formality_cache[record.formality] = (
+                formality_match_score(record.formality, occasion_formality) * 0.4
+            )
+        weather_key = (record.is_heavy, record.season)
+        weather_value = weather_cache.get(weather_key)
+        if weather_value is None:
+            weather_value = weather_cache[weather_key] = weather_score(weather, record.is_heavy, record.season)
+        scores.append((0.1 if record.has_category else 0.0) + formality + weather_value)
+    return scores
+
+
+def top_indexes(scores: Sequence[float], limit: int, exclude: Iterable[int] = ()) -> List[int]:
+    """Indexes of the highest scores, ties broken by position."""
+    excluded = set(exclude)
+    candidates = (index for index in range(len(scores)) if index not in excluded)
+    return heapq.nsmallest(limit, candidates, key=lambda index: (-scores[index], index))
+
+
+def select_outfit(
+    records: Sequence[ItemRecord],
+    scores: Sequence[float],
+    limit: int = OUTFIT_SIZE,
+    exclude: Iterable[int] = (),
+) -> List[int]:
+    """
+    Pick the outfit greedily: start from the best item, then repeatedly add the
+    candidate with the best score plus color harmony against the items chosen
+    so far. Only the top-scoring shortlist is considered.
+    """
+    shortlist = top_indexes(scores, max(limit, SHORTLIST_SIZE), exclude)
+    if not shortlist:
+        return []
+
+    chosen = [shortlist.pop(0)]
+    chosen_colors = [records[chosen[0]].color]
+    while shortlist and len(chosen) < limit:
+        best_position = max(
+            range(len(shortlist)),
+            key=lambda position: (
+                scores[shortlist[position]]
+                + HARMONY_WEIGHT * color_model.mean_harmony(records[shortlist[position]].color, chosen_colors),
+                -position,
+            ),
+        )
+        index = shortlist.pop(best_position)
+        chosen.append(index)
+        chosen_colors.append(records[index].color)
+    return chosen
+
+
+def build_explanation(
+    intro: str,
+    colors: Iterable[str],
+    occasion_formality: str,
+    temperature: Optional[int],
+) -> str:
+    explanation_parts = [intro]
+
+    # Add color harmony note
+    colors_used = set(colors)
+    if len(colors_used) > 1:
+        explanation_parts.append(f"Colors selected for harmony: {', '.join(colors_used)}.")
+
+    # Add formality note
+    explanation_parts.append(f"Selected items matching {occasion_formality} formality level.")
+
+    # Add temperature note if provided
+    if temperature:
+        if temperature < 10:
+            explanation_parts.append("Cold weather - prioritizing warm items.")
+        elif temperature > 25:
+            explanation_parts.append("Warm weather - prioritizing light, breathable items.")
+
+    return " ".join(explanation_parts)
+
+
+def recommend(
+    records: Sequence[ItemRecord],
+    weather: str,
+    occasion: str,
+    temperature: Optional[int] = None,
+    exclude: Iterable[int] = (),
+    scores: Optional[List[float]] = None,
+) -> Tuple[List[int], float, str]:
+    """
+    Recommend one outfit for a context.
+    Returns: (indexes into records, compatibility_score, explanation)
+    """
+    occasion_formality = OCCASION_TO_FORMALITY.get(occasion, 'casual')
+    if scores is None:
+        scores = score_records(records, weather, occasion_formality)
+
+    chosen = select_outfit(records, scores, exclude=exclude)
+    if not chosen:
+        return ([], 0, "No wardrobe items available for recommendations.")
+
+    avg_score = sum(scores[index] for index in chosen) / len(chosen)
+    compatibility_score = min(100, avg_score * 100)
+
+    explanation = build_explanation(
+        f"Recommended {len(chosen)} items for a {occasion} occasion in {weather} weather.",
+        (color_model.COLORS[records[index].color] for index in chosen),
+        occasion_formality,
+        temperature,
+    )
+    return (chosen, compatibility_score, explanation)
+
+
+def recommend_variants(
+    records: Sequence[ItemRecord],
+    weather: str,
+    occasion: str,
+    temperature: Optional[int] = None,
+    count: int = 3,
+) -> List[Tuple[List[int], float, str]]:
+    """
+    Recommend 'count' outfit options for one context.
+    Returns: List of (indexes into records, compatibility_score, explanation) tuples
+    """
+    if not records:
+        return []
+
+    occasion_formality = OCCASION_TO_FORMALITY.get(occasion, 'casual')
+    base_scores = score_records(records, weather, occasion_formality)
+    variants = []
+
+    for variant_num in range(count):
+        # Later variants get slightly different scores
+        factor = 1.0 - (variant_num * 0.15) if variant_num > 0 else 1.0
+        scores = [score * factor for score in base_scores]
+
+        chosen = select_outfit(records, scores)
+        avg_score = sum(scores[index] for index in chosen) / len(chosen)
+        compatibility_score = min(100, avg_score * 100)
+
+        explanation = build_explanation(
+            f"Outfit Option {variant_num + 1}: {len(chosen)} items for a {occasion} occasion in {weather} weather.",
+            (color_model.COLORS[records[index].color] for index in chosen),
+            occasion_formality,
+            temperature,
+        )
+        variants.append((chosen, compatibility_score, explanation))
+
+    return variants
+
+
+def recommend_batch(
+    records: Sequence[ItemRecord],
+    contexts: Sequence[Dict],
+    avoid_repeats: bool = False,
+) -> List[Tuple[List[int], float, str]]:
+    """
+    Recommend one outfit per context.
+
+    Formality and weather scores are computed as per-record columns once per
+    distinct value in the batch, and each context is scored by adding columns.
+    If avoid_repeats is True, records picked for a context are skipped for the
+    next one whenever enough other records are left.
+    Returns: List of (indexes into records, compatibility_score, explanation) tuples
+    """
+    base_scores = [0.1 if record.has_category else 0.0 for record in records]
+    formality_columns: Dict[str, List[float]] = {}
+    weather_columns: Dict[str, List[float]] = {}
+    for context in contexts:
+        formality = OCCASION_TO_FORMALITY.get(context['occasion'], 'casual')
+        if formality not in formality_columns:
+            formality_columns[formality] = [
+                formality_match_score(record.formality, formality) * 0.4 for record in records
+            ]
+        weather = context['weather']
+        if weather not in weather_columns:
+            weather_columns[weather] = [
+                weather_score(weather, record.is_heavy, record.season) for record in records
+            ]
+
+    results = []
+    previous: List[int] = []
+    for context in contexts:
+        formality = OCCASION_TO_FORMALITY.get(context['occasion'], 'casual')
+        scores = [
+            base + formality_score + weather_value
+            for base, formality_score, weather_value in zip(
+                base_scores, formality_columns[formality], weather_columns[context['weather']]
+            )
+        ]
+        exclude = previous if avoid_repeats and len(records) - len(previous) >= OUTFIT_SIZE else ()
+        result = recommend(
+            records, context['weather'], context['occasion'], context.get('temperature'),
+            exclude=exclude, scores=scores,
+        )
+        previous = result[0]
+        results.append(result)
+
+    return results
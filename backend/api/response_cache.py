@@ -0,0 +1,140 @@
+"""
+Server-side cache of serialized read responses, per user and endpoint.
+
+CachedResponseMixin stores response.data of successful GETs in Django's
+cache framework. Keys combine the user, the absolute request URI and the
+user's UserDataVersion counters and change timestamps (the same ones behind
+the ETags in api/conditional.py). Signals bump those counters on every
+WardrobeItem / Outfit / OutfitItem write, so a write makes every older entry
+unreachable and nothing has to be deleted; stale entries age out with their
+timeout. The counter lookup is shared with ConditionalGetMixin, which views
+using this mixin must also include.
+
+On a miss the first request takes a short lock on the key with cache.add()
+and stores its result. Concurrent requests for the same key do not wait for
+it (that would park a worker per request); they compute their own response
+and leave storing it to the lock holder.
+
+Hits, misses and recompute time are counted in the cache itself, so they
+cover every worker; `manage.py response_cache_stats` reports them.
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+logger = logging.getLogger('api.cache')
+
+KEY_PREFIX = 'api:resp'
+STATS_KEYS = ('hits', 'misses', 'recompute_count', 'recompute_us')
+# How long a recompute may hold its key's lock
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+
+
+def get_cache():
+    return caches[settings.API_RESPONSE_CACHE_ALIAS]
+
+
+def incr_stat(name, delta=1):
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:stats:{name}'
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # First increment, or the counter was evicted
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def stats():
+    """Hit ratio and recompute time since the counters were last reset."""
+    values = get_cache().get_many([f'{KEY_PREFIX}:stats:{name}' for name in STATS_KEYS])
+    hits, misses, recompute_count, recompute_us = (
+        values.get(f'{KEY_PREFIX}:stats:{name}', 0) for name in STATS_KEYS
+    )
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else 0.0,
+        'recomputes': recompute_count,
+        'avg_recompute_ms': recompute_us / recompute_count / 1000 if recompute_count else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([f'{KEY_PREFIX}:stats:{name}' for name in STATS_KEYS])
+
+
+class CachedResponse(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class CachedResponseMixin:
+    # Viewset actions to cache; None caches every GET of the view
+    cache_actions = None
+    # Per-action timeouts overriding settings.API_RESPONSE_CACHE_TIMEOUT, for
+    # responses that also depend on the clock
+    cache_timeouts = {}
+
+    def get_cache_key(self, request):
+        versions, changed_at = self.get_data_versions(request)
+        key = "|".join([
+            str(request.user.pk),
+            ",".join(str(version) for version in versions),
+            ",".join(value.isoformat() if value else '' for value in changed_at),
+            request.build_absolute_uri(),
+        ])
+        action = getattr(self, 'action', None) or request.method.lower()
+        return f'{KEY_PREFIX}:{self.__class__.__name__}:{action}:{hashlib.sha1(key.encode()).hexdigest()}'
+
+    def is_cacheable(self, request):
+        if not settings.API_RESPONSE_CACHE or request.method != 'GET' or not request.user.is_authenticated:
+            return False
+        return self.cache_actions is None or getattr(self, 'action', None) in self.cache_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        self.response_cache_lock = None
+        if not self.is_cacheable(request):
+            return
+
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            incr_stat('hits')
+            raise CachedResponse(Response(entry))
+
+        incr_stat('misses')
+        if cache.add(f'{key}:lock', 1, timeout=RESPONSE_CACHE_LOCK_TIMEOUT):
+            self.response_cache_lock = f'{key}:lock'
+            self.response_cache_key = key
+            self.response_cache_started = time.perf_counter()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CachedResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        key = getattr(self, 'response_cache_key', None)
+        if key is not None and response.status_code == 200 and isinstance(response, Response):
+            cache = get_cache()
+            timeout = self.cache_timeouts.get(getattr(self, 'action', None), settings.API_RESPONSE_CACHE_TIMEOUT)
+            cache.set(key, response.data, timeout=timeout)
+            elapsed_us = int((time.perf_counter() - self.response_cache_started) * 1_000_000)
+            incr_stat('recompute_count')
+            incr_stat('recompute_us', elapsed_us)
+            logger.debug("Recomputed %s in %.1f ms", key, elapsed_us / 1000)
+        lock = getattr(self, 'response_cache_lock', None)
+        if lock is not None:
+            get_cache().delete(lock)
+            self.response_cache_lock = None
+        return super().finalize_response(request, response, *args, **kwargs)
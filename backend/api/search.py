@@ -0,0 +1,145 @@
+"""
+Server-side wardrobe search with facet counts.
+
+Used by GET /api/wardrobe/search/. Structured filters (category, season,
+brand, material, price) run against the (user, ...) B-tree indexes on
+WardrobeItem. Tag filters (type, color, pattern) use JSON containment on
+PostgreSQL, which the GIN index on `tags` serves, and json_each() on SQLite,
+which gives the same results without an index.
+
+Several values for one filter match any of them; different filters must all
+match:
+
+    ?category=Tops,Bottoms&color=black&min_price=10
+"""
+
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+
+from django.db import connection
+from django.db.models import BooleanField, Count, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from .models import WardrobeItem
+
+FIELD_FACETS = ('category', 'season', 'brand', 'material')
+TAG_FACETS = ('type', 'color', 'pattern')
+
+
+def get_values(params, key: str) -> List[str]:
+    """Values for a filter, from repeated (?color=a&color=b) or comma separated (?color=a,b) params."""
+    values = []
+    for raw in params.getlist(key):
+        for value in raw.split(","):
+            value = value.strip()
+            if value and value not in values:
+                values.append(value)
+    return values
+
+
+def get_price(params, key: str):
+    value = params.get(key)
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({key: "Must be a number."})
+
+
+def tag_filter(key: str, values: List[str]):
+    """Condition matching items whose tags[key] contains any of the values."""
+    if connection.vendor == 'postgresql':
+        # @> containment; served by the GIN index. Tags are normally lists but
+        # hand-edited ones may hold a single string, so match both shapes.
+        condition = Q()
+        for value in values:
+            condition |= Q(tags__contains={key: [value]}) | Q(tags__contains={key: value})
+        return condition
+
+    table = WardrobeItem._meta.db_table
+    placeholders = ", ".join(["%s"] * len(values))
+    return RawSQL(
+        f'EXISTS (SELECT 1 FROM json_each("{table}"."tags", %s) WHERE json_each.value IN ({placeholders}))',
+        [f'$.{key}', *values],
+        output_field=BooleanField(),
+    )
+
+
+def filter_items(queryset, params):
+    """Apply the search query params to a WardrobeItem queryset."""
+    query = (params.get('q') or "").strip()
+    if query:
+        queryset = queryset.filter(name__icontains=query)
+
+    for field in FIELD_FACETS:
+        values = get_values(params, field)
+        if values:
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+    min_price = get_price(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = get_price(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    for key in TAG_FACETS:
+        # Autotagger vocabulary is lowercase
+        values = [value.lower() for value in get_values(params, key)]
+        if values:
+            queryset = queryset.filter(tag_filter(key, values))
+
+    return queryset
+
+
+def ranked(pairs) -> Dict[str, int]:
+    """Facet values ordered by count, most common first."""
+    return dict(sorted(pairs, key=lambda pair: (-pair[1], pair[0])))
+
+
+def tag_counts(queryset) -> Dict[str, Dict[str, int]]:
+    """Count items per tag value for every TAG_FACETS key, in one pass over the queryset's rows."""
+    table = WardrobeItem._meta.db_table
+    inner_sql, inner_params = queryset.order_by().values('pk').query.sql_with_params()
+    keys = ", ".join(["%s"] * len(TAG_FACETS))
+
+    if connection.vendor == 'postgresql':
+        sql = f"""
+            SELECT tag.key, value, COUNT(*) FROM "{table}",
+                jsonb_each(CASE jsonb_typeof("{table}"."tags")
+                    WHEN 'object' THEN "{table}"."tags" ELSE '{{}}'::jsonb END) AS tag,
+                jsonb_array_elements_text(CASE jsonb_typeof(tag.value)
+                    WHEN 'array' THEN tag.value
+                    WHEN 'string' THEN jsonb_build_array(tag.value)
+                    ELSE '[]'::jsonb END) AS value
+            WHERE tag.key IN ({keys}) AND "{table}"."id" IN ({inner_sql})
+            GROUP BY tag.key, value
+        """
+    else:
+        # json_each() over a scalar yields the scalar itself, so single-string tags count too
+        sql = f"""
+            SELECT tag.key, value.value, COUNT(*) FROM "{table}",
+                json_each("{table}"."tags") AS tag, json_each(tag.value) AS value
+            WHERE tag.key IN ({keys}) AND "{table}"."id" IN ({inner_sql})
+            GROUP BY tag.key, value.value
+        """
+
+    counts = {key: [] for key in TAG_FACETS}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*TAG_FACETS, *inner_params])
+        for key, value, count in cursor.fetchall():
+            if value not in (None, ""):
+                counts[key].append((str(value), count))
+    return {key: ranked(pairs) for key, pairs in counts.items()}
+
+
+def facet_counts(queryset) -> Dict[str, Dict[str, int]]:
+    """Per-value item counts for every facet, over the already filtered queryset."""
+    facets = {}
+    for field in FIELD_FACETS:
+        rows = queryset.order_by().exclude(**{field: ""}).values(field).annotate(count=Count('pk'))
+        facets[field] = ranked((row[field], row['count']) for row in rows)
+    facets.update(tag_counts(queryset))
+    return facets
@@ -1,5 +1,12 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.conf import settings
+from django.db import transaction
 from .models import *
+from .authentication import UserRefreshToken
+from . import images
+from . import insights
+from .uploads import GuardedImageField
 from django.contrib.auth import get_user_model, authenticate
 User = get_user_model()
 class UserSerializer(serializers.ModelSerializer):
@@ -35,14 +42,99 @@ class LoginSerializer(serializers.Serializer):
                 raise serializers.ValidationError("Invalid email or password.")
         except User.DoesNotExist:
             raise serializers.ValidationError("Invalid email or password.")
-    
-class WardrobeItemSerializer(serializers.ModelSerializer):
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """POST /api/token/, issuing tokens with the claims CachedJWTAuthentication checks"""
+    token_class = UserRefreshToken
+
+
+def get_query_params(context):
+    """Query params of the request being rendered, if the serializer was given them."""
+    if 'query_params' in context:
+        return context['query_params']
+    request = context.get('request')
+    return getattr(request, 'query_params', None)
+
+
+def param_list(params, key):
+    return [value.strip() for value in params.get(key, "").split(",") if value.strip()]
+
+
+def wants_sideload(params):
+    return params is not None and params.get('sideload', "").lower() in ("1", "true", "wardrobe_items")
+
+
+class ShapedSerializerMixin:
+    """
+    Lets clients shape read responses with query params:
+
+        ?fields=id,name,items      keep only these top-level fields
+        ?expand=clothing_item      render these relations as nested objects;
+                                   other expandable relations render as ids
+        ?sideload=true             render relations as ids; list views return
+                                   each referenced wardrobe item once, under
+                                   "wardrobe_items"
+
+    Without ?expand or ?sideload, relations stay fully nested while
+    settings.API_LEGACY_FULL_NESTING is on.
+    """
+    # relation field name -> factory for the id-only field that replaces it
+    expandable_fields = {}
+
+    def is_top_level(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def should_expand(self, params, name):
+        if wants_sideload(params):
+            return False
+        if 'expand' not in params:
+            return settings.API_LEGACY_FULL_NESTING
+        return name in param_list(params, 'expand')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        params = get_query_params(self.context)
+        if params is None:
+            return fields
+
+        for name, id_field in self.expandable_fields.items():
+            if name in fields and not self.should_expand(params, name):
+                fields[name] = id_field()
+
+        requested = param_list(params, 'fields')
+        # Only trim responses; never drop fields a write needs
+        if requested and self.is_top_level() and not hasattr(self, 'initial_data'):
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+
+def image_srcset(variants, storage, request):
+    """srcset strings per format for an image's derivatives (see api/images.py)."""
+    def url(name):
+        location = storage.url(name)
+        return request.build_absolute_uri(location) if request is not None else location
+    return images.srcset(variants, url)
+
+
+class WardrobeItemSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
+    # Upload limits are checked from the image header before anything decodes it (api/uploads.py)
+    item_image = GuardedImageField(required=False, max_length=100)
+    item_image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = WardrobeItem
-        fields = ["id", "item_image", "category", "season", "brand", "material", "price", "name", "tags", "user"]
+        fields = ["id", "item_image", "item_image_srcset", "category", "season", "brand", "material", "price",
+                  "name", "tags", "user"]
         extra_kwargs = {"user": {"read_only": True}}
 
-class OutfitItemSerializer(serializers.ModelSerializer):
+    def get_item_image_srcset(self, obj):
+        return image_srcset(obj.image_variants, obj.item_image.storage, self.context.get('request'))
+
+class OutfitItemSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for outfit items with nested clothing item data
     """
@@ -50,6 +142,7 @@ class OutfitItemSerializer(serializers.ModelSerializer):
     clothing_item_id = serializers.PrimaryKeyRelatedField(
         queryset=WardrobeItem.objects.all(), source='clothing_item', write_only=True
     )
+    expandable_fields = {'clothing_item': lambda: serializers.PrimaryKeyRelatedField(read_only=True)}
 
     class Meta:
         model = OutfitItem
@@ -66,12 +159,13 @@ class OutfitItemSerializer(serializers.ModelSerializer):
             'z_index',
         ]
 
-class OutfitSerializer(serializers.ModelSerializer):
+class OutfitSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for outfits with nested outfit items
     """
     items = OutfitItemSerializer(many=True, read_only=True)
     preview_image_url = serializers.SerializerMethodField()
+    preview_image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Outfit
@@ -81,6 +175,7 @@ class OutfitSerializer(serializers.ModelSerializer):
             'occasion',
             'season',
             'preview_image_url',
+            'preview_image_srcset',
             'is_favorite',
             'scheduled_date',
             'created_at',
@@ -98,10 +193,19 @@ class OutfitSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.preview_image.url)
         return None
 
+    def get_preview_image_srcset(self, obj):
+        return image_srcset(obj.preview_variants, obj.preview_image.storage, self.context.get('request'))
+
 
 class OutfitCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating/updating outfits with items (for POST/PUT/PATCH)
+
+    Items are written in bulk inside one transaction. On update the incoming
+    items are diffed against the stored ones (matched by outfit item "id" when
+    sent, else by clothing_item_id): unchanged rows are left alone, moved or
+    resized rows go through one bulk_update, and only added/removed rows are
+    inserted/deleted.
     """
     items = serializers.ListField(
         child=serializers.DictField(),
@@ -111,7 +215,16 @@ class OutfitCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Outfit
         fields = ['name', 'occasion', 'season', 'is_favorite', 'scheduled_date', 'items', 'tags']
+
+    @staticmethod
+    def build_item(outfit, item_data):
+        return OutfitItem(
+            outfit=outfit,
+            clothing_item_id=int(item_data['clothing_item_id']),
+            **{field: item_data[field] for field in OutfitItem.EDITABLE_FIELDS},
+        )
     
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = self.context['request'].user
@@ -119,27 +232,21 @@ class OutfitCreateUpdateSerializer(serializers.ModelSerializer):
             # For testing only - we'll need proper auth later
             user = User.objects.first()  # Use first user in DB for testing
     
-        outfit = Outfit.objects.create(
+        outfit = Outfit(
             user=user,
             **validated_data
         )
+        # Counted in the style insights together with its items, below
+        outfit._insights_counted = True
+        outfit.save(force_insert=True)
         
         # Create outfit items
-        for item_data in items_data:
-            OutfitItem.objects.create(
-                outfit=outfit,
-                clothing_item_id=item_data['clothing_item_id'],
-                layer=item_data['layer'],
-                position_x=item_data['position_x'],
-                position_y=item_data['position_y'],
-                size_width=item_data['size_width'],
-                size_height=item_data['size_height'],
-                rotation=item_data['rotation'],
-                z_index=item_data['z_index'],
-            )
+        items = OutfitItem.objects.bulk_create([self.build_item(outfit, item_data) for item_data in items_data])
+        insights.outfit_items_changed(outfit.user_id, added=[item.clothing_item_id for item in items], outfits=1)
         
         return outfit
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
         
@@ -152,30 +259,71 @@ class OutfitCreateUpdateSerializer(serializers.ModelSerializer):
         
         # Update items if provided
         if items_data is not None:
-            # Delete existing items
-            instance.items.all().delete()
-            
-            # Create new items
-            for item_data in items_data:
-                OutfitItem.objects.create(
-                    outfit=instance,
-                    clothing_item_id=item_data['clothing_item_id'],
-                    layer=item_data['layer'],
-                    position_x=item_data['position_x'],
-                    position_y=item_data['position_y'],
-                    size_width=item_data['size_width'],
-                    size_height=item_data['size_height'],
-                    rotation=item_data['rotation'],
-                    z_index=item_data['z_index'],
-                )
+            self.sync_items(instance, items_data)
         
         return instance
 
-class RecommendationSerializer(serializers.ModelSerializer):
+    def sync_items(self, outfit, items_data):
+        existing = list(outfit.items.all())
+        by_id = {item.pk: item for item in existing}
+        by_clothing = {}
+        for item in existing:
+            by_clothing.setdefault(item.clothing_item_id, []).append(item)
+
+        to_create, to_update, matched = [], [], set()
+        for item_data in items_data:
+            wanted = self.build_item(outfit, item_data)
+            item = by_id.get(item_data.get('id'))
+            if item is None or item.pk in matched:
+                candidates = [candidate for candidate in by_clothing.get(wanted.clothing_item_id, [])
+                              if candidate.pk not in matched]
+                item = candidates[0] if candidates else None
+            if item is None or item.clothing_item_id != wanted.clothing_item_id:
+                to_create.append(wanted)
+                continue
+            matched.add(item.pk)
+            changed = False
+            for field in OutfitItem.EDITABLE_FIELDS:
+                if getattr(item, field) != getattr(wanted, field):
+                    setattr(item, field, getattr(wanted, field))
+                    changed = True
+            if changed:
+                to_update.append(item)
+
+        removed = [item for item in existing if item.pk not in matched]
+        if removed:
+            OutfitItem.objects.filter(pk__in=[item.pk for item in removed]).delete()
+        if to_update:
+            OutfitItem.objects.bulk_update(to_update, OutfitItem.EDITABLE_FIELDS)
+        if to_create:
+            OutfitItem.objects.bulk_create(to_create)
+        insights.outfit_items_changed(outfit.user_id, added=[item.clothing_item_id for item in to_create],
+                                      removed=[item.clothing_item_id for item in removed])
+
+
+class OutfitItemLayoutSerializer(serializers.Serializer):
+    """
+    One canvas change for PATCH /api/outfits/{id}/layout/; only the sent
+    fields are written
+    """
+    id = serializers.IntegerField()
+    position_x = serializers.FloatField(required=False)
+    position_y = serializers.FloatField(required=False)
+    size_width = serializers.FloatField(required=False)
+    size_height = serializers.FloatField(required=False)
+    rotation = serializers.FloatField(required=False)
+    z_index = serializers.IntegerField(required=False)
+
+
+class OutfitLayoutSerializer(serializers.Serializer):
+    items = OutfitItemLayoutSerializer(many=True, allow_empty=False)
+
+class RecommendationSerializer(ShapedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for outfit recommendations with nested item data
     """
     recommended_items = WardrobeItemSerializer(many=True, read_only=True)
+    expandable_fields = {'recommended_items': lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True)}
 
     class Meta:
         model = Recommendation
@@ -184,6 +332,7 @@ class RecommendationSerializer(serializers.ModelSerializer):
             'weather',
             'occasion',
             'temperature',
+            'date',
             'recommended_items',
             'compatibility_score',
             'explanation',
@@ -216,3 +365,17 @@ class RecommendationRequestSerializer(serializers.Serializer):
     ])
     temperature = serializers.IntegerField(required=False, allow_null=True)
 
+
+class RecommendationContextSerializer(RecommendationRequestSerializer):
+    """
+    Serializer for a single day in a batch of recommendations
+    """
+    date = serializers.DateField()
+
+
+class RecommendationBatchRequestSerializer(serializers.Serializer):
+    """
+    Serializer for generating recommendations for several days at once
+    """
+    contexts = RecommendationContextSerializer(many=True, allow_empty=False, max_length=31)
+    avoid_repeats = serializers.BooleanField(default=False)
@@ -0,0 +1,163 @@
+"""
+Content-addressed, deduplicated media storage.
+
+ContentAddressedStorage wraps the configured media backend (FileSystemStorage
+under MEDIA_ROOT, or Cloudinary). Files are stored once per distinct content,
+as blobs/<first two hex digits>/<sha256><ext>, whatever name or directory
+they were uploaded under; the StoredBlob table maps each hash to its stored
+name and counts the saved references to it.
+
+- save() of bytes already stored returns the existing name and only adds a
+  reference; nothing is written.
+- delete() drops one reference, and removes the file once the last one goes
+  (after the transaction commits, so a rollback never loses a file).
+- Files written before this storage was enabled have no StoredBlob row and
+  keep working; delete() removes them directly. `manage.py dedupe_media`
+  moves them into blobs and reports the bytes saved.
+
+If the uploaded content already carries its digest as a `sha256` attribute,
+it is reused rather than computed again; the digest computed here is set on
+the content the same way, for later readers (see images.ImageSource).
+"""
+
+import hashlib
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+BLOB_PREFIX = 'blobs'
+
+
+def content_digest(content):
+    digest = getattr(content, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        content.seek(0)
+        digest = hasher.hexdigest()
+        try:
+            content.sha256 = digest
+        except AttributeError:
+            pass
+    return digest
+
+
+def blob_name(digest, name):
+    _, ext = os.path.splitext(name)
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest}{ext.lower()}"
+
+
+def dedup_stats():
+    """Blob count, references, bytes stored, and bytes saved by sharing blobs."""
+    from .models import StoredBlob
+
+    totals = StoredBlob.objects.aggregate(
+        blobs=Count('pk'), references=Sum('refs'), stored_bytes=Sum('size'),
+        referenced_bytes=Sum(F('size') * F('refs')),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    return {
+        'blobs': totals['blobs'],
+        'references': totals['references'],
+        'stored_bytes': totals['stored_bytes'],
+        'saved_bytes': totals['referenced_bytes'] - totals['stored_bytes'],
+    }
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    # Saved names share files, so callers must delete() every name they stop using
+    reference_counted = True
+
+    def __init__(self, backend='django.core.files.storage.FileSystemStorage', backend_options=None):
+        self.backend_path = backend
+        self.backend = import_string(backend)(**(backend_options or {}))
+
+    def save(self, name, content, max_length=None):
+        from .models import StoredBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_digest(content)
+
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(sha256=digest).first()
+            if blob is not None:
+                StoredBlob.objects.filter(pk=blob.pk).update(refs=F('refs') + 1)
+                return blob.name
+
+            target = blob_name(digest, name)
+            if self.backend.exists(target):
+                # Left behind by a save whose transaction rolled back
+                stored_name = target
+            else:
+                stored_name = self.backend.save(target, content, max_length=max_length)
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(sha256=digest, name=stored_name, size=content.size)
+            except IntegrityError:
+                # Another request stored the same content first; share its blob
+                StoredBlob.objects.filter(sha256=digest).update(refs=F('refs') + 1)
+                return StoredBlob.objects.get(sha256=digest).name
+        return stored_name
+
+    def delete(self, name):
+        from .models import StoredBlob
+
+        if not name:
+            return
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                self.backend.delete(name)
+            elif blob.refs > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refs=F('refs') - 1)
+            else:
+                blob.delete()
+                transaction.on_commit(lambda: self.backend.delete(name))
+
+    def references(self, name):
+        from .models import StoredBlob
+
+        return StoredBlob.objects.filter(name=name).values_list('refs', flat=True).first() or 0
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+def backend_of(storage):
+    """The storage doing the actual reads and writes, unwrapping ContentAddressedStorage."""
+    return getattr(storage, 'backend', storage)
@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.fields.files import FieldFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image, ImageFile
+from django.urls import resolve
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from backend import server
 from .models import *
+from .instrumentation import QueryRecorder, get_query_budget
+from . import async_views
+from . import fast_read
+from . import images
+from . import insights
+from . import portability
+from . import previews
+from . import response_cache
+from . import sync
+from .authentication import UserRefreshToken, user_cache
+from .views import autotag_in_background, autotag_saved_item, autotag_wardrobe_item
+from .recommendation_engine import RecommendationEngine
+from . import recommendation_core as core
+from . import benchmarks
+from . import color_model
+from .autotagger import COLOR_ALIASES, COLOR_WORDS
+
+
+class RecommendationBenchmarkTests(TestCase):
+    """
+    Regression checks backed by the benchmark helpers; timings are covered by
+    `manage.py bench_recommendations`, these only pin down deterministic metrics.
+    """
+
+    def test_query_count_does_not_grow_with_wardrobe_size(self):
+        small = benchmarks.create_wardrobe(5, seed=1)
+        large = benchmarks.create_wardrobe(300, seed=2)
+        counts = []
+        for user in (small, large):
+            result = benchmarks.measure(
+                lambda: RecommendationEngine.generate_recommendation(user=user, weather='sunny', occasion='casual'),
+                repeat=1,
+            )
+            counts.append(result['queries'])
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[1], 2)
+
+    def test_compare_flags_regressions_past_threshold(self):
+        baseline = {'a': {'median_ms': 10.0, 'queries': 2, 'peak_kb': 100.0}}
+        self.assertEqual(benchmarks.compare({'a': {'median_ms': 11.0, 'queries': 2, 'peak_kb': 100.0}}, baseline, 0.2), [])
+        regressions = benchmarks.compare({'a': {'median_ms': 13.0, 'queries': 3, 'peak_kb': 100.0}}, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+
+
+class RecommendationCoreTests(SimpleTestCase):
+    """recommendation_core on hand-built records; SimpleTestCase fails on any database query."""
+
+    ROWS = [
+        (1, "Navy Blazer", 'Outerwear', 'Fall', 'navy', None),
+        (2, "Jeans", 'Bottoms', 'None', 'navy', None),
+        (3, "T-shirt", 'Tops', 'Summer', 'navy', 'casual'),
+        (4, "Oxford shoes", 'Shoes', '', 'navy', ['formal', 'professional']),
+        (5, "Hoodie", 'Tops', 'Winter', 'navy', None),
+        (6, "Linen shorts", 'Bottoms', 'Summer', 'navy', None),
+        (7, "Cap", '', 'Spring', 'navy', 'sport'),
+        (8, "Parka", 'Outerwear', 'Winter', 'navy', None),
+    ]
+
+    def setUp(self):
+        self.records = [core.ItemRecord.from_row(row) for row in self.ROWS]
+
+    @staticmethod
+    def legacy_score(row, weather, occasion):
+        """The per-item score of RecommendationEngine before scoring moved into the core."""
+        _, name, category, season, _, formality_tag = row
+        name = name.lower()
+        hints = [hint for keywords, hint in ((core.FORMAL_KEYWORDS, 'formal'), (core.CASUAL_KEYWORDS, 'casual'))
+                 for keyword in keywords if keyword in name]
+        hints += formality_tag if isinstance(formality_tag, list) else [formality_tag] if formality_tag else []
+        score = (0.1 if category else 0.0)
+        score += core.formality_match_score(hints, core.OCCASION_TO_FORMALITY.get(occasion, 'casual')) * 0.4
+        is_heavy = any(keyword in name for keyword in core.HEAVY_KEYWORDS)
+        if weather in ['sunny', 'hot'] and is_heavy:
+            score -= 0.2
+        elif weather in ['sunny', 'hot'] and season in ['Summer', 'Spring']:
+            score += 0.3
+        elif weather in ['snowy', 'cold'] and (is_heavy or season in ['Winter', 'Fall']):
+            score += 0.3
+        elif season == 'None' or season == '':
+            score += 0.15
+        return score
+
+    def test_picks_match_the_legacy_ranking(self):
+        for weather, occasion in (('sunny', 'casual'), ('snowy', 'formal'), ('rainy', 'professional')):
+            with self.subTest(weather=weather, occasion=occasion):
+                scores = [self.legacy_score(row, weather, occasion) for row in self.ROWS]
+                # One colour throughout, so harmony cannot reorder the picks
+                legacy = sorted(range(len(scores)), key=lambda index: scores[index], reverse=True)[:core.OUTFIT_SIZE]
+                indexes, compatibility_score, _ = core.recommend(self.records, weather, occasion)
+                self.assertEqual(indexes, legacy)
+                self.assertAlmostEqual(compatibility_score, 100 * sum(scores[i] for i in legacy) / len(legacy))
+
+    def test_batch_matches_single_recommendations(self):
+        contexts = [{'weather': 'sunny', 'occasion': 'casual'}, {'weather': 'cold', 'occasion': 'party', 'temperature': 3}]
+        self.assertEqual(core.recommend_batch(self.records, contexts),
+                         [core.recommend(self.records, **context) for context in contexts])
+        self.assertEqual(core.recommend([], 'sunny', 'casual')[0], [])
+
+    def test_formality_hints_are_hashable_strings(self):
+        self.assertEqual(self.records[3].formality, ('formal', 'formal', 'professional'))
+        self.assertEqual(self.records[6].formality, ('sport',))
+        self.assertEqual(hash(self.records[3].formality), hash(('formal', 'formal', 'professional')))
+
+
+class ColorModelTests(SimpleTestCase):
+    def harmony(self, a, b):
+        return color_model.HARMONY[color_model.color_index(a)][color_model.color_index(b)]
+
+    def test_every_tagger_color_has_an_rgb_value(self):
+        vocabulary = set(COLOR_WORDS) | set(COLOR_ALIASES.values()) | {color_model.DEFAULT_COLOR}
+        self.assertEqual(vocabulary - set(color_model.COLOR_RGB), set())
+        self.assertEqual(set(COLOR_ALIASES) - set(color_model._LOOKUP), set())
+
+    def test_harmony_is_symmetric_and_scores_relationships(self):
+        size = len(color_model.COLORS)
+        for a in range(size):
+            for b in range(size):
+                self.assertEqual(color_model.HARMONY[a][b], color_model.HARMONY[b][a])
+        self.assertEqual(self.harmony('black', 'red'), color_model.NEUTRAL_SCORE)
+        self.assertEqual(self.harmony('navy', 'pink'), color_model.NEUTRAL_SCORE)
+        self.assertEqual(self.harmony('blue', 'orange'), color_model.COMPLEMENTARY_SCORE)
+        self.assertEqual(self.harmony('red', 'maroon'), color_model.ANALOGOUS_SCORE)
+        self.assertEqual(self.harmony('red', 'yellow'), color_model.CLASH_SCORE)
+        self.assertEqual(self.harmony('grey', 'gray'), color_model.MONOCHROME_SCORE)
+
+    def test_index_from_tags_takes_lists_and_legacy_strings(self):
+        navy = color_model.color_index('navy')
+        self.assertEqual(color_model.index_from_tags(['sparkly', 'Navy', 'red']), navy)
+        self.assertEqual(color_model.index_from_tags('navy'), navy)
+        self.assertEqual(color_model.index_from_tags('grey'), color_model.color_index('gray'))
+        self.assertIsNone(color_model.index_from_tags(['sparkly', 3]))
+        self.assertIsNone(color_model.index_from_tags(None))
+
+    def test_index_from_name_matches_whole_words(self):
+        self.assertIsNone(color_model.index_from_name("tank top"))
+        self.assertIsNone(color_model.index_from_name("redwood hoodie"))
+        self.assertEqual(color_model.index_from_name("tan chinos"), color_model.color_index('tan'))
+        self.assertEqual(color_model.extract_color_index("tank top"), color_model.DEFAULT_INDEX)
+        self.assertEqual(color_model.extract_color_index("red tee", ['blue']), color_model.color_index('blue'))
+
+
+class RecommendationBatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('planner', 'planner@example.com', 'Plan', 'Ner', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        names = ["Blazer", "Jeans", "T-shirt", "Hoodie", "Oxford shoes", "Sneakers", "Dress shirt", "Chinos",
+                 "Parka", "Shorts", "Polo", "Loafers"]
+        for name in names:
+            WardrobeItem.objects.create(user=self.user, name=name, category='Tops', season='Summer')
+
+    def generate(self, contexts, **options):
+        response = self.client.post('/api/recommendations/generate_batch/', {'contexts': contexts, **options},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_one_recommendation_per_context_in_date_order(self):
+        data = self.generate([
+            {'date': '2030-01-03', 'weather': 'snowy', 'occasion': 'formal', 'temperature': 2},
+            {'date': '2030-01-01', 'weather': 'sunny', 'occasion': 'casual'},
+            {'date': '2030-01-02', 'weather': 'rainy', 'occasion': 'professional'},
+        ])
+        self.assertEqual([(row['date'], row['weather']) for row in data],
+                         [('2030-01-01', 'sunny'), ('2030-01-02', 'rainy'), ('2030-01-03', 'snowy')])
+
+        stored = Recommendation.objects.filter(user=self.user).order_by('date')
+        self.assertEqual([recommendation.date for recommendation in stored],
+                         [datetime.date(2030, 1, day) for day in (1, 2, 3)])
+        for row, recommendation in zip(data, stored):
+            self.assertEqual(row['id'], recommendation.id)
+            self.assertEqual(len(row['recommended_items']), 5)
+            self.assertEqual(sorted(item['id'] for item in row['recommended_items']),
+                             sorted(recommendation.recommended_items.values_list('id', flat=True)))
+        self.assertEqual(Recommendation.recommended_items.through.objects.count(), 15)
+
+    def test_avoid_repeats_changes_consecutive_days(self):
+        contexts = [{'date': f'2030-02-0{day}', 'weather': 'sunny', 'occasion': 'casual'} for day in (1, 2, 3)]
+        picks = [{item['id'] for item in row['recommended_items']} for row in self.generate(contexts)]
+        self.assertEqual(picks[0], picks[1])
+
+        picks = [{item['id'] for item in row['recommended_items']}
+                 for row in self.generate(contexts, avoid_repeats=True)]
+        self.assertFalse(picks[0] & picks[1])
+        self.assertFalse(picks[1] & picks[2])
+
+
+class PrecomputeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('early', 'early@example.com', 'Ear', 'Ly', 'pw-12345!')
+        User.objects.create_user('empty', 'empty@example.com', 'Em', 'Pty', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        for name in ("Tee", "Jeans", "Sneakers", "Cap", "Hoodie", "Shorts"):
+            WardrobeItem.objects.create(user=self.user, name=name, category='Tops')
+        self.context = {'weather': settings.RECOMMENDATION_DEFAULT_WEATHER,
+                        'occasion': settings.RECOMMENDATION_DEFAULT_OCCASION}
+
+    def precompute(self):
+        output = io.StringIO()
+        call_command('precompute_recommendations', days=2, workers=1, stdout=output)
+        return output.getvalue()
+
+    def generate(self):
+        response = self.client.post('/api/recommendations/generate/', self.context, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_command_skips_users_whose_wardrobe_is_unchanged(self):
+        self.assertIn("Precomputed 2 recommendations for 1 users (1 of 2 unchanged", self.precompute())
+        rows = Recommendation.objects.filter(user=self.user, is_precomputed=True)
+        self.assertEqual(sorted(row.date for row in rows),
+                         [timezone.localdate() + datetime.timedelta(days=offset) for offset in (0, 1)])
+        self.assertTrue(all(row.recommended_items.count() == 5 for row in rows))
+
+        self.assertIn("Precomputed 0 recommendations for 0 users (2 of 2 unchanged", self.precompute())
+
+    def test_generate_serves_and_consumes_the_precomputed_row(self):
+        self.precompute()
+        today = Recommendation.objects.get(user=self.user, is_precomputed=True, date=timezone.localdate())
+        data = self.generate()
+        self.assertEqual(data['id'], today.id)
+        self.assertEqual(len(data['recommended_items']), 5)
+        today.refresh_from_db()
+        self.assertFalse(today.is_precomputed)
+
+        # Consumed: the next request generates a fresh recommendation
+        self.assertNotEqual(self.generate()['id'], today.id)
+
+    def test_wardrobe_changes_retire_precomputed_rows(self):
+        self.precompute()
+        precomputed = set(Recommendation.objects.filter(user=self.user, is_precomputed=True).values_list('id', flat=True))
+        WardrobeItem.objects.create(user=self.user, name="Blazer", category='Outerwear')
+        self.assertNotIn(self.generate()['id'], precomputed)
+        self.assertEqual(Recommendation.objects.filter(pk__in=precomputed, is_precomputed=True).count(), 2)
+
+
+class StartupBudgetTests(TestCase):
+    """Web workers and management commands must boot without the ML stack (see api/autotagger.py)."""
+
+    HEAVY_MODULES = ('torch', 'transformers')
+    BUDGET_SECONDS = 3.0
+    SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import backend.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps([time.perf_counter() - started, [name for name in %r if name in sys.modules]]))
+"""
+
+    def test_wsgi_import_skips_torch(self):
+        result = subprocess.run([sys.executable, '-c', self.SCRIPT % (self.HEAVY_MODULES,)], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        seconds, heavy = json.loads(result.stdout.splitlines()[-1])
+        self.assertEqual(heavy, [])
+        self.assertLess(seconds, self.BUDGET_SECONDS)
+
+
+class ServerProfileTests(TestCase):
+    """Sizing and recycling rules of the gunicorn profile (backend/server.py)."""
+
+    def test_workers_are_sized_by_cores_and_memory(self):
+        gb = 1024 * server.MB
+        # Plenty of memory: 2 * cores + 1 sync workers
+        self.assertEqual(server.size_workers(4, 64 * gb, 1.5 * gb), (9, 1))
+        # Memory bound: fewer workers, threads make up the concurrency
+        self.assertEqual(server.size_workers(4, 4 * gb, 1.5 * gb), (2, 5))
+        self.assertEqual(server.size_workers(16, 1 * gb, 1.5 * gb), (1, server.MAX_THREADS))
+
+    def test_watchdog_recycles_past_the_ceiling(self):
+        rss = [100 * server.MB]
+        log = mock.Mock()
+        watchdog = server.RSSWatchdog(log, ceiling=200 * server.MB, log_interval=0, rss=lambda: rss[0])
+        with mock.patch('os.kill') as kill:
+            self.assertFalse(watchdog.check())
+            rss[0] = 250 * server.MB
+            self.assertTrue(watchdog.check())
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+        self.assertTrue(watchdog.tripped)
+        self.assertEqual(log.info.call_count, 2)
+        log.warning.assert_called_once()
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pager', 'pager@example.com', 'Page', 'R', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        items = [WardrobeItem.objects.create(user=self.user, name=f"Item {i}") for i in range(7)]
+        outfits = [Outfit.objects.create(user=self.user, name=f"Outfit {i}") for i in range(5)]
+
+        self.assertEqual(self.walk('/api/wardrobe/items/?page_size=3'), [item.id for item in items])
+        self.assertEqual(self.walk('/api/outfits/?page_size=2'), [outfit.id for outfit in reversed(outfits)])
+
+    def test_unpaginated_list_kept_for_legacy_clients(self):
+        WardrobeItem.objects.create(user=self.user, name="Item")
+        response = self.client.get('/api/wardrobe/items/')
+        self.assertIsInstance(response.data, list)
+
+
+class WardrobeSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('finder', 'finder@example.com', 'Fin', 'Der', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        make = lambda name, category, tags, price=None: WardrobeItem.objects.create(
+            user=self.user, name=name, category=category, tags=tags, price=price)
+        self.black_tee = make("Black Tee", 'Tops', {'type': ['t-shirt'], 'color': ['black']}, 15)
+        self.striped = make("Striped Shirt", 'Tops', {'type': ['shirt'], 'color': ['white', 'navy'], 'pattern': ['striped']}, 40)
+        self.jeans = make("Jeans", 'Bottoms', {'type': ['jeans'], 'color': ['black']})
+        self.untagged = make("Scarf", 'Accessory', {})
+        other = User.objects.create_user('other', 'other@example.com', 'Oth', 'Er', 'pw-12345!')
+        WardrobeItem.objects.create(user=other, name="Black Coat", category='Tops', tags={'color': ['black']})
+
+    def search(self, query):
+        response = self.client.get(f'/api/wardrobe/search/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']], response.data.get('facets')
+
+    def test_filters_combine_fields_and_tags(self):
+        self.assertEqual(self.search('color=BLACK')[0], [self.black_tee.id, self.jeans.id])
+        self.assertEqual(self.search('category=Tops&color=black,navy')[0], [self.black_tee.id, self.striped.id])
+        self.assertEqual(self.search('color=black&pattern=striped')[0], [])
+        self.assertEqual(self.search('min_price=20')[0], [self.striped.id])
+        self.assertEqual(self.search('q=shirt')[0], [self.striped.id])
+
+    def test_facets_count_the_filtered_items(self):
+        ids, facets = self.search('category=Tops')
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(facets['category'], {'Tops': 2})
+        self.assertEqual(facets['color'], {'black': 1, 'navy': 1, 'white': 1})
+        self.assertEqual(facets['pattern'], {'striped': 1})
+
+    def test_always_paginated(self):
+        response = self.client.get('/api/wardrobe/search/?page_size=3')
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], [self.untagged.id])
+        self.assertNotIn('facets', response.data)
+
+
+class ShapedResponseTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('shaper', 'shaper@example.com', 'Sha', 'Per', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        self.items = [WardrobeItem.objects.create(user=self.user, name=f"Item {i}") for i in range(3)]
+        for i in range(2):
+            outfit = Outfit.objects.create(user=self.user, name=f"Outfit {i}")
+            OutfitItem.objects.bulk_create(OutfitItem(outfit=outfit, clothing_item=item, layer='tops') for item in self.items)
+
+    def test_relations_stay_nested_by_default(self):
+        row = self.client.get('/api/outfits/').data[0]
+        self.assertEqual(row['items'][0]['clothing_item']['name'], "Item 0")
+
+    def test_expand_and_fields(self):
+        rows = self.client.get('/api/outfits/?expand=&fields=id,items').data
+        self.assertEqual(set(rows[0]), {'id', 'items'})
+        self.assertEqual(rows[0]['items'][0]['clothing_item'], self.items[0].id)
+        rows = self.client.get('/api/outfits/?expand=clothing_item&fields=name').data
+        self.assertEqual(rows[0], {'name': "Outfit 1"})
+
+    def test_sideload_lists_each_item_once(self):
+        data = self.client.get('/api/outfits/?sideload=true').data
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['results'][0]['items'][0]['clothing_item'], self.items[0].id)
+        self.assertEqual(sorted(item['id'] for item in data['wardrobe_items']), [item.id for item in self.items])
+
+
+class FastReadContractTests(APITestCase):
+    """The values() read path must render exactly what the serializers do."""
+
+    def setUp(self):
+        # The item image names are never written; keep derivative builds off the real MEDIA_ROOT
+        use_temp_media(self, API_IMAGE_DERIVATIVES_ON_SAVE=False)
+        self.user = User.objects.create_user('fast', 'fast@example.com', 'Fa', 'St', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        items = [
+            WardrobeItem.objects.create(user=self.user, name="Linen Shirt", category='Tops', season='Summer',
+                                        brand="Uniqlo", material="linen", price=Decimal('12.5'),
+                                        item_image="wardrobe/items/images/linen shirt é.png",
+                                        tags={'color': ['white'], 'note': "naïve ✓"}),
+            WardrobeItem.objects.create(user=self.user, name="Jeans", price=Decimal('100')),
+            WardrobeItem.objects.create(user=self.user, name="Cap", item_image=""),
+        ]
+        soon = timezone.now() + datetime.timedelta(days=2)
+        first = Outfit.objects.create(user=self.user, name="Weekend", occasion='casual', is_favorite=True,
+                                      scheduled_date=soon, tags=['sun'], preview_image="outfits/previews/p 1.png")
+        Outfit.objects.create(user=self.user, name="Empty")
+        OutfitItem.objects.bulk_create([
+            OutfitItem(outfit=first, clothing_item=items[0], layer='tops', position_x=10.25, z_index=2),
+            OutfitItem(outfit=first, clothing_item=items[1], layer='bottoms', rotation=-15, z_index=1),
+            OutfitItem(outfit=first, clothing_item=items[2], layer='accessory', z_index=2),
+        ])
+
+    def render(self, url, fast):
+        with override_settings(API_FAST_READS=fast, API_RESPONSE_CACHE=False):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_responses_are_byte_identical(self):
+        urls = ['/api/wardrobe/items/', '/api/wardrobe/items/all', '/api/wardrobe/items/?page_size=2',
+                '/api/outfits/', '/api/outfits/favorites/', '/api/outfits/scheduled/', '/api/outfits/?page_size=1']
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.render(url, fast=True), self.render(url, fast=False))
+
+    def test_only_default_shape_uses_fast_path(self):
+        with mock.patch.object(fast_read, 'list_response', wraps=fast_read.list_response) as fast:
+            self.render('/api/outfits/', fast=True)
+            self.render('/api/outfits/?fields=id', fast=True)
+            self.render('/api/outfits/', fast=False)
+        self.assertEqual(fast.call_count, 1)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('etag', 'etag@example.com', 'E', 'Tag', 'pw-12345!')
+        self.item = WardrobeItem.objects.create(user=self.user, name="Shirt")
+        self.outfit = Outfit.objects.create(user=self.user, name="Monday")
+        OutfitItem.objects.create(outfit=self.outfit, clothing_item=self.item, layer='tops')
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        with QueryRecorder() as recorder:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, recorder.count
+
+    def test_unchanged_data_is_not_modified_after_one_lookup(self):
+        for url in ('/api/wardrobe/items/', f'/api/wardrobe/items/{self.item.id}/',
+                    '/api/outfits/', f'/api/outfits/{self.outfit.id}/', '/api/outfits/favorites/'):
+            with self.subTest(url=url):
+                etag, response, queries = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(queries, 2)  # JWT user + UserDataVersion
+
+    def test_changes_produce_a_new_etag(self):
+        wardrobe_etag = self.client.get('/api/wardrobe/items/')['ETag']
+        outfits_etag = self.client.get('/api/outfits/')['ETag']
+
+        self.item.name = "Blue Shirt"
+        self.item.save()
+        response = self.client.get('/api/outfits/', HTTP_IF_NONE_MATCH=outfits_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['items'][0]['clothing_item']['name'], "Blue Shirt")
+        self.assertNotEqual(self.client.get('/api/wardrobe/items/')['ETag'], wardrobe_etag)
+
+        outfits_etag = response['ETag']
+        self.client.post(f'/api/outfits/{self.outfit.id}/toggle_favorite/')
+        self.assertEqual(self.client.get('/api/outfits/', HTTP_IF_NONE_MATCH=outfits_etag).status_code, 200)
+
+    def test_etag_depends_on_query_and_user(self):
+        etag = self.client.get('/api/wardrobe/items/')['ETag']
+        self.assertEqual(self.client.get('/api/wardrobe/items/?page_size=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        other = User.objects.create_user('other', 'other@example.com', 'O', 'Ther', 'pw-12345!')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(other).access_token}")
+        self.assertEqual(self.client.get('/api/wardrobe/items/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/outfits/{self.outfit.id}/').status_code, 404)
+
+
+@override_settings(API_SYNC_OVERLAP_SECONDS=0)
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('syncer', 'syncer@example.com', 'Syn', 'Cer', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        self.shirt = WardrobeItem.objects.create(user=self.user, name="Shirt")
+        self.jeans = WardrobeItem.objects.create(user=self.user, name="Jeans")
+        self.outfit = Outfit.objects.create(user=self.user, name="Monday")
+        OutfitItem.objects.create(outfit=self.outfit, clothing_item=self.jeans, layer='bottoms')
+        other = User.objects.create_user('other', 'other@example.com', 'Oth', 'Er', 'pw-12345!')
+        WardrobeItem.objects.create(user=other, name="Coat")
+
+    def sync(self, token=None):
+        response = self.client.get('/api/sync/', {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, rows):
+        return [row['id'] for row in rows]
+
+    def test_full_sync_returns_everything_as_created(self):
+        data = self.sync()
+        self.assertEqual(self.ids(data['wardrobe_items']['created']), [self.shirt.id, self.jeans.id])
+        self.assertEqual(self.ids(data['outfits']['created']), [self.outfit.id])
+        self.assertEqual(data['outfits']['created'][0]['items'][0]['clothing_item']['name'], "Jeans")
+        self.assertEqual(data['wardrobe_items']['deleted'], [])
+
+    def test_delta_has_only_changes_since_token(self):
+        token = self.sync()['token']
+        empty = self.sync(token)
+        self.assertEqual(empty['wardrobe_items'], {'created': [], 'updated': [], 'deleted': []})
+        self.assertEqual(empty['outfits'], {'created': [], 'updated': [], 'deleted': []})
+
+        self.shirt.name = "Blue Shirt"
+        self.shirt.save()
+        hat = WardrobeItem.objects.create(user=self.user, name="Hat")
+        self.client.delete(f'/api/wardrobe/items/{self.jeans.id}/')
+        data = self.sync(token)
+
+        self.assertEqual(self.ids(data['wardrobe_items']['created']), [hat.id])
+        self.assertEqual(self.ids(data['wardrobe_items']['updated']), [self.shirt.id])
+        self.assertEqual(data['wardrobe_items']['deleted'], [self.jeans.id])
+        # The outfit lost the deleted item through the cascade
+        self.assertEqual(self.ids(data['outfits']['updated']), [self.outfit.id])
+        self.assertEqual(data['outfits']['updated'][0]['items'], [])
+
+        outfit_id = self.outfit.id
+        self.outfit.delete()
+        data = self.sync(data['token'])
+        self.assertEqual(data['outfits'], {'created': [], 'updated': [], 'deleted': [outfit_id]})
+
+    def test_tokens_past_the_tombstone_window_get_a_full_resync(self):
+        self.assertFalse(self.sync()['reset'])
+        self.client.delete(f'/api/wardrobe/items/{self.jeans.id}/')
+        DeletedRecord.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=40))
+        old_token = sync.encode_token(timezone.now() - datetime.timedelta(days=35))
+
+        output = io.StringIO()
+        call_command('prune_sync_tombstones', stdout=output)
+        self.assertIn("Removed 1 sync tombstones", output.getvalue())
+        self.assertFalse(DeletedRecord.objects.exists())
+
+        data = self.sync(old_token)
+        self.assertTrue(data['reset'])
+        self.assertEqual(self.ids(data['wardrobe_items']['created']), [self.shirt.id])
+        self.assertFalse(self.sync(data['token'])['reset'])
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/sync/', {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleting_a_user_leaves_no_tombstones(self):
+        self.user.delete()
+        self.assertFalse(DeletedRecord.objects.exists())
+        self.assertFalse(UserDataVersion.objects.filter(user_id=self.user.id).exists())
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        response_cache.get_cache().clear()
+        self.user = User.objects.create_user('cached', 'cached@example.com', 'Ca', 'Ched', 'pw-12345!')
+        self.item = WardrobeItem.objects.create(user=self.user, name="Shirt")
+        self.outfit = Outfit.objects.create(user=self.user, name="Monday",
+                                            scheduled_date=timezone.now() + datetime.timedelta(days=1))
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_repeated_reads_are_served_from_cache(self):
+        for url in ('/api/outfits/', '/api/outfits/scheduled/', '/api/wardrobe/items/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with QueryRecorder() as recorder:
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(recorder.count, 2)  # JWT user + UserDataVersion
+        stats = response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['recomputes']), (3, 3, 3))
+
+    def test_writes_invalidate_entries(self):
+        self.client.get('/api/outfits/')
+        OutfitItem.objects.create(outfit=self.outfit, clothing_item=self.item, layer='tops')
+        response = self.client.get('/api/outfits/')
+        self.assertEqual(response.data[0]['items'][0]['clothing_item']['name'], "Shirt")
+
+        self.item.name = "Blue Shirt"
+        self.item.save()
+        response = self.client.get('/api/outfits/')
+        self.assertEqual(response.data[0]['items'][0]['clothing_item']['name'], "Blue Shirt")
+
+    def test_concurrent_recompute_computes_without_waiting(self):
+        cache = response_cache.get_cache()
+        cache.add('key:lock', 1)
+        with mock.patch.object(response_cache.CachedResponseMixin, 'get_cache_key', return_value='key'), \
+                mock.patch.object(response_cache.time, 'sleep') as sleep:
+            response = self.client.get('/api/outfits/')
+        sleep.assert_not_called()
+        self.assertEqual(response.data[0]['id'], self.outfit.id)
+        # The lock holder stores the entry; this request leaves it alone
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get('key:lock'), 1)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('claims', 'claims@example.com', 'Cla', 'Ims', 'pw-12345!')
+
+    def use_token(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def get_me(self):
+        with QueryRecorder() as recorder:
+            response = self.client.get('/api/auth/me/')
+        return response, recorder.count
+
+    def test_repeat_requests_skip_the_user_query(self):
+        response = self.client.post('/api/auth/login/', {'email': 'claims@example.com', 'password': 'pw-12345!'})
+        self.use_token(response.data['access'])
+        self.assertEqual(self.get_me()[1], 1)
+        response, queries = self.get_me()
+        self.assertEqual(response.data['username'], 'claims')
+        self.assertEqual(queries, 0)
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        for revoke in (lambda user: user.set_password('new-pw-6789!'), lambda user: setattr(user, 'is_active', False)):
+            with self.subTest(revoke=revoke):
+                self.user.refresh_from_db()
+                self.user.is_active = True
+                self.user.save()
+                self.use_token(UserRefreshToken.for_user(self.user).access_token)
+                self.assertEqual(self.get_me()[0].status_code, 200)
+                revoke(self.user)
+                self.user.save()
+                self.assertEqual(self.get_me()[0].status_code, 401)
+
+    def test_other_workers_revoke_within_the_ttl(self):
+        # Another worker changed the password; this one still caches the old user
+        old_token = UserRefreshToken.for_user(self.user).access_token
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.set_password('new-pw-6789!')
+        self.user.save()
+        user_cache.set(self.user.pk, stale)
+
+        # New tokens do not match the stale entry, so the user is reloaded
+        self.use_token(UserRefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.get_me()[0].status_code, 200)
+
+        user_cache.set(self.user.pk, stale)
+        self.use_token(old_token)
+        self.assertEqual(self.get_me()[0].status_code, 200)
+        later = time.monotonic() + user_cache.ttl + 1
+        with mock.patch('api.authentication.time.monotonic', return_value=later):
+            self.assertEqual(self.get_me()[0].status_code, 401)
+
+    def test_requests_get_their_own_user_object(self):
+        self.use_token(UserRefreshToken.for_user(self.user).access_token)
+        authenticate = lambda: self.client.get('/api/auth/me/').wsgi_request.user
+        first = authenticate()
+        first.cached_wardrobe = ["leaked"]
+        first.first_name = "Changed"
+        second = authenticate()
+        self.assertIsNot(second, first)
+        self.assertIsNot(second, user_cache.get(self.user.pk))
+        self.assertFalse(hasattr(second, 'cached_wardrobe'))
+        self.assertEqual(second.first_name, "Cla")
+
+    def test_tokens_without_claims_still_load_the_user(self):
+        self.use_token(RefreshToken.for_user(self.user).access_token)
+        self.get_me()
+        response, queries = self.get_me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 1)
+
+
+class AsyncViewTests(APITestCase):
+    # MIDDLEWARE as backend/asgi.py serves it
+    ASGI_MIDDLEWARE = [name for name in settings.MIDDLEWARE if name != 'whitenoise.middleware.WhiteNoiseMiddleware']
+
+    def setUp(self):
+        self.user = User.objects.create_user('async', 'async@example.com', 'As', 'Ync', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+
+    def test_cpu_bound_endpoints_are_async(self):
+        for path in ('/api/wardrobe/autotag-preview/', '/api/recommendations/generate/',
+                     '/api/recommendations/generate_batch/'):
+            self.assertTrue(resolve(path).func.view_class.view_is_async, path)
+
+    def test_autotag_preview_runs_on_the_executor_and_sheds_load(self):
+        with mock.patch('api.views.run_autotagger', return_value=({'type': ['jeans']}, "blue jeans")) as tagger:
+            response = self.client.post('/api/wardrobe/autotag-preview/', {'image': image_upload()},
+                                        format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['suggested_category'], 'Bottoms')
+        self.assertTrue(tagger.called)
+
+        busy = async_views.BoundedExecutor('busy', workers=1, queue=0)
+        busy.slots.acquire()
+        with mock.patch('api.views.executor', return_value=busy):
+            response = self.client.post('/api/wardrobe/autotag-preview/', {'image': image_upload()},
+                                        format='multipart')
+        self.assertEqual(response.status_code, 503)
+
+    def test_generate_views_score_like_the_engine(self):
+        # Serving precomputed rows is covered by PrecomputeTests
+        for name in ("Blazer", "Jeans", "T-shirt", "Sneakers", "Hoodie", "Shorts", "Oxford shoes"):
+            WardrobeItem.objects.create(user=self.user, name=name, category='Tops', season='Summer')
+        context = {'weather': 'sunny', 'occasion': 'professional', 'temperature': 28}
+        expected_items, expected_score, expected_explanation = RecommendationEngine.generate_recommendation(
+            self.user, **context)
+
+        data = self.client.post('/api/recommendations/generate/', context, format='json').data
+        recommendation = Recommendation.objects.get(pk=data['id'])
+        self.assertFalse(recommendation.is_precomputed)
+        self.assertEqual(sorted(recommendation.recommended_items.values_list('id', flat=True)),
+                         sorted(item.id for item in expected_items))
+        self.assertEqual((data['compatibility_score'], data['explanation']), (expected_score, expected_explanation))
+
+        records = RecommendationEngine.load_records(self.user)
+        contexts = [{'date': '2030-03-01', **context}, {'date': '2030-03-02', 'weather': 'snowy', 'occasion': 'casual'}]
+        expected = core.recommend_batch(records, contexts, avoid_repeats=True)
+        data = self.client.post('/api/recommendations/generate_batch/', {'contexts': contexts, 'avoid_repeats': True},
+                                format='json').data
+        self.assertEqual([sorted(item['id'] for item in row['recommended_items']) for row in data],
+                         [sorted(records[index].id for index in indexes) for indexes, _, _ in expected])
+        self.assertEqual([row['explanation'] for row in data], [explanation for _, _, explanation in expected])
+
+    def test_asgi_middleware_chain_stays_on_the_event_loop(self):
+        # Django adapts, and logs, every sync-only middleware in an async chain
+        with override_settings(MIDDLEWARE=self.ASGI_MIDDLEWARE, DEBUG=True), \
+                self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    @override_settings(MIDDLEWARE=ASGI_MIDDLEWARE, QUERY_INSTRUMENTATION=True)
+    async def test_queries_are_counted_under_asgi(self):
+        token = await sync_to_async(lambda: str(UserRefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.post('/api/recommendations/generate/', {'weather': 'sunny', 'occasion': 'casual'},
+                                                content_type='application/json', headers={'Authorization': f"Bearer {token}"})
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    async def test_executor_bounds_jobs_in_flight(self):
+        pool = async_views.BoundedExecutor('bounded', workers=1, queue=1)
+        release = threading.Event()
+        running = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with self.assertRaises(async_views.ExecutorBusy):
+            await pool.run(lambda: None)
+        release.set()
+        self.assertEqual(await asyncio.gather(*running), [True, True])
+        self.assertIsNone(await pool.run(lambda: None))
+
+
+def image_upload(name="photo.png", size=(800, 600), fmt='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f"image/{fmt.lower()}")
+
+
+# Content-addressed media (api/storage.py) on top of the local filesystem
+CONTENT_ADDRESSED_STORAGES = {
+    'default': {'BACKEND': 'api.storage.ContentAddressedStorage',
+                'OPTIONS': {'backend': 'django.core.files.storage.FileSystemStorage'}},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def use_temp_media(test, **overrides):
+    """
+    Point MEDIA_ROOT at a throwaway directory for one test, with extra setting
+    overrides. Background preview renders are off unless overridden: they would
+    run outside the test's transaction.
+    """
+    overrides.setdefault('API_OUTFIT_PREVIEW_RENDERING', 'off')
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    settings_override = override_settings(MEDIA_ROOT=media_root, **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], API_IMAGE_DERIVATIVE_WIDTHS=[160, 320, 1000],
+                       AUTOTAG_UPLOADS=False)
+        self.user = User.objects.create_user('pixels', 'pixels@example.com', 'Pix', 'Els', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+
+    def stored(self, name):
+        return WardrobeItem._meta.get_field('item_image').storage.exists(name)
+
+    def test_upload_builds_smaller_webp_copies(self):
+        response = self.client.post('/api/wardrobe/items/', {'name': "Red", 'item_image': image_upload()},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 201)
+        item = WardrobeItem.objects.get(pk=response.data['id'])
+        names = item.image_variants['formats']['webp']
+        self.assertEqual(sorted(names, key=int), ['160', '320'])
+        with Image.open(item.item_image.storage.open(names['320'])) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 240)))
+
+        srcset = self.client.get('/api/wardrobe/items/').data[0]['item_image_srcset']['webp']
+        self.assertRegex(srcset, r'^http://testserver/media/\S+\.webp 160w, http://testserver/media/\S+\.webp 320w$')
+
+    def test_replacing_or_deleting_the_image_removes_old_copies(self):
+        item = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload())
+        old = list(item.image_variants['formats']['webp'].values())
+        item.item_image = image_upload("other.png", size=(200, 100))
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertFalse(any(self.stored(name) for name in old))
+        self.assertEqual(sorted(item.image_variants['formats']['webp']), ['160'])
+
+        new = list(item.image_variants['formats']['webp'].values())
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertFalse(any(self.stored(name) for name in new))
+
+    @override_settings(API_IMAGE_DERIVATIVES_ON_SAVE=False)
+    def test_backfill_command(self):
+        item = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload())
+        broken = WardrobeItem.objects.create(user=self.user, name="Broken",
+                                             item_image="wardrobe/items/images/missing.png")
+        self.assertEqual(item.image_variants, {})
+        call_command('generate_image_derivatives', workers=1, stdout=io.StringIO())
+        item.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(sorted(item.image_variants['formats']['webp'], key=int), ['160', '320'])
+        self.assertEqual(broken.image_variants, {'source': broken.item_image.name, 'formats': {}})
+
+
+class UploadTaggingTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], AUTOTAG_UPLOADS=True)
+        self.user = User.objects.create_user('tagger', 'tagger@example.com', 'Tag', 'Ger', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        tagger = mock.patch('api.views.run_autotagger', return_value=({'type': ['sweater']}, "a red sweater"))
+        self.tagger = tagger.start()
+        self.addCleanup(tagger.stop)
+
+    def test_upload_is_decoded_once_and_never_read_back(self):
+        with mock.patch.object(FileSystemStorage, 'open', side_effect=AssertionError("read back from storage")), \
+                mock.patch.object(FieldFile, 'path', new_callable=mock.PropertyMock, side_effect=AssertionError("local path used")), \
+                mock.patch('api.images.decode', wraps=images.decode) as decode, \
+                mock.patch('api.views.executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/wardrobe/items/', {'name': "Red", 'item_image': image_upload()},
+                                            format='multipart')
+            # Tagging waits for the executor, not the request
+            self.assertEqual(response.status_code, 201)
+            self.tagger.assert_not_called()
+            task, pk, source = executor.return_value.submit.call_args.args
+            self.assertIs(task, autotag_in_background)
+            autotag_saved_item(pk, source)
+        self.assertEqual(decode.call_count, 1)
+        tagged_image = self.tagger.call_args.args[0]
+        self.assertIsInstance(tagged_image, Image.Image)
+        item = WardrobeItem.objects.get(pk=response.data['id'])
+        self.assertEqual(item.tags, {'type': ['sweater']})
+        self.assertTrue(item.image_variants['formats']['webp'])
+
+    def test_stored_images_are_streamed_from_storage(self):
+        with override_settings(AUTOTAG_UPLOADS=False):
+            item = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload())
+        item = WardrobeItem.objects.get(pk=item.pk)
+        with mock.patch.object(FieldFile, 'path', new_callable=mock.PropertyMock, side_effect=AssertionError("local path used")):
+            autotag_wardrobe_item(item)
+        self.assertEqual(self.tagger.call_args.args[0].size, (800, 600))
+        self.assertEqual(WardrobeItem.objects.get(pk=item.pk).tags, {'type': ['sweater']})
+
+    def test_replaced_images_are_not_tagged_from_the_old_upload(self):
+        with override_settings(AUTOTAG_UPLOADS=False):
+            item = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload())
+        source = images.image_source(item.item_image)
+        WardrobeItem.objects.filter(pk=item.pk).update(item_image='wardrobe_items/other.png')
+        autotag_saved_item(item.pk, source)
+        self.tagger.assert_not_called()
+
+
+@override_settings(API_UPLOAD_MAX_PIXELS=1_000_000, API_UPLOAD_FORMATS=['PNG', 'JPEG'])
+class UploadGuardTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], AUTOTAG_UPLOADS=False)
+        self.user = User.objects.create_user('guard', 'guard@example.com', 'Gu', 'Ard', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        # Nothing may decode pixel data of a rejected upload
+        decode = mock.patch.object(ImageFile.ImageFile, 'load', side_effect=AssertionError("image decoded"))
+        self.decode = decode.start()
+        self.addCleanup(decode.stop)
+
+    def test_item_images_over_the_limits_are_rejected_from_the_header(self):
+        too_many_pixels = image_upload(size=(2000, 1000))
+        response = self.client.post('/api/wardrobe/items/', {'name': "Big", 'item_image': too_many_pixels},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['item_image'][0].code, 'too_many_pixels')
+
+        gif = image_upload("anim.gif", size=(10, 10), fmt='GIF')
+        response = self.client.post('/api/wardrobe/items/', {'name': "Gif", 'item_image': gif}, format='multipart')
+        self.assertEqual(response.data['item_image'][0].code, 'invalid_format')
+
+        with override_settings(API_UPLOAD_MAX_BYTES=100):
+            response = self.client.post('/api/wardrobe/items/', {'name': "Heavy", 'item_image': image_upload()},
+                                        format='multipart')
+        self.assertEqual(response.data['item_image'][0].code, 'file_too_large')
+        self.assertFalse(WardrobeItem.objects.exists())
+
+    def test_previews_and_autotag_preview_are_guarded(self):
+        outfit = Outfit.objects.create(user=self.user, name="Look")
+        response = self.client.post(f'/api/outfits/{outfit.pk}/upload_preview/',
+                                    {'preview_image': image_upload(size=(1200, 1200))}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        outfit.refresh_from_db()
+        self.assertFalse(outfit.preview_image)
+
+        with mock.patch('api.views.run_autotagger') as tagger:
+            response = self.client.post('/api/wardrobe/autotag-preview/',
+                                        {'image': SimpleUploadedFile("x.png", b"not an image")}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        tagger.assert_not_called()
+        self.decode.assert_not_called()
+
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], API_IMAGE_DERIVATIVE_WIDTHS=[160],
+                       AUTOTAG_UPLOADS=False, STORAGES=CONTENT_ADDRESSED_STORAGES)
+        self.user = User.objects.create_user('blobs', 'blobs@example.com', 'Blo', 'Bs', 'pw-12345!')
+        self.media = WardrobeItem._meta.get_field('item_image').storage
+
+    def test_identical_uploads_share_one_file_until_the_last_reference_goes(self):
+        first = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload("a.png"))
+        second = WardrobeItem.objects.create(user=self.user, name="Same", item_image=image_upload("b.png"))
+        outfit = Outfit.objects.create(user=self.user, name="Look", preview_image=image_upload("c.png"))
+        name = first.item_image.name
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertEqual({second.item_image.name, outfit.preview_image.name}, {name})
+        self.assertEqual(self.media.references(name), 3)
+        self.assertEqual(StoredBlob.objects.count(), 2)  # the original and its one derivative
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            outfit.delete()
+        self.assertTrue(self.media.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(self.media.exists(name))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_dedupe_media_moves_legacy_files_into_blobs(self):
+        backend = self.media.backend
+        content = image_upload().read()
+        for legacy in ('wardrobe/items/images/one.png', 'wardrobe/items/images/two.png'):
+            backend.save(legacy, io.BytesIO(content))
+            WardrobeItem.objects.filter(pk=WardrobeItem.objects.create(user=self.user, name="Old").pk).update(
+                item_image=legacy)
+
+        output = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media', stdout=output)
+        names = set(WardrobeItem.objects.values_list('item_image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertFalse(backend.exists('wardrobe/items/images/one.png'))
+        self.assertIn(f"saved_bytes={len(content)}", output.getvalue())
+        self.assertEqual(self.media.references(names.pop()), 2)
+
+
+class PortabilityTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], API_IMAGE_DERIVATIVE_WIDTHS=[160],
+                       AUTOTAG_UPLOADS=False, STORAGES=CONTENT_ADDRESSED_STORAGES)
+        self.user = User.objects.create_user('mover', 'mover@example.com', 'Mo', 'Ver', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+
+    def export(self):
+        response = self.client.get('/api/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return b''.join(response.streaming_content)
+
+    def test_export_round_trips_into_another_account(self):
+        photo = WardrobeItem.objects.create(user=self.user, name="Tee", category='Tops', price=Decimal('12.50'),
+                                            tags={'color': ['red']}, item_image=image_upload())
+        jeans = WardrobeItem.objects.create(user=self.user, name="Jeans", category='Bottoms')
+        outfit = Outfit.objects.create(user=self.user, name="Look", is_favorite=True)
+        OutfitItem.objects.create(outfit=outfit, clothing_item=photo, layer='tops', position_x=20, rotation=15)
+        OutfitItem.objects.create(outfit=outfit, clothing_item=jeans, layer='bottoms', z_index=1)
+        recommendation = Recommendation.objects.create(user=self.user, weather='sunny', occasion='casual',
+                                                       explanation="Bright day")
+        recommendation.recommended_items.set([photo, jeans])
+        Recommendation.objects.create(user=self.user, weather='rainy', occasion='casual', is_precomputed=True)
+        body = self.export()
+        self.assertEqual([json.loads(row)['type'] for row in body.splitlines()],
+                         ['export', 'wardrobe_item', 'wardrobe_item', 'outfit', 'recommendation'])
+
+        other = User.objects.create_user('arrival', 'arrival@example.com', 'Ar', 'Rival', 'pw-12345!')
+        self.client.force_authenticate(other)
+        response = self.client.post('/api/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data, {'wardrobe_items': 2, 'outfits': 1, 'outfit_items': 2, 'recommendations': 1})
+
+        # Knowing a blob's name does not give another account the photo
+        tee = WardrobeItem.objects.get(user=other, name="Tee")
+        self.assertEqual((tee.price, tee.tags, tee.item_image.name), (Decimal('12.50'), {'color': ['red']}, ''))
+        self.assertEqual(self.media_refs(photo.item_image.name), 1)
+        copied = Outfit.objects.get(user=other)
+        self.assertTrue(copied.is_favorite)
+        self.assertEqual(list(copied.items.values_list('clothing_item__name', 'position_x', 'rotation')),
+                         [("Tee", 20, 15), ("Jeans", 0, 0)])
+        self.assertEqual(set(Recommendation.objects.get(user=other).recommended_items.values_list('name', flat=True)),
+                         {"Tee", "Jeans"})
+        self.assertEqual(UserDataVersion.objects.get(user=other).wardrobe, 1)
+
+    def media_refs(self, name):
+        return WardrobeItem._meta.get_field('item_image').storage.references(name)
+
+    def test_restoring_into_the_same_account_keeps_photos(self):
+        photo = WardrobeItem.objects.create(user=self.user, name="Tee", item_image=image_upload())
+        body = self.export()
+        response = self.client.post('/api/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201, response.data)
+        restored = WardrobeItem.objects.exclude(pk=photo.pk).get(user=self.user)
+        self.assertEqual(restored.item_image.name, photo.item_image.name)
+        self.assertEqual(self.media_refs(photo.item_image.name), 2)
+
+    def test_bad_line_imports_nothing(self):
+        body = b'\n'.join([
+            portability.line({'type': 'wardrobe_item', 'id': 1, 'name': "Tee", 'category': 'Tops'}),
+            portability.line({'type': 'wardrobe_item', 'id': 2, 'name': "Hat", 'category': 'Hats'}),
+        ])
+        response = self.client.post('/api/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], 3)
+        self.assertIn('category', response.data['detail'])
+        response = self.client.post('/api/import/', portability.line(
+            {'type': 'outfit', 'name': "Look", 'items': [{'clothing_item': 9, 'layer': 'tops'}]}),
+            content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WardrobeItem.objects.filter(user=self.user).exists())
+
+    def test_export_memory_stays_flat_at_100k_items(self):
+        def peak_while_exporting(user):
+            tracemalloc.start()
+            try:
+                lines = sum(1 for _ in portability.export_lines(user))
+                return lines, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        peaks = {}
+        for size in (10_000, 100_000):
+            user = User.objects.create_user(f'bulk{size}', f'bulk{size}@example.com', 'Bu', 'Lk', 'pw-12345!')
+            WardrobeItem.objects.bulk_create(
+                (WardrobeItem(user=user, name=f"Item {i}", category='Tops', tags={'color': ['black']})
+                 for i in range(size)), batch_size=5_000)
+            lines, peaks[size] = peak_while_exporting(user)
+            self.assertEqual(lines, size + 1)
+        # 10x the rows, the same peak: one chunk in memory at a time
+        self.assertLess(peaks[100_000], peaks[10_000] * 1.25)
+
+
+class InsightsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stylist', 'stylist@example.com', 'Sty', 'List', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        make = lambda name, category, tags: WardrobeItem.objects.create(user=self.user, name=name, category=category,
+                                                                        season='Summer', tags=tags)
+        self.tee = make("Tee", 'Tops', {'color': ['black'], 'pattern': ['plain']})
+        self.shirt = make("Shirt", 'Tops', {'color': ['white', 'navy'], 'pattern': 'striped'})
+        self.jeans = make("Jeans", 'Bottoms', {'color': ['black']})
+
+    def insights(self):
+        response = self.client.get('/api/insights/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertMatchesRebuild(self):
+        _, drifted = insights.rebuild(self.user)
+        self.assertFalse(drifted)
+
+    def test_totals_follow_every_write(self):
+        data = self.insights()
+        self.assertEqual((data['items'], data['outfits']), (3, 0))
+        self.assertEqual(data['category_counts'], {'Tops': 2, 'Bottoms': 1})
+        self.assertEqual(data['color_counts'], {'black': 2, 'navy': 1, 'white': 1})
+        self.assertEqual(data['pattern_counts'], {'plain': 1, 'striped': 1})
+
+        payload = {'name': "Look", 'items': [layout_item(self.tee.id), layout_item(self.jeans.id, layer='bottoms')]}
+        outfit_id = self.client.post('/api/outfits/', payload, format='json').data['id']
+        self.client.post('/api/outfits/', {'name': "Plain", 'items': [layout_item(self.tee.id)]}, format='json')
+        data = self.insights()
+        self.assertEqual(data['outfits'], 2)
+        self.assertEqual(data['favorite_colors'], ['black'])
+        self.assertEqual([(row['name'], row['outfits']) for row in data['most_worn']], [("Tee", 2), ("Jeans", 1)])
+        self.assertMatchesRebuild()
+
+        payload['items'] = [layout_item(self.shirt.id), layout_item(self.jeans.id, layer='bottoms')]
+        self.client.put(f'/api/outfits/{outfit_id}/', payload, format='json')
+        self.client.patch(f'/api/wardrobe/items/{self.jeans.id}/', {'tags': {'color': ['blue']}, 'category': 'Bottoms'},
+                          format='json')
+        data = self.insights()
+        self.assertEqual(data['favorite_colors'], ['black', 'blue', 'navy', 'white'])
+        self.assertEqual(data['color_counts'], {'black': 1, 'blue': 1, 'navy': 1, 'white': 1})
+        self.assertMatchesRebuild()
+
+        self.client.delete(f'/api/wardrobe/items/{self.tee.id}/')
+        self.client.delete(f'/api/outfits/{outfit_id}/')
+        data = self.insights()
+        self.assertEqual((data['items'], data['outfits'], data['most_worn']), (2, 1, []))
+        self.assertEqual(data['favorite_colors'], [])
+        self.assertMatchesRebuild()
+
+    def test_other_users_items_in_outfits_are_not_counted(self):
+        self.client.post('/api/outfits/', {'name': "Mine", 'items': [layout_item(self.tee.id)]}, format='json')
+        before = self.insights()
+        borrower = User.objects.create_user('borrower', 'borrower@example.com', 'Bor', 'Rower', 'pw-12345!')
+        self.client.force_authenticate(borrower)
+        self.insights()
+        outfit_id = self.client.post('/api/outfits/', {'name': "Borrowed", 'items': [layout_item(self.tee.id)]},
+                                     format='json').data['id']
+        data = self.insights()
+        self.assertEqual((data['outfits'], data['most_worn'], data['favorite_colors']), (1, [], []))
+        self.client.delete(f'/api/outfits/{outfit_id}/')
+
+        insights.invalidate(borrower.pk)
+        self.client.post('/api/outfits/', {'name': "Borrowed", 'items': [layout_item(self.tee.id)]}, format='json')
+        self.assertEqual(self.insights()['most_worn'], [])
+
+        self.client.force_authenticate(self.user)
+        after = self.insights()
+        self.assertEqual((after['most_worn'], after['favorite_colors']), (before['most_worn'], before['favorite_colors']))
+        output = io.StringIO()
+        call_command('reconcile_insights', '--all', stdout=output)
+        self.assertIn("0 had drifted", output.getvalue())
+
+    def test_users_without_insights_skip_the_deltas(self):
+        with mock.patch.object(insights, 'apply') as apply, mock.patch.object(insights, 'contribution') as contribution:
+            self.client.get('/api/wardrobe/items/')
+            contribution.assert_not_called()
+            outfit_id = self.client.post('/api/outfits/', {'name': "Look", 'items': [layout_item(self.tee.id)]},
+                                         format='json').data['id']
+            self.client.patch(f'/api/wardrobe/items/{self.shirt.id}/', {'category': 'Outer Layer'}, format='json')
+            self.client.delete(f'/api/outfits/{outfit_id}/')
+            self.client.delete(f'/api/wardrobe/items/{self.jeans.id}/')
+        apply.assert_not_called()
+        self.assertFalse(ItemWear.objects.exists())
+        self.assertEqual(self.insights()['category_counts'], {'Tops': 1, 'Outer Layer': 1})
+
+    def test_read_cost_does_not_grow_with_the_wardrobe(self):
+        self.insights()
+        counts = []
+        for extra in (0, 300):
+            WardrobeItem.objects.bulk_create(WardrobeItem(user=self.user, name=f"Item {i}", category='Tops')
+                                             for i in range(extra))
+            insights.rebuild(self.user)
+            with QueryRecorder() as recorder:
+                self.assertEqual(self.insights()['items'], 3 + extra)
+            counts.append(recorder.count)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_reconcile_reports_drift_from_raw_updates(self):
+        self.insights()
+        WardrobeItem.objects.filter(pk=self.jeans.pk).update(category='Tops')
+        output = io.StringIO()
+        call_command('reconcile_insights', stdout=output)
+        self.assertIn("1 had drifted", output.getvalue())
+        self.assertEqual(self.insights()['category_counts'], {'Tops': 3})
+
+
+def layout_item(clothing_item_id, **overrides):
+    item = {'clothing_item_id': clothing_item_id, 'layer': 'tops', 'position_x': 0, 'position_y': 0,
+            'size_width': 150, 'size_height': 150, 'rotation': 0, 'z_index': 0}
+    item.update(overrides)
+    return item
+
+
+class OutfitItemWriteTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('canvas', 'canvas@example.com', 'Can', 'Vas', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        self.items = [WardrobeItem.objects.create(user=self.user, name=f"Item {i}") for i in range(4)]
+        response = self.client.post('/api/outfits/', {
+            'name': "Canvas", 'items': [layout_item(item.id, z_index=i) for i, item in enumerate(self.items[:3])],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.outfit = Outfit.objects.get(pk=response.data['id'])
+
+    def test_update_keeps_unchanged_rows_and_diffs_the_rest(self):
+        before = {item.clothing_item_id: item.pk for item in self.outfit.items.all()}
+        items = [
+            layout_item(self.items[0].id, z_index=0),
+            layout_item(self.items[1].id, z_index=1, position_x=80),
+            layout_item(self.items[3].id, z_index=2),
+        ]
+        response = self.client.put(f'/api/outfits/{self.outfit.id}/', {'name': "Canvas", 'items': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        after = {item.clothing_item_id: item for item in self.outfit.items.all()}
+        self.assertEqual(set(after), {self.items[0].id, self.items[1].id, self.items[3].id})
+        self.assertEqual(after[self.items[0].id].pk, before[self.items[0].id])
+        self.assertEqual(after[self.items[1].id].pk, before[self.items[1].id])
+        self.assertEqual(after[self.items[1].id].position_x, 80)
+
+    def test_layout_patch_writes_only_sent_fields(self):
+        item = self.outfit.items.get(clothing_item=self.items[1])
+        response = self.client.patch(f'/api/outfits/{self.outfit.id}/layout/',
+                                     {'items': [{'id': item.id, 'position_y': 42, 'z_index': 9}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual((item.position_y, item.z_index, item.size_width), (42, 9, 150))
+
+    def test_layout_patch_rejects_items_from_other_outfits(self):
+        other = Outfit.objects.create(user=self.user, name="Other")
+        stranger = OutfitItem.objects.create(outfit=other, clothing_item=self.items[0], layer='tops')
+        response = self.client.patch(f'/api/outfits/{self.outfit.id}/layout/',
+                                     {'items': [{'id': stranger.id, 'rotation': 90}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class OutfitPreviewTests(APITestCase):
+    def setUp(self):
+        use_temp_media(self, API_IMAGE_DERIVATIVE_FORMATS=['webp'], API_IMAGE_DERIVATIVE_WIDTHS=[160],
+                       AUTOTAG_UPLOADS=False, API_OUTFIT_PREVIEW_RENDERING='inline', API_OUTFIT_PREVIEW_CANVAS=[200, 200],
+                       STORAGES=CONTENT_ADDRESSED_STORAGES)
+        self.user = User.objects.create_user('canvas', 'canvas@example.com', 'Can', 'Vas', 'pw-12345!')
+        self.client.force_authenticate(self.user)
+        self.item = WardrobeItem.objects.create(user=self.user, name="Red", item_image=image_upload(size=(400, 400)))
+
+    def preview(self, outfit_id):
+        outfit = Outfit.objects.get(pk=outfit_id)
+        with outfit.preview_image.open('rb') as stored, Image.open(stored) as image:
+            return outfit, image.convert('RGB')
+
+    def test_preview_follows_the_layout_and_skips_unchanged_layouts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/outfits/', {
+                'name': "Look", 'items': [layout_item(self.item.pk, size_width=100, size_height=100)],
+            }, format='json')
+        outfit, image = self.preview(response.data['id'])
+        self.assertEqual(image.size, (200, 200))
+        self.assertGreater(image.getpixel((50, 50))[0] - image.getpixel((50, 50))[2], 100)
+        self.assertEqual(image.getpixel((150, 150)), (255, 255, 255))
+        first_preview = outfit.preview_image.name
+
+        with mock.patch('api.previews.render', wraps=previews.render) as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/outfits/{outfit.pk}/toggle_favorite/')
+            render.assert_not_called()
+            outfit_item = outfit.items.get()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/outfits/{outfit.pk}/layout/', {
+                    'items': [{'id': outfit_item.pk, 'position_x': 100, 'position_y': 100}],
+                }, format='json')
+            render.assert_called_once()
+        outfit, image = self.preview(outfit.pk)
+        self.assertEqual(image.getpixel((50, 50)), (255, 255, 255))
+        self.assertNotEqual(image.getpixel((150, 150)), (255, 255, 255))
+        self.assertFalse(outfit.preview_image.storage.exists(first_preview))
+
+    def test_replacing_an_item_photo_renders_outfits_showing_it(self):
+        outfit = Outfit.objects.create(user=self.user, name="Look")
+        OutfitItem.objects.create(outfit=outfit, **layout_item(self.item.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            outfit.save()
+        digest = Outfit.objects.get(pk=outfit.pk).preview_layout_hash
+
+        blue = io.BytesIO()
+        Image.new('RGB', (300, 300), (20, 40, 220)).save(blue, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/wardrobe/items/{self.item.pk}/',
+                              {'item_image': SimpleUploadedFile("blue.png", blue.getvalue())}, format='multipart')
+        outfit, image = self.preview(outfit.pk)
+        self.assertNotEqual(outfit.preview_layout_hash, digest)
+        red, _, blue_channel = image.getpixel((75, 75))
+        self.assertGreater(blue_channel - red, 100)
+
+
+    def test_emptied_outfits_lose_their_preview(self):
+        outfit = Outfit.objects.create(user=self.user, name="Look")
+        OutfitItem.objects.create(outfit=outfit, **layout_item(self.item.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            outfit.save()
+        outfit.refresh_from_db()
+        self.assertTrue(outfit.preview_image)
+        self.assertTrue(outfit.preview_variants)
+        first_preview = outfit.preview_image.name
+
+        with mock.patch('api.previews.render') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/outfits/{outfit.pk}/', {'items': []}, format='json')
+            render.assert_not_called()
+        outfit.refresh_from_db()
+        self.assertFalse(outfit.preview_image)
+        self.assertEqual(outfit.preview_variants, {})
+        self.assertFalse(outfit.preview_image.storage.exists(first_preview))
+
+    def test_storing_a_preview_schedules_no_further_refresh(self):
+        outfit = Outfit.objects.create(user=self.user, name="Look")
+        OutfitItem.objects.create(outfit=outfit, **layout_item(self.item.pk))
+        rows = previews.item_layouts([outfit.pk])[outfit.pk]
+        with self.captureOnCommitCallbacks() as callbacks:
+            previews.store(outfit, previews.render(rows), previews.layout_hash(rows))
+        self.assertEqual(callbacks, [])
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every endpoint stays within the `query_budget` its view declares, with a
+    real JWT so the authentication lookup is counted, and repeats no query shape.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('budget', 'budget@example.com', 'Bud', 'Get', 'pw-12345!')
+        self.items = [WardrobeItem.objects.create(user=self.user, name=f"Item {i}", category='Tops') for i in range(6)]
+        for i in range(3):
+            self.outfit = Outfit.objects.create(user=self.user, name=f"Outfit {i}", is_favorite=True,
+                                                scheduled_date=timezone.now())
+            OutfitItem.objects.bulk_create(
+                OutfitItem(outfit=self.outfit, clothing_item=item, layer='tops') for item in self.items[:4]
+            )
+            recommendation = Recommendation.objects.create(user=self.user, weather='sunny', occasion='casual')
+            recommendation.recommended_items.set(self.items[:4])
+        # Writes cost the most once insights are being maintained
+        insights.rebuild(self.user)
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def assertWithinBudget(self, method, url, data=None):
+        budget = get_query_budget(resolve(url.split('?')[0]).func, method)
+        self.assertIsNotNone(budget, f"{method.upper()} {url} declares no query_budget")
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400, response.data)
+        self.assertLessEqual(recorder.count, budget, f"{method.upper()} {url}")
+        self.assertEqual(recorder.repeated_shapes(), {}, f"{method.upper()} {url}")
+
+    def test_wardrobe_endpoints(self):
+        item = self.items[0]
+        self.assertWithinBudget('get', '/api/wardrobe/items/')
+        self.assertWithinBudget('get', '/api/wardrobe/items/all')
+        self.assertWithinBudget('post', '/api/wardrobe/items/', {'name': "New", 'category': 'Tops'})
+        self.assertWithinBudget('get', f'/api/wardrobe/items/{item.id}/')
+        self.assertWithinBudget('patch', f'/api/wardrobe/items/{item.id}/', {'brand': "Acme"})
+        self.assertWithinBudget('get', '/api/wardrobe/search/?category=Tops&color=black')
+        self.assertWithinBudget('get', '/api/sync/')
+        self.assertWithinBudget('get', '/api/insights/')
+        self.assertWithinBudget('delete', f'/api/wardrobe/items/{item.id}/')
+
+    def test_outfit_endpoints(self):
+        outfit = self.outfit
+        self.assertWithinBudget('get', '/api/outfits/')
+        self.assertWithinBudget('get', f'/api/outfits/{outfit.id}/')
+        self.assertWithinBudget('get', '/api/outfits/favorites/')
+        self.assertWithinBudget('get', '/api/outfits/scheduled/')
+        self.assertWithinBudget('post', f'/api/outfits/{outfit.id}/toggle_favorite/')
+        self.assertWithinBudget('post', f'/api/outfits/{outfit.id}/schedule/', {'scheduled_date': '2030-01-01T00:00:00Z'})
+        payload = {'name': "Canvas", 'items': [layout_item(item.id, z_index=i) for i, item in enumerate(self.items)]}
+        self.assertWithinBudget('post', '/api/outfits/', payload)
+        payload['items'][0]['position_x'] = 250
+        self.assertWithinBudget('put', f'/api/outfits/{outfit.id}/', payload)
+        item_id = outfit.items.first().id
+        self.assertWithinBudget('patch', f'/api/outfits/{outfit.id}/layout/', {'items': [{'id': item_id, 'rotation': 15}]})
+        self.assertWithinBudget('delete', f'/api/outfits/{outfit.id}/')
+
+    def test_recommendation_and_auth_endpoints(self):
+        self.assertWithinBudget('get', '/api/recommendations/')
+        self.assertWithinBudget('post', '/api/recommendations/generate/', {'weather': 'sunny', 'occasion': 'casual'})
+        self.assertWithinBudget('post', '/api/recommendations/generate_batch/', {
+            'contexts': [{'date': '2030-01-0%d' % day, 'weather': 'sunny', 'occasion': 'casual'} for day in (1, 2, 3)],
+        })
+        self.assertWithinBudget('get', '/api/auth/me/')
+
+    def test_list_does_not_query_per_row(self):
+        for i in range(10):
+            recommendation = Recommendation.objects.create(user=self.user, weather='rainy', occasion='formal')
+            recommendation.recommended_items.set(self.items)
+        with QueryRecorder() as recorder:
+            self.client.get('/api/recommendations/')
+        self.assertEqual(recorder.repeated_shapes(), {})
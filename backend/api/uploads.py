@@ -0,0 +1,72 @@
+"""
+Header-only checks for uploaded images.
+
+Decoding an image costs memory in proportion to its pixel count rather than
+its file size: a 50 MP PNG, or a few KB of highly compressed "decompression
+bomb", takes hundreds of MB once decoded. check_image() rejects uploads before
+anything decodes them, using only
+
+- the upload's size, which Django already knows, so nothing is read, and
+- the format and dimensions in the image header, read with Image.open(),
+  which parses the header and stops before the pixel data,
+
+against settings.API_UPLOAD_MAX_BYTES, API_UPLOAD_MAX_PIXELS,
+API_UPLOAD_MAX_DIMENSION and API_UPLOAD_FORMATS. Accepted files are left
+where Django's upload handlers put them: in memory up to
+FILE_UPLOAD_MAX_MEMORY_SIZE, in a temporary file beyond that. Storage then
+copies them in chunks.
+
+GuardedImageField applies the check to serializer image fields before DRF's
+own ImageField validation, which reads the whole file.
+"""
+
+import warnings
+
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+
+def check_image(upload):
+    """
+    (format, width, height) of an uploaded image, or a ValidationError saying
+    which limit it breaks. The upload is rewound afterwards.
+    """
+    if upload.size is not None and upload.size > settings.API_UPLOAD_MAX_BYTES:
+        raise serializers.ValidationError(
+            f"Image files may be at most {filesizeformat(settings.API_UPLOAD_MAX_BYTES)}.", code='file_too_large'
+        )
+    try:
+        upload.seek(0)
+        with warnings.catch_warnings():
+            # Pillow warns about large images here; the limits below decide
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(upload) as image:
+                fmt, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise serializers.ValidationError("Upload a valid image.", code='invalid_image')
+    finally:
+        upload.seek(0)
+
+    if fmt not in settings.API_UPLOAD_FORMATS:
+        raise serializers.ValidationError(
+            f"{fmt} images are not accepted; use one of {', '.join(settings.API_UPLOAD_FORMATS)}.",
+            code='invalid_format',
+        )
+    if max(width, height) > settings.API_UPLOAD_MAX_DIMENSION:
+        raise serializers.ValidationError(
+            f"Images may be at most {settings.API_UPLOAD_MAX_DIMENSION} pixels on each side.", code='too_large'
+        )
+    if width * height > settings.API_UPLOAD_MAX_PIXELS:
+        raise serializers.ValidationError(
+            f"Images may have at most {settings.API_UPLOAD_MAX_PIXELS:,} pixels.", code='too_many_pixels'
+        )
+    return fmt, width, height
+
+
+class GuardedImageField(serializers.ImageField):
+    def to_internal_value(self, data):
+        if hasattr(data, 'size') and hasattr(data, 'seek'):
+            check_image(data)
+        return super().to_internal_value(data)
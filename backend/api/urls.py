@@ -11,8 +11,15 @@ from .views import (
     LoginViewset,
     LogoutViewset,
     ViewAllWardrobeItems,
+    WardrobeSearch,
+    Sync,
+    Export,
+    Import,
+    Insights,
     GetCurrentUser,
     RecommendationViewSet,
+    GenerateRecommendation,
+    GenerateRecommendationBatch,
 )
 
 
@@ -24,11 +31,19 @@ router.register('outfits', OutfitViewSet, basename='outfit')
 router.register('recommendations', RecommendationViewSet, basename='recommendation')
 
 urlpatterns = [
+    # Async views (api/async_views.py), ahead of the router's recommendation routes
+    path("recommendations/generate/", GenerateRecommendation.as_view(), name="recommendation-generate"),
+    path("recommendations/generate_batch/", GenerateRecommendationBatch.as_view(), name="recommendation-generate-batch"),
     path("", include(router.urls)),
     path("wardrobe/items/", WardrobeItems.as_view(), name="wardrobe"),
     path("wardrobe/autotag-preview/", AutoTagSuggestion.as_view(), name="wardrobe-autotag-preview"),
     path("wardrobe/items/<int:pk>/", WardrobeItemsUpdateDelete.as_view(), name="delete"),
     path("wardrobe/items/all", ViewAllWardrobeItems.as_view(), name="get_all"),
+    path("wardrobe/search/", WardrobeSearch.as_view(), name="wardrobe-search"),
+    path("sync/", Sync.as_view(), name="sync"),
+    path("export/", Export.as_view(), name="account-export"),
+    path("import/", Import.as_view(), name="account-import"),
+    path("insights/", Insights.as_view(), name="insights"),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path("auth/me/", GetCurrentUser.as_view(), name='current_user'),
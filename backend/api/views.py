@@ -1,15 +1,32 @@
 from django.shortcuts import render
-from rest_framework import generics, viewsets, permissions, status, parsers
+from rest_framework import generics, viewsets, permissions, status, parsers, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 from PIL import Image
 
 from .models import *
 from .serializers import *
+from .pagination import KeysetPagination
+from .authentication import UserRefreshToken
+from .conditional import ConditionalGetMixin
+from .response_cache import CachedResponseMixin
+from .async_views import AsyncAPIView, ExecutorBusy, executor
+from . import search
+from . import sync
+from . import fast_read
+from . import images
+from . import insights
+from . import portability
+from . import previews
+from . import uploads
 from .autotagger import (
     run_autotagger,
     infer_category_from_type_tags,
@@ -18,40 +35,112 @@ from .autotagger import (
 
 User = get_user_model()
 
-class WardrobeItems(generics.ListCreateAPIView):
+
+def sideload_wardrobe_items(request, response, items, context):
+    """
+    With ?sideload=true, add each wardrobe item referenced by the listed
+    objects once under "wardrobe_items" (the rows themselves carry ids only).
+    Plain-list responses become {"results": [...], "wardrobe_items": [...]}.
+    """
+    if not wants_sideload(request.query_params):
+        return response
+    unique = {item.pk: item for item in items}
+    # ?fields= shapes the listed rows, not the side-loaded items
+    context = dict(context, query_params={})
+    wardrobe_items = WardrobeItemSerializer(list(unique.values()), many=True, context=context).data
+    if isinstance(response.data, list):
+        response.data = {'results': response.data}
+    response.data['wardrobe_items'] = wardrobe_items
+    return response
+
+
+def outfit_wardrobe_items(outfits):
+    """Wardrobe items placed in the outfits; uses the items__clothing_item prefetch."""
+    return [outfit_item.clothing_item for outfit in outfits for outfit_item in outfit.items.all()]
+
+def autotag_wardrobe_item(instance):
+    """
+    Tag a wardrobe item's image and infer its category if the user left it blank.
+
+    The image comes from images.image_source(): right after an upload that is
+    the upload's own buffer, decoded once and shared with the derivatives
+    built on save; otherwise it is streamed from storage. No local file path
+    is needed, so this works on Cloudinary too.
+    """
+    # 1) If there is no image, nothing to tag
+    if not instance.item_image or not settings.AUTOTAG_UPLOADS:
+        return
+
+    try:
+        # 2) Run the Florence-2 autotagger on the decoded image
+        tags, caption = run_autotagger(images.image_source(instance.item_image).image)
+    except Exception as e:
+        # Don't break uploads if the model errors out
+        print(f"[Autotagger] Error processing image {instance.pk}: {e}")
+        return
+
+    # 3) Store tags dict into the JSONField
+    #    (fallback to {} in case tags is None)
+    instance.tags = tags or {}
+
+    # 4) Infer category from type tags ONLY if user left category blank
+    if not instance.category:
+        inferred_category = infer_category_from_type_tags(instance.tags, caption)
+        if inferred_category:
+            instance.category = inferred_category
+
+    instance.save(update_fields=['tags', 'category', 'updated_at'])
+
+
+def autotag_saved_item(pk, source):
+    """Tag wardrobe item `pk` from the ImageSource `source`, unless its image was replaced since."""
+    instance = WardrobeItem.objects.filter(pk=pk, item_image=source.name).first()
+    if instance is not None:
+        instance.__dict__['_image_sources'] = {'item_image': source}
+        autotag_wardrobe_item(instance)
+
+
+def autotag_in_background(pk, source):
+    try:
+        autotag_saved_item(pk, source)
+    finally:
+        connections.close_all()
+
+
+def schedule_autotag(instance):
+    """
+    Tag a freshly uploaded image on the autotag executor once the save commits,
+    so the request does not wait for Florence-2. The upload's bytes are copied
+    into its ImageSource unless the derivatives already decoded it, since the
+    upload is closed when the request ends. When the executor is full the
+    item is left untagged.
+    """
+    if not instance.item_image or not settings.AUTOTAG_UPLOADS:
+        return
+    source = images.image_source(instance.item_image)
+    if 'image' not in source.__dict__:
+        source.buffer  # read now, while the upload is still open
+
+    def submit():
+        if not executor('autotag').submit(autotag_in_background, instance.pk, source):
+            print(f"[Autotagger] Busy, not tagging image {instance.pk}")
+
+    transaction.on_commit(submit)
+
+
+class WardrobeItems(CachedResponseMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = WardrobeItem.objects.all()
     serializer_class = WardrobeItemSerializer
+    pagination_class = KeysetPagination
+    # SQL budgets per request, authentication included (see api/instrumentation.py)
+    query_budget = {'get': 3, 'post': 5}
     def perform_create(self, serializer):
         """
-        Save wardrobe item, then auto-tag the image and infer category if missing.
+        Save wardrobe item, then auto-tag the image and infer category if
+        missing, in the background.
         """
-        # 1) Save the instance first
-        instance = serializer.save()
-
-        # 2) If there is no image, nothing to tag
-        if not instance.item_image:
-            return
-
-        try:
-            # 3) Run the Florence-2 autotagger on the saved image file
-            tags, caption = run_autotagger(instance.item_image.path)
-        except Exception as e:
-            # Don't break uploads if the model errors out
-            print(f"[Autotagger] Error processing image {instance.pk}: {e}")
-            return
-
-        # 4) Store tags dict into the JSONField
-        #    (fallback to {} in case tags is None)
-        instance.tags = tags or {}
-
-        # 5) Infer category from type tags ONLY if user left category blank
-        if not instance.category:
-            type_tags = (tags or {}).get("type") or []
-            inferred_category = infer_category_from_type_tags(type_tags)
-            if inferred_category:
-                instance.category = inferred_category
-
-        instance.save()
+        instance = serializer.save(user=self.request.user)
+        schedule_autotag(instance)
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -60,33 +149,197 @@ class WardrobeItems(generics.ListCreateAPIView):
             return WardrobeItem.objects.filter(user = user)
         else:
             return WardrobeItem.objects.none()
-        
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if fast_read.is_enabled(request):
+            return fast_read.wardrobe_items_response(self, self.get_queryset())
+        return super().list(request, *args, **kwargs)
 
 class ViewAllWardrobeItems(generics.ListCreateAPIView):
     queryset = WardrobeItem.objects.all()
     serializer_class = WardrobeItemSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    query_budget = {'get': 2, 'post': 5}
 
     def get_queryset(self):
         return WardrobeItem.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        if fast_read.is_enabled(request):
+            return fast_read.wardrobe_items_response(self, self.get_queryset())
+        return super().list(request, *args, **kwargs)
+
+
+class WardrobeSearchPagination(KeysetPagination):
+    legacy_unpaginated = False
+
+
+class WardrobeSearch(CachedResponseMixin, ConditionalGetMixin, generics.ListAPIView):
+    """
+    Search and filter the current user's wardrobe, with facet counts
+    GET /api/wardrobe/search/?q=shirt&category=Tops,Bottoms&color=black&min_price=10
+
+    Filters: q (name), category, season, brand, material, min_price, max_price,
+    and the autotagger tags type, color, pattern. Results are keyset paginated
+    ({next, results}); the first page also carries "facets", the per-value
+    counts of every filter over the matching items.
+    """
+    serializer_class = WardrobeItemSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = WardrobeSearchPagination
+    query_budget = {'get': 8}
+
+    def get_queryset(self):
+        return search.filter_items(WardrobeItem.objects.filter(user=self.request.user), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            response.data['facets'] = search.facet_counts(queryset)
+        return response
+
 
-class WardrobeItemsUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
+class WardrobeItemsUpdateDelete(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = WardrobeItem.objects.all()
     serializer_class = WardrobeItemSerializer
     lookup_field = "pk"
+    # Writes include the style insights deltas (api/insights.py) of a user who reads them
+    query_budget = {'get': 3, 'put': 5, 'patch': 5, 'delete': 12}
+
+    def get_queryset(self):
+        # Scoped to the owner so the per-user ETag covers everything served here
+        return WardrobeItem.objects.filter(user=self.request.user)
+
+    def perform_update(self, serializer):
+        instance = serializer.save()
+        # A replaced image is tagged again, from the upload just saved
+        if serializer.validated_data.get('item_image'):
+            schedule_autotag(instance)
+
+class Sync(APIView):
+    """
+    Incremental sync of the current user's wardrobe items and outfits
+    GET /api/sync/?since=<token>
+
+    Returns what was created, updated and deleted since the token, and the
+    token to send next time; without ?since= everything comes back as created.
+    A token older than API_SYNC_TOMBSTONE_DAYS gets everything too, with
+    "reset": true, and the client replaces its copy.
+    {
+        "token": "...",
+        "reset": false,
+        "wardrobe_items": {"created": [...], "updated": [...], "deleted": [3, 7]},
+        "outfits": {"created": [...], "updated": [...], "deleted": []}
+    }
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 6}
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        changes = sync.collect_changes(request.user, sync.decode_token(since) if since else None)
+        context = {'request': request}
+        serializer_classes = {'wardrobe_items': WardrobeItemSerializer, 'outfits': OutfitSerializer}
+        data = {'token': changes['token'], 'reset': changes['reset']}
+        for name, serializer_class in serializer_classes.items():
+            data[name] = {
+                'created': serializer_class(changes[name]['created'], many=True, context=context).data,
+                'updated': serializer_class(changes[name]['updated'], many=True, context=context).data,
+                'deleted': changes[name]['deleted'],
+            }
+        return Response(data)
+
+
+class Export(APIView):
+    """
+    The current user's wardrobe, outfits and recommendations as NDJSON
+    GET /api/export/
 
-class AutoTagSuggestion(APIView):
+    Streamed chunk by chunk (api/portability.py); the export's own queries run
+    while the body streams, one or two per chunk, after the view returns.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 1}
+
+    def get(self, request):
+        response = StreamingHttpResponse(portability.export_lines(request.user), content_type='application/x-ndjson')
+        stamp = timezone.now().strftime('%Y%m%d')
+        response['Content-Disposition'] = f'attachment; filename="fitfinder-{request.user.username}-{stamp}.ndjson"'
+        return response
+
+
+class Import(APIView):
+    """
+    Add the records of an export to the current user's account
+    POST /api/import/ with the NDJSON export as the request body
+
+    The body is parsed line by line as it arrives and written in batches in
+    one transaction. Responds with how many records of each kind were created,
+    or 400 naming the first bad line, in which case nothing is imported.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # One batch of each kind: items, blob references, outfits, their items,
+    # recommendations, their items and two version bumps
+    query_budget = {'post': 12}
+
+    def post(self, request):
+        if request.stream is None:
+            return Response({"detail": "Send an NDJSON export as the request body."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            counts = portability.Importer(request.user).run(request.stream)
+        except portability.InvalidImport as exc:
+            return Response({"detail": str(exc), "line": exc.number}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
+
+
+class Insights(APIView):
+    """
+    Style insights for the current user
+    GET /api/insights/
+
+    {
+        "items": 42, "outfits": 9,
+        "category_counts": {"Tops": 15, ...}, "season_counts": {...},
+        "color_counts": {"black": 11, ...}, "pattern_counts": {...},
+        "favorite_colors": ["black", "white", ...],
+        "most_worn": [{"id": 3, "name": "Jeans", "category": "Bottoms", "outfits": 6}, ...],
+        "updated_at": "..."
+    }
+
+    Read from running totals (api/insights.py), so the cost does not depend on
+    the size of the wardrobe.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'get': 3}
+
+    def get(self, request):
+        return Response(insights.summary(request.user))
+
+
+def suggest_tags(file_obj):
+    """Decode an upload and tag it; runs on the autotag executor."""
+    image = Image.open(file_obj).convert("RGB")
+    tags, caption = run_autotagger(image)
+    return tags, caption, build_item_name_from_tags(tags, caption), infer_category_from_type_tags(tags, caption)
+
+
+class AutoTagSuggestion(AsyncAPIView):
     """
     Accepts an image file and returns suggested name, category, and raw tags,
     without creating a WardrobeItem.
+
+    Async: decoding and inference run on the bounded autotag executor
+    (api/async_views.py), so the request does not hold a worker thread.
     """
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [parsers.MultiPartParser, parsers.FormParser]
+    query_budget = {'post': 1}
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         file_obj = request.FILES.get("item_image") or request.FILES.get("image")
         if not file_obj:
             return Response(
@@ -95,11 +348,14 @@ class AutoTagSuggestion(APIView):
             )
 
         try:
-            image = Image.open(file_obj).convert("RGB")
-            tags, caption = run_autotagger(image)
-            suggested_name = build_item_name_from_tags(tags, caption)
-            suggested_category = infer_category_from_type_tags(tags, caption)
+            uploads.check_image(file_obj)
+        except serializers.ValidationError as exc:
+            return Response({"detail": exc.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            tags, caption, suggested_name, suggested_category = await executor('autotag').run(suggest_tags, file_obj)
+        except ExecutorBusy:
+            raise
         except Exception as exc:
             # Log for debugging, but keep response generic
             print("[autotag-preview] error:", exc)
@@ -123,6 +379,7 @@ class RegisterViewset(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
+    query_budget = {'create': 4, 'list': 2}
 
     def create(self, request):
         print(f"[DEBUG] Registration request data: {request.data}")
@@ -131,7 +388,7 @@ class RegisterViewset(viewsets.ViewSet):
             return_data = {}
             user = serializer.save()
             print(f"[DEBUG] User created: {user.email}, password hash: {user.password}")
-            refresh = RefreshToken.for_user(user)
+            refresh = UserRefreshToken.for_user(user)
             access = refresh.access_token
             return_data['access'] = str(access)
             return_data['refresh'] = str(refresh)
@@ -148,6 +405,7 @@ class RegisterViewset(viewsets.ViewSet):
 class LoginViewset(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     serializer_class = LoginSerializer
+    query_budget = {'create': 2}
 
     def create(self, request):
         print(f"[DEBUG] Login request data: {request.data}")
@@ -156,7 +414,7 @@ class LoginViewset(viewsets.ViewSet):
             return_data = {}
             user = serializer.validated_data
             print(f"[DEBUG] Login successful for user: {user.email}")
-            refresh = RefreshToken.for_user(user)
+            refresh = UserRefreshToken.for_user(user)
             access = refresh.access_token
             return_data['access'] = str(access)
             return_data['refresh'] = str(refresh)
@@ -169,6 +427,7 @@ class LoginViewset(viewsets.ViewSet):
 class GetCurrentUser(generics.GenericAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    query_budget = {'get': 1}
     def get(self, request):
         print(self.request.user)
         if self.request.user.is_authenticated:
@@ -181,6 +440,7 @@ class GetCurrentUser(generics.GenericAPIView):
 
 class LogoutViewset(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'create': 7}
     def create(self, request):
         try:
             existing_refresh = RefreshToken(request.data.get("refresh"))
@@ -191,7 +451,7 @@ class LogoutViewset(viewsets.ViewSet):
             print(e)
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-class OutfitViewSet(viewsets.ModelViewSet):
+class OutfitViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """
     ViewSet for outfit CRUD operations
     Endpoints:
@@ -201,21 +461,62 @@ class OutfitViewSet(viewsets.ModelViewSet):
     - PUT/PATCH /api/outfits/{id}/ - Update outfit
     - DELETE /api/outfits/{id}/ - Delete outfit
     - POST /api/outfits/{id}/upload-preview/ - Upload preview image
+    - PATCH /api/outfits/{id}/layout/ - Save item positions/sizes only
+
+    List endpoints accept ?page_size= and ?cursor= for keyset pagination.
     """
-    permission_classes = [permissions.AllowAny]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Outfit payloads nest wardrobe items, so both counters go into the ETag.
+    # "scheduled" depends on the clock as well and is left out.
+    etag_versions = ('wardrobe', 'outfits')
+    conditional_actions = ('list', 'retrieve', 'favorites')
+    # Server-side cache; "scheduled" entries expire quickly since past dates drop out
+    cache_actions = ('list', 'retrieve', 'favorites', 'scheduled')
+    cache_timeouts = {'scheduled': 60}
+    query_budget = {
+        'list': 5, 'retrieve': 5, 'favorites': 5, 'scheduled': 5,
+        'toggle_favorite': 6, 'schedule': 6, 'upload_preview': 6, 'layout': 6,
+        # Including the style insights deltas (api/insights.py) of a user who reads them
+        'destroy': 13, 'create': 11, 'update': 15, 'partial_update': 15,
+    }
     
     def get_queryset(self):
         # Only return outfits for the current user
-        #if self.request.user.is_authenticated:
-           # return Outfit.objects.filter(user=self.request.user).prefetch_related('items__clothing_item')
-        #return Outfit.objects.none()  # Return empty queryset for anonymous users
-        return Outfit.objects.all().prefetch_related('items__clothing_item')
+        outfits = Outfit.objects.filter(user=self.request.user)
+        if self.action == 'layout':
+            return outfits
+        return outfits.prefetch_related('items__clothing_item')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return OutfitCreateUpdateSerializer
         return OutfitSerializer
     
+    def list_outfits(self, request, outfits):
+        if fast_read.is_enabled(request):
+            return fast_read.outfits_response(self, outfits)
+        page = self.paginate_queryset(outfits)
+        rows = page if page is not None else outfits
+        serializer = OutfitSerializer(rows, many=True, context={'request': request})
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        return sideload_wardrobe_items(
+            request, response, outfit_wardrobe_items(rows), {'request': request}
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        List outfits
+        GET /api/outfits/
+
+        Supports ?fields=, ?expand=clothing_item and ?sideload=true
+        (see ShapedSerializerMixin in serializers.py)
+        """
+        return self.list_outfits(request, self.filter_queryset(self.get_queryset()))
+
     def create(self, request, *args, **kwargs):
         """
         Create a new outfit
@@ -244,7 +545,8 @@ class OutfitViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         outfit = serializer.save()
         
-        # Return full outfit data with nested items
+        # Return full outfit data with nested items (re-read with prefetches)
+        outfit = self.get_queryset().get(pk=outfit.pk)
         output_serializer = OutfitSerializer(outfit, context={'request': request})
         return Response(output_serializer.data, status=status.HTTP_201_CREATED)
     
@@ -259,10 +561,59 @@ class OutfitViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         outfit = serializer.save()
         
-        # Return full outfit data
+        # Return full outfit data (re-read with prefetches)
+        outfit = self.get_queryset().get(pk=outfit.pk)
         output_serializer = OutfitSerializer(outfit, context={'request': request})
         return Response(output_serializer.data)
     
+    @action(detail=True, methods=['patch'])
+    def layout(self, request, pk=None):
+        """
+        Save canvas changes only (autosave while dragging)
+        PATCH /api/outfits/{id}/layout/
+
+        Expected JSON (send only the fields that changed):
+        {
+            "items": [
+                {"id": 12, "position_x": 140, "position_y": 60},
+                {"id": 13, "z_index": 3}
+            ]
+        }
+        """
+        outfit = self.get_object()
+        serializer = OutfitLayoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = {change.pop('id'): change for change in serializer.validated_data['items']}
+
+        items = list(outfit.items.filter(pk__in=changes))
+        if len(items) != len(changes):
+            missing = sorted(set(changes) - {item.pk for item in items})
+            return Response(
+                {'error': f'Items {missing} are not part of this outfit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fields = set()
+        for item in items:
+            for field, value in changes[item.pk].items():
+                setattr(item, field, value)
+                fields.add(field)
+
+        with transaction.atomic():
+            if fields:
+                OutfitItem.objects.bulk_update(items, sorted(fields))
+            # Bump updated_at through save() so post_save receivers see the edit
+            outfit.save(update_fields=['updated_at'])
+
+        return Response({
+            'id': outfit.id,
+            'updated_at': outfit.updated_at,
+            'items': [
+                {'id': item.id, **{field: getattr(item, field) for field in OutfitItem.LAYOUT_FIELDS}}
+                for item in items
+            ],
+        })
+
     @action(detail=True, methods=['post'])
     def toggle_favorite(self, request, pk=None):
         """
@@ -328,8 +679,7 @@ class OutfitViewSet(viewsets.ModelViewSet):
             scheduled_date__gte=timezone.now()
         ).order_by('scheduled_date')
         
-        serializer = OutfitSerializer(outfits, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.list_outfits(request, outfits)
     
     @action(detail=False, methods=['get'])
     def favorites(self, request):
@@ -338,8 +688,8 @@ class OutfitViewSet(viewsets.ModelViewSet):
         GET /api/outfits/favorites/
         """
         outfits = self.get_queryset().filter(is_favorite=True).order_by('-updated_at')
-        serializer = OutfitSerializer(outfits, many=True, context={'request': request})
-        return Response(serializer.data)
+        
+        return self.list_outfits(request, outfits)
     
     @action(detail=True, methods=['post'])
     def upload_preview(self, request, pk=None):
@@ -357,7 +707,14 @@ class OutfitViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        try:
+            uploads.check_image(request.FILES['preview_image'])
+        except serializers.ValidationError as exc:
+            return Response({'error': exc.detail[0]}, status=status.HTTP_400_BAD_REQUEST)
+
         outfit.preview_image = request.FILES['preview_image']
+        # Kept until the layout changes, then rendered server-side (api/previews.py)
+        outfit.preview_layout_hash = previews.current_hash(outfit)
         outfit.save()
         
         serializer = OutfitSerializer(outfit, context={'request': request})
@@ -367,63 +724,166 @@ class OutfitViewSet(viewsets.ModelViewSet):
 
 class RecommendationViewSet(viewsets.ViewSet):
     """
-    ViewSet for generating smart outfit recommendations
+    ViewSet for a user's outfit recommendations; generating them is done by
+    the async GenerateRecommendation / GenerateRecommendationBatch views below
     """
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 3}
     
     def list(self, request):
         """
         Get user's previous recommendations
         GET /api/recommendations/
-        """
-        recommendations = Recommendation.objects.filter(user=request.user).order_by('-created_at')[:10]
-        serializer = RecommendationSerializer(recommendations, many=True)
-        return Response(serializer.data)
-    
-    @action(detail=False, methods=['post'])
-    def generate(self, request):
-        """
-        Generate new outfit recommendations based on weather and occasion
-        POST /api/recommendations/generate/
         
-        Expected payload:
-        {
-            "weather": "sunny",
-            "occasion": "casual",
-            "temperature": 22
-        }
+        Returns the latest 10, or pages through all of them with ?page_size= / ?cursor=
+        Supports ?fields=, ?expand=recommended_items and ?sideload=true
         """
-        from .recommendation_engine import RecommendationEngine
+        recommendations = Recommendation.objects.filter(
+            user=request.user, is_precomputed=False
+        ).order_by('-created_at').prefetch_related('recommended_items')
         
+        # Shape from the query params, but keep item_image URLs relative as before
+        context = {'query_params': request.query_params}
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(recommendations, request, view=self)
+        if page is not None:
+            rows = page
+            response = paginator.get_paginated_response(RecommendationSerializer(page, many=True, context=context).data)
+        else:
+            rows = list(recommendations[:10])
+            response = Response(RecommendationSerializer(rows, many=True, context=context).data)
+        
+        items = [item for recommendation in rows for item in recommendation.recommended_items.all()]
+        return sideload_wardrobe_items(request, response, items, context)
+
+
+class GenerateRecommendation(AsyncAPIView):
+    """
+    Generate new outfit recommendations based on weather and occasion
+    POST /api/recommendations/generate/
+
+    Expected payload:
+    {
+        "weather": "sunny",
+        "occasion": "casual",
+        "temperature": 22
+    }
+
+    Async: the wardrobe is read with the async ORM and scored on the bounded
+    recommendation executor (api/async_views.py).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': 8}
+
+    async def post(self, request):
+        from .recommendation_engine import RecommendationEngine
+        from .precompute import precomputed_recommendations
+        from . import recommendation_core as core
+
         serializer = RecommendationRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
+
         weather = serializer.validated_data['weather']
         occasion = serializer.validated_data['occasion']
         temperature = serializer.validated_data.get('temperature')
-        
-        # Generate recommendations
-        recommended_items, compatibility_score, explanation = RecommendationEngine.generate_recommendation(
-            user=request.user,
-            weather=weather,
-            occasion=occasion,
-            temperature=temperature,
-        )
-        
-        # Save recommendation to database
-        recommendation = Recommendation.objects.create(
-            user=request.user,
-            weather=weather,
-            occasion=occasion,
-            temperature=temperature,
-            compatibility_score=compatibility_score,
-            explanation=explanation,
-        )
-        
-        # Add recommended items
-        recommendation.recommended_items.set(recommended_items)
-        
-        # Return serialized recommendation
-        result_serializer = RecommendationSerializer(recommendation, context={'request': request})
-        return Response(result_serializer.data, status=status.HTTP_201_CREATED)
+        user = request.user
+
+        # Serve the nightly precomputed recommendation if it is still current
+        recommendation = await precomputed_recommendations(user, weather, occasion, temperature).afirst()
+        if recommendation is not None:
+            recommendation.is_precomputed = False
+            recommendation.created_at = timezone.now()
+            await recommendation.asave(update_fields=['is_precomputed', 'created_at'])
+        else:
+            records = await RecommendationEngine.aload_records(user)
+            if records:
+                indexes, compatibility_score, explanation = await executor('recommendation').run(
+                    core.recommend, records, weather, occasion, temperature
+                )
+            else:
+                indexes, compatibility_score, explanation = [], 0, "No wardrobe items available for recommendations."
+
+            recommendation = await Recommendation.objects.acreate(
+                user=user,
+                weather=weather,
+                occasion=occasion,
+                temperature=temperature,
+                compatibility_score=compatibility_score,
+                explanation=explanation,
+            )
+            if indexes:
+                await recommendation.recommended_items.aset([records[index].id for index in indexes])
+
+        # Serializing reads the recommended items
+        data = await sync_to_async(
+            lambda: RecommendationSerializer(recommendation, context={'request': request}).data
+        )()
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class GenerateRecommendationBatch(AsyncAPIView):
+    """
+    Generate recommendations for several days in one request
+    POST /api/recommendations/generate_batch/
+
+    Expected payload:
+    {
+        "contexts": [
+            {"date": "2025-12-22", "weather": "sunny", "occasion": "professional", "temperature": 22},
+            {"date": "2025-12-23", "weather": "rainy", "occasion": "casual"}
+        ],
+        "avoid_repeats": true
+    }
+
+    Async like GenerateRecommendation; every context is scored against a
+    single load of the wardrobe.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'post': 7}
+
+    async def post(self, request):
+        from .recommendation_engine import RecommendationEngine
+        from . import recommendation_core as core
+
+        serializer = RecommendationBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        contexts = serializer.validated_data['contexts']
+
+        records = await RecommendationEngine.aload_records(request.user)
+        if records:
+            results = await executor('recommendation').run(
+                core.recommend_batch, records, contexts, serializer.validated_data['avoid_repeats']
+            )
+        else:
+            results = [([], 0, "No wardrobe items available for recommendations.") for _ in contexts]
+
+        data = await sync_to_async(self.save_and_serialize)(request, contexts, records, results)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def save_and_serialize(request, contexts, records, results):
+        with transaction.atomic():
+            recommendations = Recommendation.objects.bulk_create([
+                Recommendation(
+                    user=request.user,
+                    weather=context['weather'],
+                    occasion=context['occasion'],
+                    temperature=context.get('temperature'),
+                    date=context['date'],
+                    compatibility_score=compatibility_score,
+                    explanation=explanation,
+                )
+                for context, (_, compatibility_score, explanation) in zip(contexts, results)
+            ])
+
+            RecommendedItem = Recommendation.recommended_items.through
+            RecommendedItem.objects.bulk_create([
+                RecommendedItem(recommendation_id=recommendation.pk, wardrobeitem_id=records[index].id)
+                for recommendation, (indexes, _, _) in zip(recommendations, results)
+                for index in indexes
+            ])
 
+        recommendations = Recommendation.objects.filter(
+            pk__in=[recommendation.pk for recommendation in recommendations]
+        ).order_by('date', 'pk').prefetch_related('recommended_items')
+        return RecommendationSerializer(recommendations, many=True, context={'request': request}).data
@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Leaves out the sync-only WhiteNoise middleware (see SERVE_ASGI in settings),
+# so every middleware runs on the event loop; static files are served here
+os.environ['DJANGO_ASGI'] = 'true'
 
-application = get_asgi_application()
+application = ASGIStaticFilesHandler(get_asgi_application())
@@ -0,0 +1,119 @@
+"""
+Sizing and memory watchdog for the gunicorn profile in gunicorn.conf.py.
+
+Kept free of gunicorn imports so the sizing rules can be tested on their own.
+
+Workers are sized from the cores and memory the process may actually use,
+which means the cgroup limits when running in a container:
+
+- CPU allows the usual 2 * cores + 1 workers.
+- Memory allows memory / WORKER_MEMORY_MB workers. Each worker that autotags
+  loads its own copy of Florence-2.
+
+When memory allows fewer workers than CPU would, each worker gets threads
+(gthread) to make up the concurrency. Otherwise plain sync workers are used.
+
+Long-lived workers grow through allocator fragmentation even though nothing
+leaks. RSSWatchdog checks a worker's resident set size periodically and
+recycles the worker (graceful SIGTERM: in-flight requests finish, the master
+forks a fresh one) once it passes the ceiling.
+"""
+
+import math
+import os
+import resource
+import signal
+import threading
+import time
+
+CGROUP_V2_MEMORY = '/sys/fs/cgroup/memory.max'
+CGROUP_V1_MEMORY = '/sys/fs/cgroup/memory/memory.limit_in_bytes'
+CGROUP_V2_CPU = '/sys/fs/cgroup/cpu.max'
+
+MB = 1024 * 1024
+MAX_THREADS = 8
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_count():
+    """Cores this process may use: its CPU affinity, capped by a cgroup v2 CPU quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = _read(CGROUP_V2_CPU)
+    if quota and not quota.startswith('max'):
+        limit, period = quota.split()
+        cores = min(cores, max(1, math.ceil(int(limit) / int(period))))
+    return cores
+
+
+def memory_limit():
+    """Bytes of memory available to this process: the cgroup limit, or physical memory."""
+    physical = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    for path in (CGROUP_V2_MEMORY, CGROUP_V1_MEMORY):
+        limit = _read(path)
+        if limit and limit.isdigit():
+            # cgroup v1 reports "no limit" as a number close to 2 ** 63
+            return min(int(limit), physical)
+    return physical
+
+
+def size_workers(cores, memory, worker_memory):
+    """(workers, threads) for `cores` and `memory` bytes when each worker needs `worker_memory` bytes."""
+    wanted = 2 * cores + 1
+    workers = max(1, min(wanted, int(memory // worker_memory)))
+    threads = min(MAX_THREADS, math.ceil(wanted / workers))
+    return workers, threads
+
+
+def current_rss():
+    """This process's resident set size in bytes (its peak where /proc is unavailable)."""
+    statm = _read('/proc/self/statm')
+    if statm:
+        return int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSWatchdog(threading.Thread):
+    """
+    Checks the worker's RSS every `interval` seconds, logs it every
+    `log_interval` seconds, and sends the worker SIGTERM once it exceeds
+    `ceiling` bytes.
+    """
+
+    def __init__(self, log, ceiling, interval=10, log_interval=300, rss=current_rss):
+        super().__init__(name='rss-watchdog', daemon=True)
+        self.log = log
+        self.ceiling = ceiling
+        self.interval = interval
+        self.log_interval = log_interval
+        self.rss = rss
+        self.tripped = False
+        self.last_logged = time.monotonic()
+
+    def check(self):
+        """Check once; True when the worker was told to recycle."""
+        rss = self.rss()
+        now = time.monotonic()
+        if now - self.last_logged >= self.log_interval:
+            self.log.info("Worker %s RSS %d MB (ceiling %d MB)", os.getpid(), rss // MB, self.ceiling // MB)
+            self.last_logged = now
+        if rss <= self.ceiling:
+            return False
+        self.log.warning("Worker %s RSS %d MB exceeds %d MB; recycling", os.getpid(), rss // MB, self.ceiling // MB)
+        self.tripped = True
+        os.kill(os.getpid(), signal.SIGTERM)
+        return True
+
+    def run(self):
+        while not self.tripped:
+            time.sleep(self.interval)
+            self.check()
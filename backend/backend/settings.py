@@ -63,6 +63,7 @@ AUTH_USER_MODEL = 'api.User'
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be before CommonMiddleware
+    'api.instrumentation.QueryCountMiddleware',  # SQL count/time per request (QUERY_INSTRUMENTATION)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Static files in production
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,6 +74,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Set by backend/asgi.py. WhiteNoise's middleware is sync-only, and a single
+# sync-only middleware makes Django run every request, async views included,
+# on a thread. Under ASGI static files are served by backend/asgi.py instead.
+SERVE_ASGI = os.environ.get('DJANGO_ASGI', 'false').lower() == 'true'
+if SERVE_ASGI:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -114,6 +122,26 @@ else:
         }
     }
 
+# =============================================================================
+# CACHE
+# =============================================================================
+
+# Shared Redis cache when REDIS_URL is set (needs the `redis` package), else
+# a per-process in-memory cache
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # =============================================================================
 # PASSWORD VALIDATION
 # =============================================================================
@@ -151,6 +179,39 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized copies of uploaded images, stored next to the originals (see api/images.py).
+# Formats this Pillow build cannot encode are skipped. With
+# API_IMAGE_DERIVATIVES_ON_SAVE off, run `manage.py generate_image_derivatives` instead.
+API_IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.environ.get('API_IMAGE_DERIVATIVE_WIDTHS', '160,320,640').split(',') if width]
+API_IMAGE_DERIVATIVE_FORMATS = [fmt for fmt in os.environ.get('API_IMAGE_DERIVATIVE_FORMATS', 'avif,webp').split(',') if fmt]
+API_IMAGE_DERIVATIVES_ON_SAVE = os.environ.get('API_IMAGE_DERIVATIVES_ON_SAVE', 'True').lower() == 'true'
+
+# Limits checked from the header of every uploaded image before it is decoded
+# (item photos, outfit previews, autotag previews; see api/uploads.py)
+API_UPLOAD_MAX_BYTES = int(os.environ.get('API_UPLOAD_MAX_BYTES', 15 * 1024 * 1024))
+API_UPLOAD_MAX_PIXELS = int(os.environ.get('API_UPLOAD_MAX_PIXELS', 40_000_000))
+API_UPLOAD_MAX_DIMENSION = int(os.environ.get('API_UPLOAD_MAX_DIMENSION', 10_000))
+API_UPLOAD_FORMATS = [fmt for fmt in os.environ.get('API_UPLOAD_FORMATS', 'JPEG,MPO,PNG,WEBP,GIF,AVIF').split(',') if fmt]
+
+# Server-rendered outfit previews (see api/previews.py): 'background' renders on
+# a worker thread after commit, 'inline' in the committing thread, 'off' never
+# (run `manage.py render_outfit_previews`). The canvas matches the outfit builder's.
+API_OUTFIT_PREVIEW_RENDERING = os.environ.get('API_OUTFIT_PREVIEW_RENDERING', 'background')
+API_OUTFIT_PREVIEW_CANVAS = [int(side) for side in os.environ.get('API_OUTFIT_PREVIEW_CANVAS', '400x800').split('x')]
+
+# Run the Florence-2 autotagger on new wardrobe item photos, on the autotag
+# executor after the upload commits (see api/views.py). Off by default: each
+# photo costs seconds of CPU and loads the model into every worker.
+AUTOTAG_UPLOADS = os.environ.get('AUTOTAG_UPLOADS', 'False').lower() == 'true'
+
+# Per-process executors the async autotag preview and recommendation views hand
+# CPU-bound work to (see api/async_views.py); past WORKERS + QUEUE jobs in flight
+# requests get 503 instead of waiting
+API_AUTOTAG_WORKERS = int(os.environ.get('API_AUTOTAG_WORKERS', 1))
+API_AUTOTAG_QUEUE = int(os.environ.get('API_AUTOTAG_QUEUE', 8))
+API_RECOMMENDATION_WORKERS = int(os.environ.get('API_RECOMMENDATION_WORKERS', 2))
+API_RECOMMENDATION_QUEUE = int(os.environ.get('API_RECOMMENDATION_QUEUE', 64))
+
 # Cloudinary configuration for persistent media storage in production
 if os.environ.get('CLOUDINARY_CLOUD_NAME'):
     CLOUDINARY_STORAGE = {
@@ -160,6 +221,21 @@ if os.environ.get('CLOUDINARY_CLOUD_NAME'):
     }
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Store each distinct upload once, keyed by its SHA-256, with reference counts
+# (see api/storage.py). Off by default; to roll out, enable it and then run
+# `manage.py dedupe_media` once to convert existing media (DEPLOYMENT_GUIDE 5.5).
+# Django 5.1+ only reads STORAGES, so the media backend chosen above is wired
+# in here; static files keep Django's default storage, as before.
+API_CONTENT_ADDRESSED_MEDIA = os.environ.get('API_CONTENT_ADDRESSED_MEDIA', 'False').lower() == 'true'
+MEDIA_STORAGE_BACKEND = globals().get('DEFAULT_FILE_STORAGE', 'django.core.files.storage.FileSystemStorage')
+STORAGES = {
+    'default': (
+        {'BACKEND': 'api.storage.ContentAddressedStorage', 'OPTIONS': {'backend': MEDIA_STORAGE_BACKEND}}
+        if API_CONTENT_ADDRESSED_MEDIA else {'BACKEND': MEDIA_STORAGE_BACKEND}
+    ),
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # =============================================================================
 # CORS SETTINGS
 # =============================================================================
@@ -190,10 +266,35 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
 }
 
+# Per-request SQL counters and N+1 warnings (see api/instrumentation.py)
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', str(DEBUG)).lower() == 'true'
+
+# Keyset pagination for list endpoints (see api/pagination.py)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '200'))
+# Keep returning full lists unless the client asks for a page (current frontend)
+API_LEGACY_UNPAGINATED_LISTS = os.environ.get('API_LEGACY_UNPAGINATED_LISTS', 'True').lower() == 'true'
+# Nest full wardrobe items in outfits/recommendations unless the client passes ?expand= or ?sideload=
+# (see ShapedSerializerMixin in api/serializers.py)
+API_LEGACY_FULL_NESTING = os.environ.get('API_LEGACY_FULL_NESTING', 'True').lower() == 'true'
+# Build wardrobe/outfit list responses from .values() rows instead of serializers (see api/fast_read.py)
+API_FAST_READS = os.environ.get('API_FAST_READS', 'False').lower() == 'true'
+# Delta sync tokens reach back this far to catch writes still committing (see api/sync.py)
+API_SYNC_OVERLAP_SECONDS = int(os.environ.get('API_SYNC_OVERLAP_SECONDS', '5'))
+# Deletion tombstones are kept this long; older tokens get a full resync (see api/sync.py)
+API_SYNC_TOMBSTONE_DAYS = int(os.environ.get('API_SYNC_TOMBSTONE_DAYS', '30'))
+# Cache serialized outfit/wardrobe read responses per user (see api/response_cache.py)
+API_RESPONSE_CACHE = os.environ.get('API_RESPONSE_CACHE', 'True').lower() == 'true'
+API_RESPONSE_CACHE_TIMEOUT = int(os.environ.get('API_RESPONSE_CACHE_TIMEOUT', '300'))
+API_RESPONSE_CACHE_ALIAS = os.environ.get('API_RESPONSE_CACHE_ALIAS', 'default')
+# Rows read per query by the NDJSON export, and written per bulk_create by the import (see api/portability.py)
+API_EXPORT_CHUNK_SIZE = int(os.environ.get('API_EXPORT_CHUNK_SIZE', '2000'))
+API_IMPORT_BATCH_SIZE = int(os.environ.get('API_IMPORT_BATCH_SIZE', '1000'))
+
 # =============================================================================
 # JWT SETTINGS
 # =============================================================================
@@ -203,8 +304,24 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Tokens carry the claims api.authentication.CachedJWTAuthentication checks
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.UserTokenObtainPairSerializer',
 }
 
+# In-process LRU of authenticated users; revoked tokens may still be accepted
+# by other workers for up to the TTL (see api/authentication.py)
+API_AUTH_USER_CACHE_SIZE = int(os.environ.get('API_AUTH_USER_CACHE_SIZE', '1024'))
+API_AUTH_USER_CACHE_TTL = int(os.environ.get('API_AUTH_USER_CACHE_TTL', '30'))
+
+# =============================================================================
+# RECOMMENDATIONS
+# =============================================================================
+
+# Context used by `manage.py precompute_recommendations` for days without a scheduled outfit
+RECOMMENDATION_DEFAULT_WEATHER = os.environ.get('RECOMMENDATION_DEFAULT_WEATHER', 'sunny')
+RECOMMENDATION_DEFAULT_OCCASION = os.environ.get('RECOMMENDATION_DEFAULT_OCCASION', 'casual')
+RECOMMENDATION_PRECOMPUTE_DAYS = int(os.environ.get('RECOMMENDATION_PRECOMPUTE_DAYS', '7'))
+
 # =============================================================================
 # AUTHENTICATION
 # =============================================================================
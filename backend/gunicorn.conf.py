@@ -0,0 +1,94 @@
+"""
+Production gunicorn profile; gunicorn loads it from the working directory.
+
+    gunicorn --config gunicorn.conf.py
+
+Serves backend.wsgi. With GUNICORN_ASGI=true it serves backend.asgi on
+uvicorn workers instead (see DEPLOYMENT_GUIDE.md). Worker count, worker class
+and threads come from the cores and memory available (backend/server.py).
+Every setting can be overridden through the environment:
+
+    WEB_CONCURRENCY              workers (default: sized from cores and memory)
+    GUNICORN_THREADS             threads per worker (default: sized likewise)
+    GUNICORN_WORKER_MEMORY_MB    memory budgeted per worker for sizing (1536)
+    GUNICORN_WORKER_MAX_RSS_MB   RSS at which a worker is recycled
+                                 (default: 90% of memory split across workers)
+    GUNICORN_RSS_CHECK_SECONDS   how often workers check their RSS (10)
+    GUNICORN_RSS_LOG_SECONDS     how often workers log their RSS (300)
+    GUNICORN_MAX_REQUESTS        requests before a worker is recycled (1000)
+    GUNICORN_MAX_REQUESTS_JITTER random extra requests, so workers don't all
+                                 recycle at once (default: 10% of max)
+    GUNICORN_TIMEOUT             seconds before a silent worker is killed (120)
+
+The app is preloaded in the master so workers share its memory copy-on-write.
+torch and transformers are imported on first use (api/autotagger.py), so
+preloading stays cheap and every worker still loads its own model.
+"""
+
+import multiprocessing
+import os
+
+from backend import server
+
+_env = os.environ.get
+
+asgi = _env('GUNICORN_ASGI', 'false').lower() == 'true'
+cores = server.cpu_count()
+memory = server.memory_limit()
+_workers, _threads = server.size_workers(cores, memory, int(_env('GUNICORN_WORKER_MEMORY_MB', 1536)) * server.MB)
+
+wsgi_app = 'backend.asgi:application' if asgi else 'backend.wsgi:application'
+bind = f"0.0.0.0:{_env('PORT', '8000')}"
+workers = int(_env('WEB_CONCURRENCY', _workers))
+threads = int(_env('GUNICORN_THREADS', _threads))
+if asgi:
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+timeout = int(_env('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+max_requests = int(_env('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(_env('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+accesslog = '-'
+errorlog = '-'
+
+rss_ceiling = int(_env('GUNICORN_WORKER_MAX_RSS_MB', memory * 0.9 // workers // server.MB)) * server.MB
+
+# Shared with the forked workers, which count their own recycles
+_recycles = {'memory': multiprocessing.Value('i', 0), 'max_requests': multiprocessing.Value('i', 0)}
+
+
+def when_ready(arbiter):
+    arbiter.log.info(
+        "Serving %s: %d %s workers x %d threads for %d cores / %d MB; recycling past %d MB or %d(+%d) requests",
+        wsgi_app, workers, worker_class, threads, cores, memory // server.MB, rss_ceiling // server.MB,
+        max_requests, max_requests_jitter,
+    )
+
+
+def post_worker_init(worker):
+    worker.rss_watchdog = server.RSSWatchdog(
+        worker.log, rss_ceiling,
+        interval=int(_env('GUNICORN_RSS_CHECK_SECONDS', 10)),
+        log_interval=int(_env('GUNICORN_RSS_LOG_SECONDS', 300)),
+    )
+    worker.rss_watchdog.start()
+
+
+def worker_exit(arbiter, worker):
+    watchdog = getattr(worker, 'rss_watchdog', None)
+    if watchdog is not None and watchdog.tripped:
+        reason = 'memory'
+    elif worker.max_requests and worker.nr >= worker.max_requests:
+        reason = 'max_requests'
+    else:
+        reason = None
+    if reason:
+        with _recycles[reason].get_lock():
+            _recycles[reason].value += 1
+    worker.log.info(
+        "Worker %s exiting (%s) after %d requests at %d MB RSS; recycled so far: %d for memory, %d for max_requests",
+        worker.pid, reason or 'shutdown', worker.nr, server.current_rss() // server.MB,
+        _recycles['memory'].value, _recycles['max_requests'].value,
+    )
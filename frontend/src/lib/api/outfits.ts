@@ -151,6 +151,27 @@ export async function deleteOutfit(outfitId: string): Promise<void> {
   await apiClient.delete(`/outfits/${outfitId}/`);
 }
 
+export interface OutfitLayoutChange {
+  id: number;
+  position_x?: number;
+  position_y?: number;
+  size_width?: number;
+  size_height?: number;
+  rotation?: number;
+  z_index?: number;
+}
+
+/**
+ * Save canvas changes only (position, size, rotation, z-index), e.g. autosave while dragging
+ */
+export async function saveOutfitLayout(
+  outfitId: string,
+  changes: OutfitLayoutChange[]
+): Promise<{ id: number; updated_at: string }> {
+  const response = await apiClient.patch(`/outfits/${outfitId}/layout/`, { items: changes });
+  return { id: response.data.id, updated_at: response.data.updated_at };
+}
+
 /**
  * Toggle outfit as favorite
  */